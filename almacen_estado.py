@@ -0,0 +1,144 @@
+# almacen_estado.py
+# Almacén persistente del estado de la flota del servidor central.
+#
+# El estado se guarda en SQLite (modo WAL) como una instantánea periódica de
+# todos los taxis más un registro de eventos que solo crece. Cada evento
+# guarda el estado completo del taxi después del cambio, así que recuperar
+# consiste en leer la instantánea y aplicar encima los eventos posteriores.
+#
+# Las escrituras las hace un hilo propio: registrar() solo encola el evento
+# y el hilo escritor confirma los eventos acumulados en una única
+# transacción (commit en grupo), de modo que el camino de las solicitudes
+# nunca espera al disco.
+import queue
+import sqlite3
+import threading
+import time
+
+from bitacora import Bitacora
+
+_FIN = object()
+
+log = Bitacora('Almacén')
+
+
+class AlmacenEstado:
+    def __init__(self, ruta, intervalo_commit=0.05, max_lote=10000, sincrono='FULL'):
+        self.ruta = ruta
+        self.intervalo_commit = intervalo_commit  # Segundos que se acumulan eventos por transacción
+        self.max_lote = max_lote
+        self.cola = queue.Queue()
+        self.escritos = 0
+
+        conexion = self._conectar(sincrono)
+        conexion.executescript('''
+            CREATE TABLE IF NOT EXISTS taxis (
+                id INTEGER PRIMARY KEY, x INTEGER, y INTEGER, ocupado INTEGER,
+                servicios INTEGER, ultima_asignacion REAL, velocidad INTEGER);
+            CREATE TABLE IF NOT EXISTS eventos (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT, tipo TEXT, id INTEGER, x INTEGER, y INTEGER,
+                ocupado INTEGER, servicios INTEGER, ultima_asignacion REAL, velocidad INTEGER);
+            CREATE TABLE IF NOT EXISTS metadatos (clave TEXT PRIMARY KEY, valor);
+        ''')
+        conexion.commit()
+        conexion.close()
+
+        self.sincrono = sincrono
+        self.hilo = threading.Thread(target=self._escribir, daemon=True)
+        self.hilo.start()
+
+    def _conectar(self, sincrono):
+        conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        conexion.execute('PRAGMA journal_mode=WAL')
+        # Con commit en grupo, FULL hace un fsync por lote y no por evento
+        conexion.execute(f'PRAGMA synchronous={sincrono}')
+        return conexion
+
+    @staticmethod
+    def _fila(tipo, id_taxi, info):
+        return (tipo, id_taxi, info['pos'][0], info['pos'][1], int(info['ocupado']), info['servicios'],
+                info.get('ultima_asignacion', 0), info.get('velocidad', 0))
+
+    def registrar(self, tipo, id_taxi, info):
+        # No bloquea: el hilo escritor se encarga del disco
+        self.cola.put(self._fila(tipo, id_taxi, info))
+
+    def guardar_instantanea(self, taxis):
+        # taxis: copia que nadie más modifica (TablaFlota.copia() o un dict
+        # {id: info}). Debe encolarse con el lock del servidor adquirido: así
+        # incluye exactamente los eventos encolados antes que ella. Las filas
+        # las construye el hilo escritor, fuera del lock
+        self.cola.put(('instantanea', taxis))
+
+    def cerrar(self):
+        self.cola.put(_FIN)
+        self.hilo.join()
+
+    def _escribir(self):
+        conexion = self._conectar(self.sincrono)
+        while True:
+            elemento = self.cola.get()
+            lote = []
+            limite = time.time() + self.intervalo_commit
+            while True:
+                if elemento is _FIN or (isinstance(elemento, tuple) and elemento[0] == 'instantanea'):
+                    break
+                lote.append(elemento)
+                if len(lote) >= self.max_lote:
+                    elemento = None
+                    break
+                try:
+                    elemento = self.cola.get(timeout=max(0.0, limite - time.time()))
+                except queue.Empty:
+                    elemento = None
+                    break
+
+            try:
+                if lote:
+                    conexion.executemany('INSERT INTO eventos (tipo, id, x, y, ocupado, servicios, '
+                                         'ultima_asignacion, velocidad) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', lote)
+                    self.escritos += len(lote)
+                if isinstance(elemento, tuple):
+                    self._escribir_instantanea(conexion, [self._fila(None, id_taxi, info)[1:]
+                                                          for id_taxi, info in elemento[1].items()])
+                conexion.commit()
+            except Exception as e:
+                log.error('escritura', "Error escribiendo estado: %s", e)
+
+            if elemento is _FIN:
+                conexion.close()
+                return
+
+    @staticmethod
+    def _escribir_instantanea(conexion, filas):
+        # La instantánea reemplaza la tabla y descarta los eventos que ya incluye
+        ultimo = conexion.execute('SELECT COALESCE(MAX(seq), 0) FROM eventos').fetchone()[0]
+        conexion.execute('DELETE FROM taxis')
+        conexion.executemany('INSERT INTO taxis (id, x, y, ocupado, servicios, ultima_asignacion, velocidad) '
+                             'VALUES (?, ?, ?, ?, ?, ?, ?)', filas)
+        conexion.execute('DELETE FROM eventos WHERE seq <= ?', (ultimo,))
+        conexion.execute("INSERT OR REPLACE INTO metadatos (clave, valor) VALUES ('seq_instantanea', ?)",
+                         (ultimo,))
+
+    def cargar(self):
+        # Reconstruye {id: info} a partir de la instantánea y los eventos posteriores
+        conexion = self._conectar(self.sincrono)
+        try:
+            fila = conexion.execute("SELECT valor FROM metadatos WHERE clave = 'seq_instantanea'").fetchone()
+            seq_instantanea = fila[0] if fila else 0
+
+            taxis = {}
+            for id_taxi, x, y, ocupado, servicios, ultima_asignacion, velocidad in conexion.execute(
+                    'SELECT id, x, y, ocupado, servicios, ultima_asignacion, velocidad FROM taxis'):
+                taxis[id_taxi] = {'pos': (x, y), 'ocupado': bool(ocupado), 'servicios': servicios,
+                                  'ultima_asignacion': ultima_asignacion, 'velocidad': velocidad}
+            # De cada taxi basta con su último evento, que ya guarda el estado completo
+            for id_taxi, x, y, ocupado, servicios, ultima_asignacion, velocidad in conexion.execute(
+                    'SELECT e.id, e.x, e.y, e.ocupado, e.servicios, e.ultima_asignacion, e.velocidad '
+                    'FROM eventos e JOIN (SELECT MAX(seq) AS seq FROM eventos WHERE seq > ? GROUP BY id) u '
+                    'ON e.seq = u.seq', (seq_instantanea,)):
+                taxis[id_taxi] = {'pos': (x, y), 'ocupado': bool(ocupado), 'servicios': servicios,
+                                  'ultima_asignacion': ultima_asignacion, 'velocidad': velocidad}
+            return taxis
+        finally:
+            conexion.close()
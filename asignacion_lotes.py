@@ -0,0 +1,113 @@
+# asignacion_lotes.py
+# Asignación conjunta de un lote de solicitudes a taxis minimizando la
+# distancia total de recogida (problema de asignación resuelto con el
+# método húngaro sobre una matriz de distancias calculada con NumPy).
+import numpy as np
+
+
+def matriz_distancias(pos_usuarios, pos_taxis):
+    # Distancia Manhattan entre cada usuario (filas) y cada taxi (columnas)
+    usuarios = np.asarray(pos_usuarios, dtype=np.int64).reshape(-1, 2)
+    taxis = np.asarray(pos_taxis, dtype=np.int64).reshape(-1, 2)
+    return (np.abs(usuarios[:, None, 0] - taxis[None, :, 0]) +
+            np.abs(usuarios[:, None, 1] - taxis[None, :, 1]))
+
+
+def resolver_asignacion(costos):
+    # Método húngaro con potenciales, O(n²·m) para n filas y m columnas.
+    # Devuelve (filas, columnas) con la pareja asignada a cada fila; si hay
+    # más filas que columnas, algunas filas quedan sin asignar.
+    costos = np.asarray(costos, dtype=np.float64)
+    if costos.ndim != 2 or costos.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    transpuesta = costos.shape[0] > costos.shape[1]
+    if transpuesta:
+        costos = costos.T
+    n, m = costos.shape
+
+    # Índices desde 1; la columna 0 es ficticia y sirve de raíz del camino
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    fila_de_columna = np.zeros(m + 1, dtype=np.int64)
+    camino = np.zeros(m + 1, dtype=np.int64)
+
+    for fila in range(1, n + 1):
+        fila_de_columna[0] = fila
+        j0 = 0
+        minimos = np.full(m + 1, np.inf)
+        usadas = np.zeros(m + 1, dtype=bool)
+
+        while True:
+            usadas[j0] = True
+            i0 = fila_de_columna[j0]
+            libres = ~usadas
+            libres[0] = False
+
+            reducidos = costos[i0 - 1] - u[i0] - v[1:]
+            mejora = libres[1:] & (reducidos < minimos[1:])
+            minimos[1:][mejora] = reducidos[mejora]
+            camino[1:][mejora] = j0
+
+            candidatos = np.where(libres, minimos, np.inf)
+            j1 = int(np.argmin(candidatos))
+            delta = candidatos[j1]
+
+            u[fila_de_columna[usadas]] += delta
+            v[usadas] -= delta
+            minimos[libres] -= delta
+
+            j0 = j1
+            if fila_de_columna[j0] == 0:
+                break
+
+        # Invertir el camino aumentante
+        while j0:
+            j1 = camino[j0]
+            fila_de_columna[j0] = fila_de_columna[j1]
+            j0 = j1
+
+    columnas = np.nonzero(fila_de_columna[1:])[0]
+    filas = fila_de_columna[1:][columnas] - 1
+    if transpuesta:
+        filas, columnas = columnas, filas
+    orden = np.argsort(filas)
+    return filas[orden], columnas[orden]
+
+
+def asignar_lote(pos_usuarios, candidatos):
+    # candidatos: lista ordenada de (id_taxi, (x, y)). Devuelve una lista con
+    # el id del taxi para cada usuario (None si no alcanzan los taxis).
+    # Entre soluciones de igual distancia total se prefieren los ids menores.
+    asignados = [None] * len(pos_usuarios)
+    if not pos_usuarios or not candidatos:
+        return asignados
+
+    ids = np.array([id_taxi for id_taxi, _ in candidatos], dtype=np.int64)
+    distancias = matriz_distancias(pos_usuarios, [pos for _, pos in candidatos])
+
+    rango = np.empty(len(ids), dtype=np.int64)
+    rango[np.argsort(ids, kind='stable')] = np.arange(len(ids))
+    escala = len(pos_usuarios) * len(ids) + 1
+    filas, columnas = resolver_asignacion(distancias * escala + rango[None, :])
+
+    for fila, columna in zip(filas, columnas):
+        asignados[fila] = int(ids[columna])
+    return asignados
+
+
+def asignar_codicioso(pos_usuarios, candidatos):
+    # Referencia: cada usuario toma en orden de llegada el taxi libre más
+    # cercano, como en el modo de asignación individual
+    asignados = []
+    libres = dict(candidatos)
+    for pos in pos_usuarios:
+        mejor = min(libres.items(),
+                    key=lambda item: (abs(item[1][0] - pos[0]) + abs(item[1][1] - pos[1]), item[0]),
+                    default=None)
+        if mejor is None:
+            asignados.append(None)
+        else:
+            asignados.append(mejor[0])
+            del libres[mejor[0]]
+    return asignados
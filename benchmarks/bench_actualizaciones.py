@@ -0,0 +1,123 @@
+# bench_actualizaciones.py
+# Carga de actualizaciones de posición sobre el servidor central: varios
+# procesos publican sin pausa por el broker las posiciones de una flota
+# mientras un grupo de usuarios pide taxis. Mide las actualizaciones
+# aplicadas por segundo, la proporción fusionada, la latencia p50/p99 de las
+# solicitudes y el retraso con que el servidor vacía la cola cuando los
+# publicadores paran.
+#
+# El broker se lanza como proceso aparte y el servidor en este mismo
+# proceso. Con --desordenadas una parte de las actualizaciones se publica
+# con el timestamp de la anterior, como si llegara tarde.
+#
+# Uso: python -m benchmarks.bench_actualizaciones [--taxis 5000] [--publicadores 2] [--duracion 10]
+#                                                [--usuarios 4] [--desordenadas 0.05]
+import argparse
+import contextlib
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import zmq
+
+import protocolo
+from benchmarks.bench_solicitudes import cargar_flota, percentil, usuario
+from servidor_central import BROKER_FRONTEND_CONNECT, USUARIO_SERVER_PORT, ServidorCentral
+
+
+def publicador(ids, N, M, inicio, fin, desordenadas, semilla, enviados):
+    # Recorre sus taxis una y otra vez moviéndolos una celda cada vez
+    context = zmq.Context()
+    socket = context.socket(zmq.PUB)
+    socket.connect(BROKER_FRONTEND_CONNECT)
+    generador = random.Random(semilla)
+    posiciones = {id_taxi: [generador.randint(0, N), generador.randint(0, M)] for id_taxi in ids}
+    time.sleep(max(0.0, inicio - time.time()))
+    total = 0
+    while time.time() < fin:
+        for id_taxi in ids:
+            pos = posiciones[id_taxi]
+            pos[0] = min(N, max(0, pos[0] + generador.choice((-1, 1))))
+            timestamp = time.time()
+            if generador.random() < desordenadas:
+                timestamp -= 0.5  # Llega después de una posición más reciente
+            socket.send_multipart(protocolo.empaquetar({
+                'tipo': 'actualizacion', 'id': id_taxi, 'posicion': tuple(pos),
+                'ocupado': False, 'servicios': 0, 'timestamp': timestamp}))
+            total += 1
+    enviados.put(total)
+    socket.close()
+    context.term()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--taxis', type=int, default=5000)
+    parser.add_argument('--publicadores', type=int, default=2)
+    parser.add_argument('--usuarios', type=int, default=4)
+    parser.add_argument('--duracion', type=float, default=10)
+    parser.add_argument('--desordenadas', type=float, default=0.05)
+    parser.add_argument('--N', type=int, default=1000)
+    parser.add_argument('--M', type=int, default=1000)
+    args = parser.parse_args()
+
+    broker = subprocess.Popen([sys.executable, 'broker.py'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+            time.sleep(1)
+            servidor = ServidorCentral(args.N, args.M)
+            cargar_flota(servidor, args.taxis, random.Random(1))
+            threading.Thread(target=servidor.iniciar, daemon=True).start()
+            time.sleep(1)
+
+            inicio = time.time() + 1
+            fin = inicio + args.duracion
+            enviados = multiprocessing.Queue()
+            procesos = [multiprocessing.Process(target=publicador, args=(
+                list(range(i, args.taxis, args.publicadores)), args.N, args.M, inicio, fin,
+                args.desordenadas, i, enviados)) for i in range(args.publicadores)]
+            for proceso in procesos:
+                proceso.start()
+
+            latencias, exitos = [], []
+            url = f"tcp://127.0.0.1:{USUARIO_SERVER_PORT}"
+            time.sleep(max(0.0, inicio - time.time()))
+            hilos = [threading.Thread(target=usuario, args=(i, url, fin, args.N, args.M, latencias, exitos))
+                     for i in range(args.usuarios)]
+            for hilo in hilos:
+                hilo.start()
+            total_enviados = sum(enviados.get() for _ in procesos)
+            for proceso in procesos:
+                proceso.join()
+            for hilo in hilos:
+                hilo.join()
+
+            # Retraso hasta que el servidor vuelve a encontrar la cola vacía
+            while servidor.ultima_cola_vacia <= fin and time.time() < fin + 60:
+                time.sleep(0.01)
+            vaciado = servidor.ultima_cola_vacia - fin
+            contadores = dict(getattr(servidor, 'contadores', {}))
+    finally:
+        broker.terminate()
+        broker.wait()
+
+    print(f"{args.taxis} taxis, {args.publicadores} publicadores, {args.usuarios} usuarios, "
+          f"{args.duracion:.0f} s, {args.desordenadas:.0%} desordenadas")
+    print(f"Actualizaciones publicadas: {total_enviados} ({total_enviados / args.duracion:,.0f}/s)")
+    if contadores.get('recibidas'):
+        print(f"Recibidas {contadores['recibidas']} en {contadores['lotes']} lotes "
+              f"({contadores['recibidas'] / max(1, contadores['lotes']):.1f} por lote), "
+              f"aplicadas {contadores['aplicadas']} ({contadores['aplicadas'] / (args.duracion + vaciado):,.0f}/s), "
+              f"fusionadas {contadores['fusionadas'] / contadores['recibidas']:.1%}, "
+              f"obsoletas {contadores['obsoletas']}")
+    print(f"Cola vaciada {vaciado * 1e3:.0f} ms después de parar los publicadores")
+    print(f"Solicitudes: {len(latencias)} ({len(exitos)} con taxi), latencia p50 "
+          f"{percentil(latencias, 50) * 1e3:.2f} ms, p99 {percentil(latencias, 99) * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
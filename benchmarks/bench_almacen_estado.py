@@ -0,0 +1,70 @@
+# bench_almacen_estado.py
+# Coste de persistir el estado de la flota: latencia de registrar() en el
+# camino de las solicitudes, eventos confirmados por segundo y tiempo de
+# recuperación al arrancar, con y sin instantánea previa.
+#
+# Uso: python -m benchmarks.bench_almacen_estado [--taxis 100000] [--actualizaciones 300000]
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from almacen_estado import AlmacenEstado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--taxis', type=int, default=100_000)
+    parser.add_argument('--actualizaciones', type=int, default=300_000)
+    args = parser.parse_args()
+
+    generador = random.Random(1)
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'estado.db')
+        almacen = AlmacenEstado(ruta)
+
+        taxis = {}
+        inicio = time.perf_counter()
+        peor = 0.0
+        for id_taxi in range(args.taxis):
+            taxis[id_taxi] = {'pos': (generador.randint(0, 1000), generador.randint(0, 1000)),
+                              'ocupado': False, 'servicios': 0, 'velocidad': 2}
+            t = time.perf_counter()
+            almacen.registrar('registro', id_taxi, taxis[id_taxi])
+            peor = max(peor, time.perf_counter() - t)
+        for _ in range(args.actualizaciones):
+            id_taxi = generador.randrange(args.taxis)
+            taxis[id_taxi]['pos'] = (generador.randint(0, 1000), generador.randint(0, 1000))
+            t = time.perf_counter()
+            almacen.registrar('actualizacion', id_taxi, taxis[id_taxi])
+            peor = max(peor, time.perf_counter() - t)
+        encolar = time.perf_counter() - inicio
+        eventos = args.taxis + args.actualizaciones
+        print(f"registrar(): {encolar / eventos * 1e6:.2f} us de media, peor caso {peor * 1e3:.2f} ms")
+
+        almacen.cerrar()
+        escritura = time.perf_counter() - inicio
+        print(f"Eventos confirmados en disco: {eventos} en {escritura:.2f} s ({eventos / escritura:,.0f}/s)")
+
+        inicio = time.perf_counter()
+        recuperados = AlmacenEstado(ruta).cargar()
+        print(f"Recuperación solo con registro de eventos: {len(recuperados)} taxis en "
+              f"{time.perf_counter() - inicio:.3f} s")
+        if recuperados != {i: dict(info, ultima_asignacion=0) for i, info in taxis.items()}:
+            raise AssertionError("El estado recuperado no coincide con el escrito")
+
+        almacen = AlmacenEstado(ruta)
+        almacen.guardar_instantanea(taxis)
+        for id_taxi in range(0, args.taxis, 10):
+            almacen.registrar('actualizacion', id_taxi, taxis[id_taxi])
+        almacen.cerrar()
+
+        inicio = time.perf_counter()
+        recuperados = AlmacenEstado(ruta).cargar()
+        print(f"Recuperación con instantánea + {args.taxis // 10} eventos: {len(recuperados)} taxis en "
+              f"{time.perf_counter() - inicio:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# bench_bitacora.py
+# Rendimiento del servidor central y del broker con su salida por pantalla
+# conectada a una tubería que otro hilo va leyendo, como una terminal. Se
+# mide con la configuración de registro por defecto y, pasando --raiz con
+# una copia anterior del proyecto, con el print síncrono de antes.
+#
+#   - servidor: solicitudes/s y latencia con una flota simulada (flota.py);
+#   - broker en modo depuración (un registro por mensaje): mensajes/s
+#     entregados mientras varios publicadores envían sin pausa.
+#
+# Con --lector-lento MS el lector tarda MS milisegundos en cada lectura,
+# como una terminal remota o saturada.
+#
+# Uso: python -m benchmarks.bench_bitacora [--raiz DIRECTORIO] [--duracion 5] [--usuarios 8]
+#                                         [--taxis 20000] [--lector-lento 0]
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import zmq
+
+import protocolo
+from benchmarks.bench_broker import publicador
+from benchmarks.bench_solicitudes import percentil, usuario
+from broker import BROKER_BACKEND_CONNECT
+from servidor_central import USUARIO_SERVER_PORT
+
+N, M = 100, 100
+
+
+class Lector(threading.Thread):
+    # Vacía la salida de un componente contando líneas, como lo haría una terminal
+    def __init__(self, proceso, pausa):
+        super().__init__(daemon=True)
+        self.proceso = proceso
+        self.pausa = pausa
+        self.lineas = 0
+
+    def run(self):
+        while True:
+            datos = self.proceso.stdout.read1(65536)
+            if not datos:
+                return
+            self.lineas += datos.count(b'\n')
+            if self.pausa:
+                time.sleep(self.pausa)
+
+
+def lanzar(raiz, argumentos, entorno, pausa=None):
+    if pausa is None:
+        return subprocess.Popen([sys.executable] + argumentos, cwd=raiz, env=entorno,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    proceso = subprocess.Popen([sys.executable] + argumentos, cwd=raiz, env=entorno,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    lector = Lector(proceso, pausa)
+    lector.start()
+    return proceso, lector
+
+
+def terminar(procesos):
+    for proceso in procesos:
+        proceso.terminate()
+    for proceso in procesos:
+        try:
+            proceso.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+
+
+def medir_servidor(args, entorno):
+    broker = lanzar(args.raiz, ['broker.py'], entorno)
+    time.sleep(0.5)
+    servidor, lector = lanzar(args.raiz, ['servidor_central.py'], entorno, args.lector_lento / 1000)
+    time.sleep(1)
+    flota = lanzar(args.raiz, ['flota.py', str(args.taxis), str(N), str(M)], entorno)
+    try:
+        time.sleep(4)  # Registro de la flota
+        latencias, exitos = [], []
+        lineas_inicio = lector.lineas
+        fin = time.time() + args.duracion
+        url = f"tcp://127.0.0.1:{USUARIO_SERVER_PORT}"
+        hilos = [threading.Thread(target=usuario, args=(i, url, fin, N, M, latencias, exitos))
+                 for i in range(args.usuarios)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return len(latencias), len(exitos), latencias, lector.lineas - lineas_inicio
+    finally:
+        terminar([flota, servidor, broker])
+
+
+def medir_broker(args, entorno):
+    broker, lector = lanzar(args.raiz, ['broker.py', '--modo', 'depuracion'], entorno, args.lector_lento / 1000)
+    try:
+        time.sleep(1)
+        context = zmq.Context.instance()
+        suscriptor = context.socket(zmq.SUB)
+        suscriptor.connect(BROKER_BACKEND_CONNECT)
+        suscriptor.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_POSICION)
+        time.sleep(0.5)
+
+        inicio = time.time() + 1
+        fin = inicio + args.duracion
+        procesos = [multiprocessing.Process(target=publicador, args=(i, inicio, fin)) for i in range(2)]
+        for proceso in procesos:
+            proceso.start()
+        recibidos = 0
+        lineas_inicio = None
+        while time.time() < fin + 0.5:
+            if lineas_inicio is None and time.time() >= inicio:
+                lineas_inicio = lector.lineas
+            if suscriptor.poll(100):
+                try:
+                    while True:
+                        suscriptor.recv_multipart(zmq.NOBLOCK)
+                        recibidos += 1
+                except zmq.Again:
+                    pass
+        for proceso in procesos:
+            proceso.join()
+        suscriptor.close()
+        return recibidos, lector.lineas - (lineas_inicio or 0)
+    finally:
+        terminar([broker])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--raiz', default='.', help="Directorio del proyecto cuyos componentes se lanzan")
+    parser.add_argument('--duracion', type=float, default=5)
+    parser.add_argument('--usuarios', type=int, default=8)
+    parser.add_argument('--taxis', type=int, default=20000)
+    parser.add_argument('--lector-lento', type=float, default=0, metavar='MS')
+    args = parser.parse_args()
+
+    entorno = dict(os.environ, ESCALA_TIEMPO='30')
+    print(f"Componentes de {os.path.abspath(args.raiz)}"
+          f"{f', lector lento ({args.lector_lento:g} ms por lectura)' if args.lector_lento else ''}")
+
+    solicitudes, exitos, latencias, lineas = medir_servidor(args, entorno)
+    print(f"Servidor: {solicitudes / args.duracion:,.0f} solicitudes/s ({exitos} con taxi), "
+          f"p50 {percentil(latencias, 50) * 1e3:.2f} ms, p99 {percentil(latencias, 99) * 1e3:.2f} ms, "
+          f"{lineas / args.duracion:,.0f} líneas/s de salida")
+
+    recibidos, lineas = medir_broker(args, entorno)
+    print(f"Broker (depuración): {recibidos / args.duracion:,.0f} mensajes/s entregados, "
+          f"{lineas / args.duracion:,.0f} líneas/s de salida")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# bench_broker.py
+# Mensajes por segundo que el broker entrega a un suscriptor mientras varios
+# publicadores envían actualizaciones de posición sin pausa. El broker se
+# lanza como proceso aparte con los argumentos indicados.
+#
+# Uso: python -m benchmarks.bench_broker [--duracion 5] [--publicadores 4] [-- <args del broker>]
+import argparse
+import multiprocessing
+import subprocess
+import sys
+import time
+
+import zmq
+
+import protocolo
+from broker import BROKER_BACKEND_CONNECT, BROKER_FRONTEND_CONNECT
+
+
+def publicador(id_publicador, inicio, fin):
+    # Cada publicador es un proceso aparte con sus mensajes ya codificados,
+    # para que el cuello de botella sea el broker y no quien publica
+    context = zmq.Context()
+    socket = context.socket(zmq.PUB)
+    socket.connect(BROKER_FRONTEND_CONNECT)
+    mensajes = [protocolo.empaquetar({
+        'tipo': 'actualizacion', 'id': id_publicador * 1_000_000 + i, 'posicion': (i % 100, 7),
+        'ocupado': False, 'servicios': 0, 'timestamp': time.time()
+    }) for i in range(1000)]
+    time.sleep(max(0.0, inicio - time.time()))
+    while time.time() < fin:
+        for mensaje in mensajes:
+            socket.send_multipart(mensaje)
+    socket.close()
+    context.term()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--duracion', type=float, default=5)
+    parser.add_argument('--publicadores', type=int, default=4)
+    parser.add_argument('args_broker', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    args_broker = [a for a in args.args_broker if a != '--']
+
+    broker = subprocess.Popen([sys.executable, 'broker.py'] + args_broker,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(1)
+        context = zmq.Context.instance()
+        suscriptor = context.socket(zmq.SUB)
+        suscriptor.connect(BROKER_BACKEND_CONNECT)
+        suscriptor.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_POSICION)
+        time.sleep(0.5)
+
+        inicio = time.time() + 1
+        fin = inicio + args.duracion
+        procesos = [multiprocessing.Process(target=publicador, args=(i, inicio, fin))
+                    for i in range(args.publicadores)]
+        for proceso in procesos:
+            proceso.start()
+
+        recibidos = 0
+        poller = zmq.Poller()
+        poller.register(suscriptor, zmq.POLLIN)
+        while time.time() < fin + 0.5:
+            if poller.poll(100):
+                try:
+                    while True:
+                        suscriptor.recv_multipart(zmq.NOBLOCK)
+                        recibidos += 1
+                except zmq.Again:
+                    pass
+        for proceso in procesos:
+            proceso.join()
+        transcurrido = args.duracion
+
+        print(f"Broker {' '.join(args_broker) or '(por defecto)'}: "
+              f"{recibidos} mensajes entregados, {recibidos / transcurrido:,.0f} mensajes/s")
+        suscriptor.close()
+    finally:
+        broker.terminate()
+        broker.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# bench_broker_cluster.py
+# Mensajes por segundo que entrega el broker en modo clúster (broker.py
+# --forwarders K) con 1, 2, 4 y 8 reenviadores. Los publicadores envían
+# actualizaciones de posición sin pausa, cada una al reenviador de su taxi
+# según enrutamiento.py, y cada reenviador tiene un suscriptor propio; el
+# total es la suma de lo entregado a todos.
+#
+# Cada reenviador, publicador y suscriptor es un proceso aparte: el
+# resultado solo escala si la máquina tiene núcleos libres para ellos.
+#
+# Uso: python -m benchmarks.bench_broker_cluster [--forwarders 1,2,4,8] [--publicadores 4] [--duracion 5]
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import zmq
+
+import enrutamiento
+import protocolo
+from broker import BROKER_BACKEND_PORT, BROKER_FORWARDERS_BASE_PORT, BROKER_FRONTEND_PORT, BROKER_IP
+
+
+def tabla_de(num_forwarders):
+    return enrutamiento.Enrutamiento(BROKER_IP, BROKER_FRONTEND_PORT, BROKER_BACKEND_PORT,
+                                     BROKER_FORWARDERS_BASE_PORT, num_forwarders)
+
+
+def publicador(id_publicador, num_forwarders, inicio, fin):
+    # Mensajes ya codificados, como en bench_broker, y un PUB por reenviador como la flota
+    tabla = tabla_de(num_forwarders)
+    context = zmq.Context()
+    sockets = []
+    for url in tabla.frontends():
+        socket = context.socket(zmq.PUB)
+        socket.connect(url)
+        sockets.append(socket)
+    mensajes = []
+    for i in range(1000):
+        id_taxi = id_publicador * 1_000_000 + i
+        mensajes.append((sockets[tabla.forwarder_de(id_taxi)], protocolo.empaquetar({
+            'tipo': 'actualizacion', 'id': id_taxi, 'posicion': (i % 100, 7),
+            'ocupado': False, 'servicios': 0, 'timestamp': time.time()
+        })))
+    time.sleep(max(0.0, inicio - time.time()))
+    while time.time() < fin:
+        for socket, mensaje in mensajes:
+            socket.send_multipart(mensaje)
+    for socket in sockets:
+        socket.close()
+    context.term()
+
+
+def suscriptor(url, listo, fin, recibidos):
+    context = zmq.Context()
+    socket = context.socket(zmq.SUB)
+    socket.connect(url)
+    socket.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_POSICION)
+    listo.set()
+    total = 0
+    poller = zmq.Poller()
+    poller.register(socket, zmq.POLLIN)
+    while time.time() < fin.value + 0.5:
+        if poller.poll(100):
+            try:
+                while True:
+                    socket.recv_multipart(zmq.NOBLOCK)
+                    total += 1
+            except zmq.Again:
+                pass
+    recibidos.put(total)
+    socket.close()
+    context.term()
+
+
+def medir(num_forwarders, num_publicadores, duracion):
+    broker = subprocess.Popen([sys.executable, 'broker.py', '--forwarders', str(num_forwarders)],
+                              env=dict(os.environ, NIVEL_LOG='WARNING'),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(1.5)
+        tabla = tabla_de(num_forwarders)
+        fin = multiprocessing.Value('d', float('inf'))
+        recibidos = multiprocessing.Queue()
+        listos = [multiprocessing.Event() for _ in range(num_forwarders)]
+        suscriptores = [multiprocessing.Process(target=suscriptor, args=(url, listo, fin, recibidos))
+                        for url, listo in zip(tabla.backends(), listos)]
+        for proceso in suscriptores:
+            proceso.start()
+        for listo in listos:
+            listo.wait()
+        time.sleep(0.5)  # Que las suscripciones lleguen a los publicadores
+
+        inicio = time.time() + 1
+        fin.value = inicio + duracion
+        publicadores = [multiprocessing.Process(target=publicador, args=(i, num_forwarders, inicio, fin.value))
+                        for i in range(num_publicadores)]
+        for proceso in publicadores:
+            proceso.start()
+        for proceso in publicadores:
+            proceso.join()
+        total = sum(recibidos.get() for _ in suscriptores)
+        for proceso in suscriptores:
+            proceso.join()
+        return total
+    finally:
+        broker.terminate()
+        broker.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--forwarders', default='1,2,4,8')
+    parser.add_argument('--publicadores', type=int, default=4)
+    parser.add_argument('--duracion', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} núcleos, {args.publicadores} publicadores")
+    for num_forwarders in (int(k) for k in args.forwarders.split(',') if k):
+        total = medir(num_forwarders, args.publicadores, args.duracion)
+        print(f"{num_forwarders} reenviadores: {total} mensajes entregados, {total / args.duracion:,.0f} mensajes/s")
+
+
+if __name__ == "__main__":
+    main()
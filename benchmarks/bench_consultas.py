@@ -0,0 +1,148 @@
+# bench_consultas.py
+# Latencia de las consultas de la flota (consultas.py) y su efecto sobre la
+# asignación: usuarios pidiendo taxi sin pausa, un hilo aplicando
+# actualizaciones de posición como procesar_actualizaciones_taxis y, según
+# la fase, clientes consultando sin pausa (rango, cercanos y resumen a
+# partes iguales):
+#   - sin consultas;
+#   - consultas sobre la instantánea (ServidorConsultas);
+#   - las mismas consultas sobre el estado vivo con el lock del servidor,
+#     como se harían sin instantánea.
+# El servidor se levanta en el mismo proceso con la flota cargada en memoria.
+#
+# Uso: python -m benchmarks.bench_consultas [--duracion 8] [--usuarios 8] [--clientes 2]
+#                                          [--taxis 100000] [--intervalo 1.0]
+import argparse
+import random
+import threading
+import time
+
+import numpy as np
+import zmq
+
+import servidor_central
+from benchmarks.bench_solicitud_lote import restablecer_flota
+from benchmarks.bench_solicitudes import percentil, usuario
+from consultas import ServidorConsultas
+from disponibilidad import LIBRE
+from metricas import Histograma
+from servidor_central import ServidorCentral
+
+N = M = 1000
+PUERTO_CON_LOCK = servidor_central.CONSULTAS_BASE_PORT + 99
+ORDENES = ('rango', 'cercanos', 'resumen')
+
+
+class ConsultasConLock(ServidorConsultas):
+    # Las mismas respuestas calculadas sobre el estado vivo del servidor
+    def responder(self, peticion):
+        servidor = self.servidor
+        orden = peticion['orden']
+        with servidor.lock:
+            if orden == 'resumen':
+                return {'taxis': len(servidor.taxis), 'por_estado': servidor.disponibilidad.resumen()}
+            if orden == 'cercanos':
+                return {'taxis': servidor.indice.k_mas_cercanos(tuple(peticion['posicion']), peticion['k'])}
+            x, y = peticion['posicion']
+            distancias = (np.abs(servidor.taxis.columna('x') - x) + np.abs(servidor.taxis.columna('y') - y))
+            ids = servidor.taxis.columna('id')[distancias <= peticion['radio']].tolist()
+            estados = servidor.disponibilidad.estados
+            return {'total': len(ids), 'taxis': [[id_taxi, estados.get(id_taxi) == LIBRE] for id_taxi in ids]}
+
+
+def actualizador(servidor, num_taxis, fin, por_segundo, h_espera):
+    # Lotes cada 10 ms, como los que aplica procesar_actualizaciones_taxis
+    generador = random.Random(3)
+    por_lote = max(1, por_segundo // 100)
+    while time.time() < fin:
+        mensajes = []
+        for _ in range(por_lote):
+            id_taxi = generador.randrange(num_taxis)
+            mensajes.append({'tipo': 'actualizacion', 'id': id_taxi, 'timestamp': time.time(),
+                             'posicion': (generador.randint(0, N), generador.randint(0, M)),
+                             'ocupado': False, 'servicios': 0})
+        inicio = time.perf_counter()
+        with servidor.lock:
+            h_espera.registrar(time.perf_counter() - inicio)
+            for mensaje in mensajes:
+                servidor.aplicar_mensaje(mensaje)
+            servidor.disponibilidad.vencer(servidor.reloj())
+        time.sleep(0.01)
+
+
+def cliente_consultas(id_cliente, puerto, fin, latencias):
+    socket = zmq.Context.instance().socket(zmq.REQ)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.connect(f"tcp://127.0.0.1:{puerto}")
+    generador = random.Random(100 + id_cliente)
+    i = 0
+    while time.time() < fin:
+        orden = ORDENES[i % len(ORDENES)]
+        i += 1
+        posicion = [generador.randint(0, N), generador.randint(0, M)]
+        peticion = {'orden': orden, 'posicion': posicion, 'radio': 20, 'k': 10}
+        inicio = time.perf_counter()
+        socket.send_json(peticion)
+        respuesta = socket.recv_json()
+        latencias[orden].append(time.perf_counter() - inicio)
+        if 'error' in respuesta:
+            raise RuntimeError(respuesta['error'])
+    socket.close()
+
+
+def fase(servidor, args, puerto):
+    restablecer_flota(servidor, args.taxis)
+    servidor.h_espera_lock = Histograma()
+    h_espera_actualizaciones = Histograma()
+    latencias, exitos = [], []
+    consultas = {orden: [] for orden in ORDENES}
+    fin = time.time() + args.duracion
+    hilos = [threading.Thread(target=usuario, args=(i, servidor_central.USUARIO_SERVER_URL, fin, N, M,
+                                                    latencias, exitos))
+             for i in range(args.usuarios)]
+    hilos.append(threading.Thread(target=actualizador, args=(servidor, args.taxis, fin, args.actualizaciones,
+                                                             h_espera_actualizaciones)))
+    if puerto is not None:
+        hilos += [threading.Thread(target=cliente_consultas, args=(i, puerto, fin, consultas))
+                  for i in range(args.clientes)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return latencias, consultas, servidor.h_espera_lock.resumen(), h_espera_actualizaciones.resumen()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--duracion', type=float, default=8)
+    parser.add_argument('--usuarios', type=int, default=8)
+    parser.add_argument('--clientes', type=int, default=2, help="Clientes de consultas concurrentes")
+    parser.add_argument('--taxis', type=int, default=100_000)
+    parser.add_argument('--actualizaciones', type=int, default=2000, help="Actualizaciones de posición por segundo")
+    parser.add_argument('--intervalo', type=float, default=1.0, help="Segundos entre instantáneas")
+    args = parser.parse_args()
+
+    puerto = servidor_central.CONSULTAS_BASE_PORT + 1
+    servidor = ServidorCentral(N, M, puerto_consultas=puerto, intervalo_consultas=args.intervalo)
+    restablecer_flota(servidor, args.taxis)
+    threading.Thread(target=servidor.iniciar, daemon=True).start()
+    ConsultasConLock(servidor, PUERTO_CON_LOCK).iniciar()
+    time.sleep(1)
+
+    for nombre, puerto_fase in (('sin consultas', None), ('consultas sobre la instantánea', puerto),
+                                ('consultas con el lock', PUERTO_CON_LOCK)):
+        latencias, consultas, espera_lock, espera_actualizaciones = fase(servidor, args, puerto_fase)
+        print(f"{nombre}: asignación {len(latencias) / args.duracion:.0f}/s, p50 "
+              f"{percentil(latencias, 50) * 1000:.2f} ms, p99 {percentil(latencias, 99) * 1000:.2f} ms; "
+              f"espera del lock p99 {espera_lock['p99']:.3f} ms (solicitudes), "
+              f"{espera_actualizaciones['p99']:.3f} ms (actualizaciones)")
+        for orden, valores in consultas.items():
+            if valores:
+                print(f"  {orden:<9} {len(valores) / args.duracion:6.0f}/s, p50 {percentil(valores, 50) * 1000:.2f} ms, "
+                      f"p99 {percentil(valores, 99) * 1000:.2f} ms")
+    instantanea = servidor.metricas.instantanea()['histogramas']['consultas.instantanea']
+    print(f"Instantánea de {args.taxis} taxis: p50 {instantanea['p50']:.1f} ms, máximo {instantanea['max']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
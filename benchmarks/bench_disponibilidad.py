@@ -0,0 +1,102 @@
+# bench_disponibilidad.py
+# Coste de una solicitud con la máquina de estados de disponibilidad frente
+# a la comprobación anterior, que dejaba en el índice a los taxis en espera
+# tras una asignación y los descartaba uno a uno con un filtro de tiempo.
+#
+# Parte de la flota está en espera (asignada hace menos de la espera) y
+# otra parte retirada. El tiempo simulado avanza entre solicitudes de modo
+# que en promedio un taxi sale de la espera por solicitud; ambas versiones
+# deben asignar siempre el mismo taxi.
+#
+# Uso: python -m benchmarks.bench_disponibilidad [--taxis 100000] [--en-espera 0.6] [--retirados 0.2]
+#                                               [--consultas 2000]
+import argparse
+import random
+import time
+
+from disponibilidad import Disponibilidad
+from indice_espacial import IndiceEspacial
+
+ESPERA = 31.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--taxis', type=int, default=100000)
+    parser.add_argument('--en-espera', type=float, default=0.6, help="Fracción de taxis en espera")
+    parser.add_argument('--retirados', type=float, default=0.2, help="Fracción de taxis con 3 servicios")
+    parser.add_argument('--consultas', type=int, default=2000)
+    parser.add_argument('--N', type=int, default=1000)
+    parser.add_argument('--M', type=int, default=1000)
+    args = parser.parse_args()
+
+    generador = random.Random(5)
+    ahora = 1000.0
+    taxis = {}
+    for id_taxi in range(args.taxis):
+        pos = (generador.randint(0, args.N), generador.randint(0, args.M))
+        sorteo = generador.random()
+        if sorteo < args.retirados:
+            taxis[id_taxi] = (pos, 3, ahora - 100)
+        elif sorteo < args.retirados + args.en_espera:
+            taxis[id_taxi] = (pos, 1, ahora - generador.uniform(0, ESPERA))
+        else:
+            taxis[id_taxi] = (pos, 0, 0.0)
+
+    # Versión anterior: en el índice todo taxi libre con menos de 3 servicios,
+    # y el filtro comprueba la espera de cada candidato
+    indice_anterior = IndiceEspacial(args.N, args.M)
+    ultima_asignacion = {}
+    for id_taxi, (pos, servicios, asignacion) in taxis.items():
+        indice_anterior.actualizar(id_taxi, pos, servicios < 3)
+        ultima_asignacion[id_taxi] = asignacion
+
+    indice = IndiceEspacial(args.N, args.M)
+    disponibilidad = Disponibilidad(indice, ESPERA)
+    for id_taxi, (pos, servicios, asignacion) in taxis.items():
+        disponibilidad.actualizar(id_taxi, pos, False, servicios, asignacion, ahora)
+
+    consultas = [(generador.randint(0, args.N), generador.randint(0, args.M)) for _ in range(args.consultas)]
+    # Régimen estable: en promedio una espera termina por solicitud, igual
+    # que cada solicitud asignada pone un taxi en espera
+    en_espera = sum(1 for _, servicios, _ in taxis.values() if servicios == 1)
+    paso = ESPERA / max(1, en_espera)
+    filtradas = [0]
+    tiempo_anterior = tiempo_nuevo = tiempo_vencer = 0.0
+    for i, pos in enumerate(consultas):
+        instante = ahora + i * paso
+
+        def fuera_de_espera(id_taxi):
+            filtradas[0] += 1
+            return instante - ultima_asignacion[id_taxi] > ESPERA
+
+        inicio = time.perf_counter()
+        esperado, _ = indice_anterior.mas_cercano(pos, fuera_de_espera)
+        if esperado is not None:
+            indice_anterior.marcar_elegible(esperado, False)
+            ultima_asignacion[esperado] = instante
+        tiempo_anterior += time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        disponibilidad.vencer(instante)
+        tiempo_vencer += time.perf_counter() - inicio
+        obtenido, _ = indice.mas_cercano(pos)
+        if obtenido is not None:
+            disponibilidad.reservar(obtenido)
+        tiempo_nuevo += time.perf_counter() - inicio
+
+        if obtenido != esperado:
+            raise AssertionError(f"Consulta {i} en {pos}: disponibilidad asignó {obtenido}, filtro {esperado}")
+
+    print(f"{args.taxis} taxis ({args.en_espera:.0%} en espera, {args.retirados:.0%} retirados), "
+          f"{args.consultas} solicitudes con el mismo resultado")
+    print(f"Filtro de espera por candidato: {tiempo_anterior / args.consultas * 1e3:.3f} ms por solicitud, "
+          f"{filtradas[0] / args.consultas:.1f} comprobaciones de espera por solicitud")
+    print(f"Máquina de disponibilidad:      {tiempo_nuevo / args.consultas * 1e3:.3f} ms por solicitud "
+          f"({tiempo_vencer / args.consultas * 1e3:.3f} ms de ellos venciendo esperas, "
+          f"{(tiempo_nuevo - tiempo_vencer) / args.consultas * 1e3:.3f} ms de búsqueda)")
+    print(f"Estados finales: {disponibilidad.resumen()}")
+
+
+if __name__ == "__main__":
+    main()
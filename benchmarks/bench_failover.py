@@ -0,0 +1,136 @@
+# bench_failover.py
+# Prueba local de tolerancia a fallos: levanta broker, servidor primario y
+# réplica como procesos, registra una flota, lanza usuarios que piden taxis
+# sin pausa y mata al primario a mitad de la carga. Mide cuánto tardan los
+# usuarios en volver a ser atendidos (por la réplica) y si algún taxi se
+# asignó dos veces.
+#
+# Uso: python -m benchmarks.bench_failover [--usuarios 8] [--taxis 20000] [--duracion 8] [--matar-en 3]
+import argparse
+import contextlib
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import zmq
+
+import protocolo
+from broker import BROKER_BACKEND_CONNECT, BROKER_FRONTEND_CONNECT
+from usuario import Usuario
+
+
+def lanzar(*args):
+    return subprocess.Popen([sys.executable] + list(args), stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+
+
+def registrar_flota(num_taxis, N, M):
+    context = zmq.Context.instance()
+    socket = context.socket(zmq.PUB)
+    socket.connect(BROKER_FRONTEND_CONNECT)
+    time.sleep(0.5)
+    generador = random.Random(0)
+    for id_taxi in range(num_taxis):
+        socket.send_multipart(protocolo.empaquetar({
+            'tipo': 'registro', 'id': id_taxi, 'velocidad': 0,
+            'posicion': (generador.randint(0, N), generador.randint(0, M))
+        }))
+        if id_taxi % 500 == 499:
+            time.sleep(0.05)  # Sin ráfagas que superen el límite de cola del broker
+    socket.close()
+
+
+def confirmar_asignaciones(fin):
+    # Hace de flota: confirma cada asignación como lo haría el taxi real,
+    # para que el servidor deje de reenviarla
+    context = zmq.Context.instance()
+    suscriptor = context.socket(zmq.SUB)
+    suscriptor.connect(BROKER_BACKEND_CONNECT)
+    suscriptor.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_ASIGNACION)
+    publicador = context.socket(zmq.PUB)
+    publicador.connect(BROKER_FRONTEND_CONNECT)
+    while time.time() < fin:
+        if not suscriptor.poll(100):
+            continue
+        mensaje = protocolo.decodificar(suscriptor.recv_multipart()[-1])
+        publicador.send_multipart(protocolo.empaquetar({
+            'tipo': 'actualizacion', 'id': mensaje['taxi_id'], 'posicion': mensaje['pos_usuario'],
+            'ocupado': True, 'servicios': 1, 'timestamp': time.time()
+        }))
+    suscriptor.close()
+    publicador.close()
+
+
+def usuario(id_usuario, fin, N, M, resultados):
+    generador = random.Random(id_usuario)
+    cliente = Usuario(id_usuario, (0, 0), 0, N, M)
+    while time.time() < fin:
+        cliente.posicion = (generador.randint(0, N), generador.randint(0, M))
+        cliente.ultima_respuesta = None
+        inicio = time.time()
+        cliente.solicitar_taxi()
+        respuesta = cliente.ultima_respuesta
+        resultados.append((inicio, time.time(), respuesta is not None,
+                           respuesta.get('taxi_id') if respuesta and respuesta.get('exito') else None))
+    cliente.socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--usuarios', type=int, default=8)
+    parser.add_argument('--taxis', type=int, default=20_000)
+    parser.add_argument('--duracion', type=float, default=8)
+    parser.add_argument('--matar-en', type=float, default=3)
+    args = parser.parse_args()
+    N = M = 100
+
+    procesos = [lanzar('broker.py')]
+    time.sleep(0.5)
+    primario = lanzar('servidor_central.py')
+    procesos += [primario, lanzar('servidor_central.py', '--replica')]
+    try:
+        time.sleep(1.5)
+        registrar_flota(args.taxis, N, M)
+
+        resultados = []
+        inicio = time.time() + 1
+        fin = inicio + args.duracion
+        threading.Thread(target=confirmar_asignaciones, args=(fin,), daemon=True).start()
+        time.sleep(1)
+        with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+            hilos = [threading.Thread(target=usuario, args=(i, fin, N, M, resultados))
+                     for i in range(args.usuarios)]
+            for hilo in hilos:
+                hilo.start()
+            time.sleep(args.matar_en)
+            primario.send_signal(signal.SIGKILL)
+            muerte = time.time()
+            for hilo in hilos:
+                hilo.join()
+
+        antes = [r for r in resultados if r[1] < muerte]
+        despues = [r for r in resultados if r[0] >= muerte]
+        afectadas = [r for r in resultados if r[0] < muerte <= r[1]]
+        asignados = [r[3] for r in resultados if r[3] is not None]
+
+        print(f"Solicitudes: {len(resultados)} ({sum(1 for r in resultados if not r[2])} sin respuesta)")
+        print(f"Antes de la caída: {len(antes) / (muerte - inicio):.0f} solicitudes/s")
+        print(f"Después de la caída: {len(despues) / max(fin - muerte, 1e-9):.0f} solicitudes/s")
+        if afectadas:
+            # Recuperación: hasta que la última solicitud en curso al matar al primario obtiene respuesta
+            print(f"Solicitudes en curso durante la caída: {len(afectadas)}, "
+                  f"latencia máxima {max(r[1] - r[0] for r in afectadas) * 1e3:.0f} ms")
+            print(f"Tiempo de recuperación: {(max(r[1] for r in afectadas) - muerte) * 1e3:.0f} ms")
+        print(f"Taxis asignados dos veces: {len(asignados) - len(set(asignados))}")
+    finally:
+        for proceso in procesos:
+            proceso.kill()
+            proceso.wait()
+
+
+if __name__ == "__main__":
+    main()
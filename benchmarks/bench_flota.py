@@ -0,0 +1,94 @@
+# bench_flota.py
+# Coste de simular una flota grande con flota.py: actualizaciones por
+# segundo que llegan a un suscriptor a través del broker, CPU y memoria del
+# proceso de la flota. Como referencia se mide también la memoria de un
+# único proceso de taxi.py, que es lo que costaba cada taxi hasta ahora.
+#
+# Uso: python -m benchmarks.bench_flota [--taxis 50000] [--escala 30] [--duracion 20]
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import zmq
+
+import protocolo
+from benchmarks.bench_sistema import uso_proceso
+from broker import BROKER_BACKEND_CONNECT
+
+
+def lanzar(args, entorno):
+    return subprocess.Popen([sys.executable] + args, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, env=entorno)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--taxis', type=int, default=50000)
+    parser.add_argument('--escala', type=float, default=30, help="Factor de compresión del tiempo")
+    parser.add_argument('--duracion', type=float, default=20)
+    args = parser.parse_args()
+
+    entorno = dict(os.environ, ESCALA_TIEMPO=str(args.escala))
+    procesos = []
+    context = zmq.Context()
+    socket = context.socket(zmq.SUB)
+    socket.setsockopt(zmq.RCVHWM, 0)
+    try:
+        procesos.append(lanzar(['broker.py'], entorno))
+        time.sleep(0.5)
+        socket.connect(BROKER_BACKEND_CONNECT)
+        socket.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_REGISTRO)
+        socket.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_POSICION)
+
+        flota = lanzar(['flota.py', str(args.taxis), '100', '100', '--semilla', '1'], entorno)
+        procesos.append(flota)
+
+        # Registro completo de la flota
+        inicio = time.time()
+        registrados = 0
+        while registrados < args.taxis and time.time() - inicio < 60:
+            if socket.poll(1000):
+                mensaje = protocolo.decodificar(socket.recv_multipart()[-1])
+                registrados += sum(1 for m in protocolo.desagrupar(mensaje) if m['tipo'] == 'registro')
+        print(f"Registrados {registrados} de {args.taxis} taxis en {time.time() - inicio:.2f} s "
+              f"(incluye 1 s de espera inicial de la flota)")
+
+        cpu_inicial, _ = uso_proceso(flota.pid)
+        inicio = time.time()
+        fin = inicio + args.duracion
+        actualizaciones = mensajes = 0
+        rss_maximo = 0.0
+        while time.time() < fin:
+            if socket.poll(100):
+                mensaje = protocolo.decodificar(socket.recv_multipart()[-1])
+                mensajes += 1
+                actualizaciones += len(protocolo.desagrupar(mensaje))
+            rss_maximo = max(rss_maximo, uso_proceso(flota.pid)[1])
+        cpu_final, _ = uso_proceso(flota.pid)
+        transcurrido = time.time() - inicio
+
+        esperadas = args.taxis * 3 / 4 * args.escala / 30  # Las velocidades 1, 2 y 4 publican cada intervalo
+        print(f"Actualizaciones recibidas: {actualizaciones / transcurrido:.0f}/s "
+              f"(esperadas ~{esperadas:.0f}/s) en {mensajes / transcurrido:.1f} mensajes/s")
+        print(f"Flota: CPU {100 * (cpu_final - cpu_inicial) / transcurrido:.1f}%, RSS máx {rss_maximo:.1f} MB "
+              f"({rss_maximo * 1024 / args.taxis:.2f} KB por taxi)")
+
+        # Referencia: un taxi de taxi.py en su propio proceso
+        taxi = lanzar(['taxi.py', '0', '100', '100', '5,5', '1'], entorno)
+        procesos.append(taxi)
+        time.sleep(3)
+        _, rss_taxi = uso_proceso(taxi.pid)
+        print(f"Un proceso de taxi.py: RSS {rss_taxi:.1f} MB; {args.taxis} procesos serían "
+              f"~{rss_taxi * args.taxis / 1024:.0f} GB")
+    finally:
+        socket.close()
+        context.term()
+        for proceso in procesos:
+            proceso.kill()
+            proceso.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# bench_indice_espacial.py
+# Compara el recorrido lineal original de encontrar_taxi_cercano con el
+# índice espacial por celdas para flotas de distinto tamaño.
+#
+# Uso: python -m benchmarks.bench_indice_espacial [--N 1000] [--M 1000] [--consultas 1000]
+import argparse
+import random
+import time
+
+from indice_espacial import IndiceEspacial
+
+
+def busqueda_lineal(taxis, pos_usuario):
+    # Misma lógica que la versión original: recorre todos los taxis
+    taxi_cercano = None
+    menor_distancia = float('inf')
+    for id_taxi, info in taxis.items():
+        if not info['ocupado'] and info['servicios'] < 3:
+            distancia = abs(info['pos'][0] - pos_usuario[0]) + abs(info['pos'][1] - pos_usuario[1])
+            if distancia < menor_distancia or (
+                    distancia == menor_distancia and
+                    (taxi_cercano is None or id_taxi < taxi_cercano)
+            ):
+                menor_distancia = distancia
+                taxi_cercano = id_taxi
+    return taxi_cercano
+
+
+def medir(num_taxis, N, M, num_consultas, generador):
+    taxis = {}
+    indice = IndiceEspacial(N, M)
+
+    inicio = time.perf_counter()
+    for id_taxi in range(num_taxis):
+        pos = (generador.randint(0, N), generador.randint(0, M))
+        ocupado = generador.random() < 0.2
+        taxis[id_taxi] = {'pos': pos, 'ocupado': ocupado, 'servicios': 0}
+        indice.actualizar(id_taxi, pos, not ocupado)
+    tiempo_carga = time.perf_counter() - inicio
+
+    consultas = [(generador.randint(0, N), generador.randint(0, M)) for _ in range(num_consultas)]
+
+    # El recorrido lineal es muy lento con flotas grandes, se usan menos consultas
+    consultas_lineales = consultas[:max(10, num_consultas * 10000 // max(num_taxis, 1))]
+    inicio = time.perf_counter()
+    resultados_lineales = [busqueda_lineal(taxis, pos) for pos in consultas_lineales]
+    tiempo_lineal = (time.perf_counter() - inicio) / len(consultas_lineales)
+
+    inicio = time.perf_counter()
+    resultados_indice = [indice.mas_cercano(pos)[0] for pos in consultas]
+    tiempo_indice = (time.perf_counter() - inicio) / len(consultas)
+
+    if resultados_lineales != resultados_indice[:len(consultas_lineales)]:
+        raise AssertionError("El índice devolvió un taxi distinto al recorrido lineal")
+
+    # Actualizaciones de posición en el índice (equivalente a un mensaje 'actualizacion')
+    inicio = time.perf_counter()
+    for _ in range(num_consultas):
+        id_taxi = generador.randrange(num_taxis)
+        pos = (generador.randint(0, N), generador.randint(0, M))
+        indice.actualizar(id_taxi, pos, not taxis[id_taxi]['ocupado'])
+    tiempo_actualizacion = (time.perf_counter() - inicio) / num_consultas
+
+    return tiempo_carga, tiempo_lineal, tiempo_indice, tiempo_actualizacion
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--N', type=int, default=1000)
+    parser.add_argument('--M', type=int, default=1000)
+    parser.add_argument('--consultas', type=int, default=1000)
+    parser.add_argument('--taxis', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--semilla', type=int, default=1)
+    args = parser.parse_args()
+
+    generador = random.Random(args.semilla)
+    print(f"Ciudad {args.N}x{args.M}, {args.consultas} consultas por tamaño de flota")
+    print(f"{'taxis':>10} {'carga (s)':>10} {'lineal (ms)':>12} {'índice (ms)':>12} {'mejora':>8} {'act. (us)':>10}")
+    for num_taxis in args.taxis:
+        carga, lineal, indice, actualizacion = medir(num_taxis, args.N, args.M, args.consultas, generador)
+        print(f"{num_taxis:>10} {carga:>10.2f} {lineal * 1e3:>12.3f} {indice * 1e3:>12.4f} "
+              f"{lineal / indice:>7.0f}x {actualizacion * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# bench_latencia_asignacion.py
+# Latencia entre que se publica una asignación y el taxi la confirma
+# (actualización con ocupado=True), con una flota de taxis reales de
+# taxi.py. El benchmark hace de servidor central: publica asignaciones a
+# taxis al azar y escucha las confirmaciones en el tópico de posiciones.
+#
+# Uso: python -m benchmarks.bench_latencia_asignacion [--taxis 1000] [--asignaciones 200] [--duracion 60]
+import argparse
+import contextlib
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import zmq
+
+import protocolo
+from broker import BROKER_BACKEND_CONNECT, BROKER_FRONTEND_CONNECT
+
+
+def hospedar_taxis(ids, N, M):
+    # Varios taxis por proceso, cada uno en su hilo, para no lanzar miles de procesos
+    from taxi import Taxi
+
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        generador = random.Random(ids[0])
+        taxis = []
+        for id_taxi in ids:
+            pos = (generador.randint(0, N), generador.randint(0, M))
+            hilo = threading.Thread(target=lambda i=id_taxi, p=pos: Taxi(i, N, M, p, 2).iniciar(), daemon=True)
+            hilo.start()
+            taxis.append(hilo)
+        for hilo in taxis:
+            hilo.join()
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--taxis', type=int, default=1000)
+    parser.add_argument('--taxis-por-proceso', type=int, default=100)
+    parser.add_argument('--asignaciones', type=int, default=200)
+    parser.add_argument('--duracion', type=float, default=60,
+                        help="Segundos máximos esperando confirmaciones")
+    args = parser.parse_args()
+    N = M = 100
+
+    broker = subprocess.Popen([sys.executable, 'broker.py'], stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    procesos = []
+    context = zmq.Context()
+    try:
+        suscriptor = context.socket(zmq.SUB)
+        suscriptor.setsockopt(zmq.RCVHWM, 0)
+        suscriptor.connect(BROKER_BACKEND_CONNECT)
+        suscriptor.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_REGISTRO)
+        suscriptor.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_POSICION)
+        publicador = context.socket(zmq.PUB)
+        publicador.connect(BROKER_FRONTEND_CONNECT)
+        time.sleep(1)
+
+        ids = list(range(args.taxis))
+        for i in range(0, len(ids), args.taxis_por_proceso):
+            proceso = multiprocessing.Process(target=hospedar_taxis,
+                                              args=(ids[i:i + args.taxis_por_proceso], N, M), daemon=True)
+            proceso.start()
+            procesos.append(proceso)
+
+        # Esperar a que todos los taxis se registren
+        registrados = set()
+        limite = time.time() + 60
+        while len(registrados) < args.taxis and time.time() < limite:
+            if suscriptor.poll(1000):
+                mensaje = protocolo.decodificar(suscriptor.recv_multipart()[-1])
+                if mensaje['tipo'] == 'registro':
+                    registrados.add(mensaje['id'])
+        print(f"Taxis registrados: {len(registrados)} de {args.taxis}")
+
+        elegidos = random.Random(0).sample(sorted(registrados), min(args.asignaciones, len(registrados)))
+        enviados = {}
+        confirmados = {}
+        siguiente = time.time()
+        limite = time.time() + args.duracion
+        while time.time() < limite and len(confirmados) < len(elegidos):
+            # Se publican unas 20 asignaciones por segundo mientras se escuchan confirmaciones
+            if len(enviados) < len(elegidos) and time.time() >= siguiente:
+                id_taxi = elegidos[len(enviados)]
+                enviados[id_taxi] = time.time()
+                publicador.send_multipart(protocolo.empaquetar({
+                    'tipo': 'servicio_asignado', 'taxi_id': id_taxi, 'pos_usuario': (0, 0),
+                    'id_usuario': len(enviados), 'id_asignacion': len(enviados)
+                }))
+                siguiente += 0.05
+            if suscriptor.poll(10):
+                try:
+                    while True:
+                        mensaje = protocolo.decodificar(suscriptor.recv_multipart(zmq.NOBLOCK)[-1])
+                        if (mensaje['tipo'] == 'actualizacion' and mensaje['ocupado'] and
+                                mensaje['id'] in enviados and mensaje['id'] not in confirmados):
+                            confirmados[mensaje['id']] = time.time() - enviados[mensaje['id']]
+                except zmq.Again:
+                    pass
+
+        latencias = list(confirmados.values())
+        print(f"Asignaciones confirmadas: {len(latencias)} de {len(elegidos)}")
+        if latencias:
+            print(f"Latencia asignación -> confirmación: p50 {percentil(latencias, 50) * 1e3:.1f} ms | "
+                  f"p99 {percentil(latencias, 99) * 1e3:.1f} ms | máx {max(latencias) * 1e3:.1f} ms")
+    finally:
+        for proceso in procesos:
+            proceso.terminate()
+        broker.terminate()
+        broker.wait()
+        context.destroy(linger=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# bench_lotes.py
+# Compara la asignación codiciosa en orden de llegada con la asignación por
+# lotes (método húngaro) ante ráfagas de solicitudes: distancia total de
+# recogida y solicitudes resueltas por segundo.
+#
+# Uso: python -m benchmarks.bench_lotes [--taxis 5000] [--lote 64] [--rafagas 50]
+import argparse
+import random
+import time
+
+import asignacion_lotes
+from indice_espacial import IndiceEspacial
+
+
+def rafaga(generador, N, M, tamano):
+    # Solicitudes concentradas alrededor de un punto caliente, como a la
+    # salida de un evento
+    cx, cy = generador.randint(0, N), generador.randint(0, M)
+    return [(min(N, max(0, cx + int(generador.gauss(0, N / 20)))),
+             min(M, max(0, cy + int(generador.gauss(0, M / 20)))))
+            for _ in range(tamano)]
+
+
+def ejecutar(modo, taxis, rafagas, N, M):
+    indice = IndiceEspacial(N, M)
+    for id_taxi, pos in taxis.items():
+        indice.actualizar(id_taxi, pos, True)
+
+    distancia_total = 0
+    servidos = 0
+    inicio = time.perf_counter()
+    for usuarios in rafagas:
+        if modo == 'lotes':
+            candidatos = {}
+            for pos in usuarios:
+                for _, id_taxi in indice.k_mas_cercanos(pos, len(usuarios)):
+                    candidatos[id_taxi] = taxis[id_taxi]
+            elegidos = asignacion_lotes.asignar_lote(usuarios, sorted(candidatos.items()))
+        else:
+            elegidos = []
+            for pos in usuarios:
+                id_taxi, _ = indice.mas_cercano(pos)
+                if id_taxi is not None:
+                    indice.marcar_elegible(id_taxi, False)
+                elegidos.append(id_taxi)
+
+        for pos, id_taxi in zip(usuarios, elegidos):
+            if id_taxi is None:
+                continue
+            indice.marcar_elegible(id_taxi, False)
+            tx, ty = taxis[id_taxi]
+            distancia_total += abs(tx - pos[0]) + abs(ty - pos[1])
+            servidos += 1
+    transcurrido = time.perf_counter() - inicio
+    return distancia_total, servidos, transcurrido
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--N', type=int, default=100)
+    parser.add_argument('--M', type=int, default=100)
+    parser.add_argument('--taxis', type=int, default=5000)
+    parser.add_argument('--lote', type=int, default=64)
+    parser.add_argument('--rafagas', type=int, default=50)
+    parser.add_argument('--semilla', type=int, default=1)
+    args = parser.parse_args()
+
+    generador = random.Random(args.semilla)
+    taxis = {i: (generador.randint(0, args.N), generador.randint(0, args.M)) for i in range(args.taxis)}
+    rafagas = [rafaga(generador, args.N, args.M, args.lote) for _ in range(args.rafagas)]
+
+    print(f"Ciudad {args.N}x{args.M}, {args.taxis} taxis, {args.rafagas} ráfagas de {args.lote} solicitudes")
+    resultados = {}
+    for modo in ('codicioso', 'lotes'):
+        distancia, servidos, transcurrido = ejecutar(modo, taxis, rafagas, args.N, args.M)
+        resultados[modo] = distancia
+        print(f"{modo:>10}: distancia total {distancia:>8} | media {distancia / max(servidos, 1):6.2f} "
+              f"| {servidos / transcurrido:10.0f} solicitudes/s")
+    ahorro = 1 - resultados['lotes'] / max(resultados['codicioso'], 1)
+    print(f"Reducción de la distancia total con lotes: {ahorro:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# bench_metricas.py
+# Coste de registrar una muestra en un histograma de metricas.py y error de
+# sus percentiles frente a los exactos (lista ordenada), con latencias de
+# distribución log-normal parecidas a las de una solicitud.
+#
+# El coste por solicitud del servidor instrumentado se mide de extremo a
+# extremo con bench_bitacora contra una copia anterior del proyecto (--raiz).
+#
+# Uso: python -m benchmarks.bench_metricas [--muestras 500000]
+import argparse
+import math
+import random
+import time
+
+from metricas import PERCENTILES, Histograma
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--muestras', type=int, default=500000)
+    args = parser.parse_args()
+
+    generador = random.Random(7)
+    # Mediana ~1 ms con cola larga hasta decenas de ms
+    valores = [generador.lognormvariate(math.log(0.001), 1.0) for _ in range(args.muestras)]
+
+    vacio = 0.0
+    inicio = time.perf_counter()
+    for valor in valores:
+        pass
+    vacio = time.perf_counter() - inicio
+
+    histograma = Histograma()
+    registrar = histograma.registrar
+    inicio = time.perf_counter()
+    for valor in valores:
+        registrar(valor)
+    tiempo = time.perf_counter() - inicio - vacio
+
+    inicio = time.perf_counter()
+    resumen = histograma.resumen()
+    tiempo_resumen = time.perf_counter() - inicio
+
+    ordenados = sorted(valores)
+    print(f"{args.muestras} muestras: {tiempo / args.muestras * 1e9:.0f} ns por registro, "
+          f"resumen en {tiempo_resumen * 1e3:.2f} ms, {len(histograma.cubetas)} cubetas")
+    for p in PERCENTILES:
+        exacto = ordenados[max(0, math.ceil(len(ordenados) * p / 100) - 1)] * 1000
+        aproximado = resumen[f'p{p:g}']
+        print(f"  p{p:<5g} exacto {exacto:8.3f} ms  histograma {aproximado:8.3f} ms  "
+              f"error {100 * (aproximado - exacto) / exacto:+.2f} %")
+
+
+if __name__ == "__main__":
+    main()
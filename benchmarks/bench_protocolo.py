@@ -0,0 +1,51 @@
+# bench_protocolo.py
+# Bytes por mensaje y mensajes por segundo (codificar + decodificar) del
+# formato binario frente a JSON para cada tipo de mensaje del broker.
+#
+# Uso: python -m benchmarks.bench_protocolo [--repeticiones 200000]
+import argparse
+import time
+
+import protocolo
+
+MENSAJES = {
+    'registro': {'tipo': 'registro', 'id': 1234, 'posicion': (57, 83), 'velocidad': 4},
+    'actualizacion': {'tipo': 'actualizacion', 'id': 1234, 'posicion': (57, 83), 'ocupado': False,
+                      'servicios': 2, 'timestamp': 1760000000.123456},
+    'servicio_asignado': {'tipo': 'servicio_asignado', 'taxi_id': 1234, 'pos_usuario': (12, 45),
+                          'id_usuario': 987, 'id_asignacion': 1760000000123},
+}
+
+
+def medir(mensaje, formato, repeticiones):
+    datos = protocolo.codificar(mensaje, formato)
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        protocolo.codificar(mensaje, formato)
+    codificar = repeticiones / (time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        protocolo.decodificar(datos)
+    decodificar = repeticiones / (time.perf_counter() - inicio)
+
+    return len(datos), codificar, decodificar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeticiones', type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"{'tipo':>18} {'formato':>8} {'bytes':>6} {'codificar/s':>12} {'decodificar/s':>14}")
+    for tipo, mensaje in MENSAJES.items():
+        if protocolo.decodificar(protocolo.codificar(mensaje, 'binario'))['tipo'] != tipo:
+            raise AssertionError(f"El formato binario no conserva el tipo {tipo}")
+        for formato in ('json', 'binario'):
+            tamano, codificar, decodificar = medir(mensaje, formato, args.repeticiones)
+            print(f"{tipo:>18} {formato:>8} {tamano:>6} {codificar:>12,.0f} {decodificar:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# bench_shards.py
+# Comprueba que el servidor dividido en shards por región asigna el mismo
+# taxi que un único servidor con toda la ciudad, en especial con usuarios
+# junto a los bordes entre regiones, y mide el coste de coordinar shards.
+#
+# Todo corre en el mismo proceso y sin broker: los mensajes de los taxis se
+# entregan a cada shard como lo haría el broker según su tópico de región
+# (incluido el aviso a la región anterior cuando un taxi cambia de región),
+# y el frente consulta a los shards llamándolos directamente.
+#
+# Uso: python -m benchmarks.bench_shards [--regiones 2x2] [--taxis 400] [--rondas 20] [--consultas 100]
+#                                       [--usuarios bordes|uniformes]
+import argparse
+import contextlib
+import io
+import json
+import random
+import time
+
+import particion as particiones
+from frente_shards import resolver_solicitud
+from servidor_central import ServidorCentral
+
+
+class Ciudad:
+    # Un servidor de referencia con toda la ciudad y un shard por región
+    def __init__(self, N, M, particion):
+        self.particion = particion
+        self.referencia = ServidorCentral(N, M)
+        self.shards = [ServidorCentral(N, M, particion=particion, region=region)
+                       for region in range(len(particion))]
+        self.region_publicada = {}
+        self.consultas_shard = 0
+
+    def publicar(self, mensaje):
+        # Reparto del broker: la referencia lo recibe todo ('pos.'); cada shard
+        # solo su región, y la anterior también si el taxi acaba de cambiar
+        region = self.particion.region_de(tuple(mensaje['posicion']))
+        anterior = self.region_publicada.get(mensaje['id'], region)
+        self.region_publicada[mensaje['id']] = region
+        with self.referencia.lock:
+            self.referencia.aplicar_mensaje(mensaje)
+        for destino in {region, anterior}:
+            with self.shards[destino].lock:
+                self.shards[destino].aplicar_mensaje(mensaje)
+
+    def consultar(self, region, solicitud):
+        self.consultas_shard += 1
+        # Ida y vuelta por JSON como a través del socket
+        return json.loads(json.dumps(self.shards[region].responder_solicitud(json.loads(json.dumps(solicitud)))))
+
+    def cerrar(self):
+        for servidor in [self.referencia] + self.shards:
+            servidor.context.destroy(linger=0)
+
+
+def posicion_cerca_de_borde(particion, generador):
+    # Posiciones a pocas celdas de una frontera entre regiones
+    if generador.random() < 0.5 and particion.columnas > 1:
+        borde = particion.ancho * generador.randint(1, particion.columnas - 1)
+        return (max(0, min(particion.N, borde + generador.randint(-3, 2))), generador.randint(0, particion.M))
+    if particion.filas > 1:
+        borde = particion.alto * generador.randint(1, particion.filas - 1)
+        return (generador.randint(0, particion.N), max(0, min(particion.M, borde + generador.randint(-3, 2))))
+    return generador.randint(0, particion.N), generador.randint(0, particion.M)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--regiones', default='2x2')
+    parser.add_argument('--N', type=int, default=100)
+    parser.add_argument('--M', type=int, default=100)
+    parser.add_argument('--taxis', type=int, default=400)
+    parser.add_argument('--rondas', type=int, default=20)
+    parser.add_argument('--consultas', type=int, default=100, help="Solicitudes por ronda")
+    parser.add_argument('--usuarios', choices=['bordes', 'uniformes'], default='bordes',
+                        help="Usuarios junto a los bordes entre regiones o repartidos por toda la ciudad")
+    parser.add_argument('--semilla', type=int, default=7)
+    args = parser.parse_args()
+
+    generador = random.Random(args.semilla)
+    particion = particiones.Particion.desde_texto(args.N, args.M, args.regiones)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        ciudad = Ciudad(args.N, args.M, particion)
+
+    posiciones = {id_taxi: (generador.randint(0, args.N), generador.randint(0, args.M))
+                  for id_taxi in range(args.taxis)}
+    solicitudes = iguales = sin_taxi = 0
+    tiempo_referencia = tiempo_shards = 0.0
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for id_taxi, pos in posiciones.items():
+                ciudad.publicar({'tipo': 'registro', 'id': id_taxi, 'posicion': pos, 'velocidad': 1})
+
+        for ronda in range(args.rondas):
+            with contextlib.redirect_stdout(io.StringIO()):
+                # Todos los taxis quedan libres (sin esperar confirmaciones ni
+                # la espera entre asignaciones) y se mueven; muchos cruzan de región
+                for servidor in [ciudad.referencia] + ciudad.shards:
+                    servidor.asignaciones_pendientes.clear()
+                    servidor.taxis.columna('ultima_asignacion')[:] = 0
+                for id_taxi, (x, y) in posiciones.items():
+                    pos = (max(0, min(args.N, x + generador.randint(-6, 6))),
+                           max(0, min(args.M, y + generador.randint(-6, 6))))
+                    posiciones[id_taxi] = pos
+                    ciudad.publicar({'tipo': 'actualizacion', 'id': id_taxi, 'posicion': pos,
+                                     'ocupado': False, 'servicios': 0, 'timestamp': time.time()})
+
+                for consulta in range(args.consultas):
+                    if args.usuarios == 'bordes':
+                        pos_usuario = posicion_cerca_de_borde(particion, generador)
+                    else:
+                        pos_usuario = (generador.randint(0, args.N), generador.randint(0, args.M))
+                    id_usuario = ronda * args.consultas + consulta
+
+                    inicio = time.perf_counter()
+                    esperada = ciudad.referencia.asignar_taxi(pos_usuario, id_usuario)
+                    tiempo_referencia += time.perf_counter() - inicio
+
+                    inicio = time.perf_counter()
+                    respuesta = resolver_solicitud(particion, pos_usuario, id_usuario, ciudad.consultar)
+                    tiempo_shards += time.perf_counter() - inicio
+
+                    solicitudes += 1
+                    obtenido = respuesta['taxi_id'] if respuesta['exito'] else None
+                    if (esperada[0] if esperada else None) == obtenido:
+                        iguales += 1
+                    else:
+                        raise AssertionError(f"Usuario en {pos_usuario}: shards asignaron {obtenido}, "
+                                             f"referencia {esperada[0] if esperada else None}")
+                    sin_taxi += obtenido is None
+    finally:
+        ciudad.cerrar()
+
+    print(f"Partición {args.regiones}: {solicitudes} solicitudes ({args.usuarios}), {iguales} iguales a la "
+          f"referencia ({sin_taxi} sin taxi disponible)")
+    print(f"Consultas a shards por solicitud: {ciudad.consultas_shard / solicitudes:.2f}")
+    print(f"Tiempo por solicitud: referencia {tiempo_referencia / solicitudes * 1e3:.3f} ms, "
+          f"shards coordinados {tiempo_shards / solicitudes * 1e3:.3f} ms (sin red)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+# bench_sistema.py
+# Prueba de carga de extremo a extremo: levanta en localhost el broker, el
+# servidor central y una flota de taxis, y genera llegadas de usuarios
+# (proceso de Poisson o una traza grabada). Con --escala se comprimen los
+# tiempos de la simulación (servicios y movimientos de 30 s) en todos los
+# componentes.
+#
+# Informa rendimiento, percentiles de latencia, tasa de éxito de asignación
+# y CPU/RSS de cada componente, y guarda los resultados en JSON para
+# comparar entre versiones.
+#
+# Uso: python -m benchmarks.bench_sistema [--taxis 200] [--tasa 20] [--duracion 30] [--escala 30]
+#                                         [--traza archivo] [--salida resultados.json]
+#
+# Con --flota los taxis se simulan con flota.py (un proceso asyncio por cada
+# --taxis-por-proceso taxis) en lugar de con hilos de taxi.py.
+#
+# Con --regiones FxC el servidor se divide en un shard por región más el
+# frente de shards (frente_shards.py), y taxis y shards usan la partición.
+#
+# Formato de la traza: una línea por usuario "<segundos simulados desde el inicio> <x> <y>".
+import argparse
+import contextlib
+import json
+import os
+import queue
+import random
+import subprocess
+import sys
+import threading
+import time
+
+TICKS_POR_SEGUNDO = os.sysconf('SC_CLK_TCK')
+
+
+def lanzar(args, entorno):
+    return subprocess.Popen([sys.executable] + args, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, env=entorno)
+
+
+def hospedar_taxis(desde, hasta, N, M, semilla):
+    # Se ejecuta en un proceso aparte: varios taxis de taxi.py, uno por hilo
+    from taxi import Taxi
+
+    generador = random.Random(semilla)
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        hilos = []
+        for id_taxi in range(desde, hasta):
+            pos = (generador.randint(0, N), generador.randint(0, M))
+            velocidad = generador.choice([0, 1, 2, 4])
+            hilo = threading.Thread(target=lambda i=id_taxi, p=pos, v=velocidad: Taxi(i, N, M, p, v).iniciar(),
+                                    daemon=True)
+            hilo.start()
+            hilos.append(hilo)
+        for hilo in hilos:
+            hilo.join()
+
+
+def uso_proceso(pid):
+    # (segundos de CPU, RSS en MB) leídos de /proc
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            campos = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(campos[11]) + int(campos[12])) / TICKS_POR_SEGUNDO
+        with open(f'/proc/{pid}/status') as f:
+            rss = next((int(linea.split()[1]) for linea in f if linea.startswith('VmRSS:')), 0) / 1024
+        return cpu, rss
+    except (OSError, IndexError, ValueError):
+        return 0.0, 0.0
+
+
+class Monitor(threading.Thread):
+    # Muestrea CPU y RSS de cada componente mientras dura la prueba
+    def __init__(self, componentes, intervalo=0.5):
+        super().__init__(daemon=True)
+        self.componentes = componentes  # {nombre: [pid, ...]}
+        self.intervalo = intervalo
+        self.detener = threading.Event()
+        self.cpu_inicial = {}
+        self.cpu_final = {}
+        self.rss_maximo = {nombre: 0.0 for nombre in componentes}
+
+    def medir(self):
+        medidas = {}
+        for nombre, pids in self.componentes.items():
+            usos = [uso_proceso(pid) for pid in pids]
+            medidas[nombre] = (sum(cpu for cpu, _ in usos), sum(rss for _, rss in usos))
+        return medidas
+
+    def run(self):
+        self.inicio = time.time()
+        self.cpu_inicial = {nombre: cpu for nombre, (cpu, _) in self.medir().items()}
+        while not self.detener.wait(self.intervalo):
+            for nombre, (cpu, rss) in self.medir().items():
+                self.cpu_final[nombre] = cpu
+                self.rss_maximo[nombre] = max(self.rss_maximo[nombre], rss)
+        self.fin = time.time()
+
+    def resumen(self):
+        transcurrido = self.fin - self.inicio
+        return {nombre: {
+            'cpu_s': round(self.cpu_final.get(nombre, 0) - self.cpu_inicial.get(nombre, 0), 3),
+            'cpu_pct': round(100 * (self.cpu_final.get(nombre, 0) - self.cpu_inicial.get(nombre, 0)) / transcurrido, 1),
+            'rss_max_mb': round(self.rss_maximo[nombre], 1),
+        } for nombre in self.componentes}
+
+
+def llegadas_poisson(tasa, duracion, N, M, semilla):
+    generador = random.Random(semilla)
+    instante = 0.0
+    while True:
+        instante += generador.expovariate(tasa)
+        if instante >= duracion:
+            return
+        yield instante, (generador.randint(0, N), generador.randint(0, M))
+
+
+def llegadas_traza(ruta, escala, duracion):
+    with open(ruta) as f:
+        for linea in f:
+            if not linea.strip():
+                continue
+            t, x, y = linea.split()
+            instante = float(t) / escala
+            if instante >= duracion:
+                return
+            yield instante, (int(x), int(y))
+
+
+def atender_usuarios(cola, resultados, N, M):
+    from usuario import Usuario
+
+    cliente = None
+    while True:
+        trabajo = cola.get()
+        if trabajo is None:
+            return
+        id_usuario, llegada, pos = trabajo
+        if cliente is None:
+            cliente = Usuario(id_usuario, pos, 0, N, M)
+        cliente.id = id_usuario
+        cliente.posicion = pos
+        cliente.ultima_respuesta = None
+        cliente.solicitar_taxi()
+        respuesta = cliente.ultima_respuesta
+        # La latencia se mide desde la llegada programada: incluye la espera
+        # en el generador si el sistema no da abasto
+        resultados.append({'latencia': time.time() - llegada,
+                           'respondida': respuesta is not None,
+                           'exito': bool(respuesta and respuesta.get('exito'))})
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def version_codigo():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--taxis', type=int, default=200)
+    parser.add_argument('--taxis-por-proceso', type=int, default=50)
+    parser.add_argument('--flota', action='store_true', help="Simular los taxis con flota.py")
+    parser.add_argument('--N', type=int, default=100)
+    parser.add_argument('--M', type=int, default=100)
+    parser.add_argument('--tasa', type=float, default=20, help="Usuarios por segundo (Poisson)")
+    parser.add_argument('--traza', default=None, help="Reproducir llegadas desde un archivo")
+    parser.add_argument('--duracion', type=float, default=30, help="Segundos reales de carga")
+    parser.add_argument('--escala', type=float, default=30, help="Factor de compresión del tiempo")
+    parser.add_argument('--clientes', type=int, default=64, help="Solicitudes concurrentes como máximo")
+    parser.add_argument('--calentamiento', type=float, default=5,
+                        help="Segundos para que la flota se registre antes de la carga")
+    parser.add_argument('--args-servidor', default='', help="Argumentos extra para servidor_central.py")
+    parser.add_argument('--regiones', default=None, help="Dividir el servidor en shards (por ejemplo 2x2)")
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--salida', default='resultados_sistema.json')
+    parser.add_argument('--hospedar-taxis', nargs=5, type=int, metavar=('DESDE', 'HASTA', 'N', 'M', 'SEMILLA'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hospedar_taxis:
+        hospedar_taxis(*args.hospedar_taxis)
+        return
+
+    entorno = dict(os.environ, ESCALA_TIEMPO=str(args.escala))
+    if args.regiones:
+        entorno['REGIONES_CIUDAD'] = args.regiones
+    procesos = {}
+    try:
+        procesos['broker'] = [lanzar(['broker.py'], entorno)]
+        time.sleep(0.5)
+        if args.regiones:
+            filas, columnas = (int(parte) for parte in args.regiones.lower().split('x'))
+            procesos['servidor'] = [lanzar(['servidor_central.py', '--region', str(region)] +
+                                           args.args_servidor.split(), entorno)
+                                    for region in range(filas * columnas)]
+            procesos['servidor'].append(lanzar(['frente_shards.py'], entorno))
+        else:
+            procesos['servidor'] = [lanzar(['servidor_central.py'] + args.args_servidor.split(), entorno)]
+        time.sleep(1)
+        if args.flota:
+            procesos['taxis'] = [
+                lanzar(['flota.py', str(min(args.taxis_por_proceso, args.taxis - desde)), str(args.N), str(args.M),
+                        '--id-inicial', str(desde), '--semilla', str(args.semilla + desde)], entorno)
+                for desde in range(0, args.taxis, args.taxis_por_proceso)
+            ]
+        else:
+            procesos['taxis'] = [
+                lanzar(['-m', 'benchmarks.bench_sistema', '--hospedar-taxis', str(desde),
+                        str(min(desde + args.taxis_por_proceso, args.taxis)), str(args.N), str(args.M),
+                        str(args.semilla + desde)], entorno)
+                for desde in range(0, args.taxis, args.taxis_por_proceso)
+            ]
+        time.sleep(args.calentamiento)
+
+        monitor = Monitor({nombre: [p.pid for p in lista] for nombre, lista in procesos.items()})
+        monitor.componentes['usuarios'] = [os.getpid()]
+        monitor.rss_maximo['usuarios'] = 0.0
+        monitor.start()
+
+        cola = queue.Queue()
+        resultados = []
+        with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+            clientes = [threading.Thread(target=atender_usuarios, args=(cola, resultados, args.N, args.M),
+                                         daemon=True) for _ in range(args.clientes)]
+            for cliente in clientes:
+                cliente.start()
+
+            if args.traza:
+                llegadas = llegadas_traza(args.traza, args.escala, args.duracion)
+            else:
+                llegadas = llegadas_poisson(args.tasa, args.duracion, args.N, args.M, args.semilla)
+
+            inicio = time.time()
+            for id_usuario, (instante, pos) in enumerate(llegadas):
+                espera = inicio + instante - time.time()
+                if espera > 0:
+                    time.sleep(espera)
+                cola.put((id_usuario, inicio + instante, pos))
+            for _ in clientes:
+                cola.put(None)
+            for cliente in clientes:
+                cliente.join()
+            transcurrido = time.time() - inicio
+
+        monitor.detener.set()
+        monitor.join()
+
+        latencias = [r['latencia'] for r in resultados if r['respondida']]
+        exitosas = sum(1 for r in resultados if r['exito'])
+        informe = {
+            'version': version_codigo(),
+            'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'configuracion': {k: v for k, v in vars(args).items() if k != 'hospedar_taxis'},
+            'solicitudes': len(resultados),
+            'respondidas': len(latencias),
+            'exitosas': exitosas,
+            'tasa_exito': round(exitosas / len(resultados), 4) if resultados else None,
+            'rendimiento_rps': round(len(resultados) / transcurrido, 2),
+            'latencia_ms': {nombre: round(percentil(latencias, p) * 1e3, 2) if latencias else None
+                            for nombre, p in (('p50', 50), ('p90', 90), ('p99', 99), ('max', 100))},
+            'componentes': monitor.resumen(),
+        }
+
+        with open(args.salida, 'w') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+
+        print(f"Solicitudes: {informe['solicitudes']} | respondidas: {informe['respondidas']} | "
+              f"con taxi: {exitosas} ({(informe['tasa_exito'] or 0):.1%})")
+        print(f"Rendimiento: {informe['rendimiento_rps']} solicitudes/s")
+        print(f"Latencia (ms): {informe['latencia_ms']}")
+        for nombre, uso in informe['componentes'].items():
+            print(f"  {nombre:>9}: CPU {uso['cpu_s']:.2f} s ({uso['cpu_pct']}%), RSS máx {uso['rss_max_mb']} MB")
+        print(f"Resultados guardados en {args.salida}")
+    finally:
+        for lista in procesos.values():
+            for proceso in lista:
+                proceso.kill()
+                proceso.wait()
+
+
+if __name__ == "__main__":
+    main()
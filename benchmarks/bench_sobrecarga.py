@@ -0,0 +1,185 @@
+# bench_sobrecarga.py
+# Comportamiento del servidor central con más solicitudes de las que puede
+# atender: primero se mide su capacidad sostenible con un número fijo de
+# solicitudes en vuelo y luego se le envían solicitudes en lazo abierto
+# (sin esperar respuestas) a varias veces ese ritmo, con y sin control de
+# admisión: la segunda fase usa el MAX_ESPERA_COLA con que se distribuye el
+# servidor (--max-espera-cola para probar otro). Cada solicitud lleva su
+# 'presupuesto' como las de usuario.py; la respuesta que llega después del
+# plazo cuenta como perdida.
+#
+# El servidor corre en un proceso aparte con la flota cargada en memoria
+# (sin broker ni taxis) para poder medir su memoria máxima (VmHWM). El
+# generador comparte la máquina con él: se muestra la CPU que consume, que
+# en una máquina con pocos núcleos se resta de la del servidor.
+#
+# Uso: python -m benchmarks.bench_sobrecarga [--factor 5] [--duracion 10] [--plazo 1.0]
+#                                           [--sostenible REQ/S] [--taxis 100000] [--max-espera-cola SEGUNDOS]
+import argparse
+import multiprocessing
+import random
+import time
+
+import zmq
+
+import servidor_central
+from benchmarks.bench_solicitudes import cargar_flota, percentil
+from servidor_central import ServidorCentral
+
+N = M = 1000
+
+
+def servidor(max_espera_cola, num_taxis, listo):
+    servidor = ServidorCentral(N, M, max_espera_cola=max_espera_cola)
+    cargar_flota(servidor, num_taxis, random.Random(0))
+    listo.set()
+    servidor.iniciar()
+
+
+def memoria_maxima(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for linea in f:
+            if linea.startswith('VmHWM:'):
+                return int(linea.split()[1]) / 1024  # MB
+    return float('nan')
+
+
+def posiciones(semilla, cantidad=4096):
+    generador = random.Random(semilla)
+    return [(generador.randint(0, N), generador.randint(0, M)) for _ in range(cantidad)]
+
+
+def solicitud(id_solicitud, posiciones, plazo):
+    # Ya codificada a mano: el generador debe gastar lo menos posible
+    x, y = posiciones[id_solicitud % len(posiciones)]
+    return b'{"tipo":"solicitud","id_usuario":%d,"posicion":[%d,%d],"id_solicitud":%d,' \
+           b'"presupuesto":%f}' % (id_solicitud, x, y, id_solicitud, plazo)
+
+
+def capacidad(socket, duracion, en_vuelo, plazo):
+    # Lazo cerrado: siempre `en_vuelo` solicitudes pendientes
+    pos = posiciones(1)
+    ids = iter(range(10**9))
+    for _ in range(en_vuelo):
+        socket.send_multipart([b'', solicitud(next(ids), pos, plazo)])
+    respondidas = 0
+    fin = time.time() + duracion
+    while time.time() < fin:
+        if socket.poll(100):
+            socket.recv_multipart()
+            respondidas += 1
+            socket.send_multipart([b'', solicitud(next(ids), pos, plazo)])
+    # Vaciar las pendientes antes de la siguiente fase
+    while socket.poll(int(plazo * 2000)):
+        socket.recv_multipart()
+    return respondidas / duracion
+
+
+def lazo_abierto(socket, ritmo, duracion, plazo):
+    # Envía al ritmo fijado pase lo que pase y anota cada respuesta
+    pos = posiciones(2)
+    enviadas = {}   # {id_solicitud: instante de envío}
+    resultados = {'servidas': 0, 'sobrecargado': 0, 'vencidas': 0, 'tardias': 0}
+    latencias = []
+    inicio = time.perf_counter()
+    cpu = time.process_time()
+    fin = inicio + duracion
+    siguiente = 0
+
+    def recibir(espera):
+        if not socket.poll(espera):
+            return False
+        while True:
+            try:
+                partes = socket.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return True
+            llegada = time.perf_counter()
+            respuesta = zmq.utils.jsonapi.loads(partes[-1])
+            envio = enviadas.pop(respuesta.get('id_solicitud'), None)
+            if envio is None:
+                continue
+            latencia = llegada - envio
+            if respuesta.get('sobrecargado'):
+                resultados['sobrecargado'] += 1
+            elif respuesta.get('vencida'):
+                resultados['vencidas'] += 1
+            elif latencia > plazo:
+                resultados['tardias'] += 1
+            else:
+                resultados['servidas'] += 1
+            latencias.append(latencia)
+
+    while True:
+        ahora = time.perf_counter()
+        if ahora >= fin:
+            break
+        # Las solicitudes que tocaban hasta ahora, aunque haya que enviar varias seguidas
+        while siguiente <= (ahora - inicio) * ritmo:
+            enviadas[siguiente] = time.perf_counter()
+            socket.send_multipart([b'', solicitud(siguiente, pos, plazo)])
+            siguiente += 1
+        recibir(0)
+        espera = inicio + siguiente / ritmo - time.perf_counter()
+        if espera > 0.001:
+            recibir(int(espera * 1000))
+    # Las que lleguen hasta un plazo después del final
+    limite = time.perf_counter() + plazo * 2
+    while enviadas and time.perf_counter() < limite:
+        recibir(100)
+    resultados['sin_respuesta'] = len(enviadas)
+    resultados['cpu'] = (time.process_time() - cpu) / (time.perf_counter() - inicio)
+    return siguiente, resultados, latencias
+
+
+def medir(max_espera_cola, args):
+    listo = multiprocessing.Event()
+    proceso = multiprocessing.Process(target=servidor, args=(max_espera_cola, args.taxis, listo), daemon=True)
+    proceso.start()
+    listo.wait()
+    context = zmq.Context()
+    socket = context.socket(zmq.DEALER)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.setsockopt(zmq.SNDHWM, 0)  # El generador no debe frenar por su cola: se mide el servidor
+    socket.setsockopt(zmq.RCVHWM, 0)
+    socket.connect(servidor_central.USUARIO_SERVER_URL)
+    time.sleep(1)
+    try:
+        sostenible = args.sostenible or capacidad(socket, 3, 32, args.plazo)
+        memoria_base = memoria_maxima(proceso.pid)
+        enviadas, resultados, latencias = lazo_abierto(socket, sostenible * args.factor, args.duracion, args.plazo)
+        return sostenible, enviadas, resultados, latencias, memoria_base, memoria_maxima(proceso.pid)
+    finally:
+        socket.close()
+        context.term()
+        proceso.terminate()
+        proceso.join()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--factor', type=float, default=5, help="Múltiplo del ritmo sostenible que se envía")
+    parser.add_argument('--duracion', type=float, default=10)
+    parser.add_argument('--plazo', type=float, default=1.0, help="Segundos que espera cada solicitud")
+    parser.add_argument('--sostenible', type=float, default=None,
+                        help="Solicitudes/s sostenibles (por defecto se miden antes de cada prueba)")
+    parser.add_argument('--max-espera-cola', type=float, default=servidor_central.MAX_ESPERA_COLA)
+    parser.add_argument('--taxis', type=int, default=100_000)
+    args = parser.parse_args()
+
+    for nombre, max_espera_cola in (('sin control de admisión', 0),
+                                    (f"max_espera_cola {args.max_espera_cola:g} s", args.max_espera_cola)):
+        sostenible, enviadas, r, latencias, base, maxima = medir(max_espera_cola, args)
+        ritmo = sostenible * args.factor
+        print(f"{nombre}: {sostenible:.0f} solicitudes/s sostenibles, {enviadas} enviadas a {ritmo:.0f}/s "
+              f"durante {args.duracion:.0f} s (el generador usó {r['cpu']:.0%} de un núcleo)")
+        print(f"  {r['servidas']} servidas a tiempo ({r['servidas'] / args.duracion:.0f}/s), "
+              f"{r['sobrecargado']} 'sobrecargado', {r['vencidas']} vencidas, {r['tardias']} tardías, "
+              f"{r['sin_respuesta']} sin respuesta")
+        print(f"  latencia de las respuestas p50 {percentil(latencias, 50) * 1000:.1f} ms, "
+              f"p99 {percentil(latencias, 99) * 1000:.1f} ms, máximo {max(latencias, default=0) * 1000:.1f} ms; "
+              f"memoria del servidor {base:.0f} MB antes, {maxima:.0f} MB máximo")
+
+
+if __name__ == "__main__":
+    main()
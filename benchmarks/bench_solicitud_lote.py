@@ -0,0 +1,87 @@
+# bench_solicitud_lote.py
+# Usuarios atendidos por segundo por el servidor central cuando los clientes
+# agrupan varios usuarios en una sola solicitud_lote, frente a una solicitud
+# por usuario (tamaño 1). Como en bench_solicitudes, el servidor se levanta en
+# el mismo proceso con la flota cargada en memoria; la flota se restablece
+# antes de cada tamaño para que todos encuentren los mismos taxis libres.
+#
+# Uso: python -m benchmarks.bench_solicitud_lote [--tamanos 1,10,100,1000] [--usuarios 20000]
+#                                               [--clientes 4] [--taxis 100000]
+import argparse
+import random
+import threading
+import time
+
+import zmq
+
+import servidor_central
+from benchmarks.bench_solicitudes import cargar_flota, percentil
+from servidor_central import ServidorCentral
+
+N = M = 1000
+
+
+def restablecer_flota(servidor, num_taxis):
+    cargar_flota(servidor, num_taxis, random.Random(0))
+    with servidor.lock:
+        ahora = time.time()
+        for id_taxi in range(num_taxis):
+            servidor.actualizar_disponibilidad(id_taxi, servidor.taxis.info(id_taxi), ahora)
+        servidor.asignaciones_pendientes.clear()
+
+
+def cliente(id_cliente, tamano, num_mensajes, latencias, asignados):
+    socket = zmq.Context.instance().socket(zmq.REQ)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.connect(servidor_central.USUARIO_SERVER_URL)
+    generador = random.Random(id_cliente)
+    for i in range(num_mensajes):
+        usuarios = [[id_cliente * 10_000_000 + i * tamano + j, (generador.randint(0, N), generador.randint(0, M))]
+                    for j in range(tamano)]
+        if tamano == 1:
+            mensaje = {'tipo': 'solicitud', 'id_usuario': usuarios[0][0], 'posicion': usuarios[0][1]}
+        else:
+            mensaje = {'tipo': 'solicitud_lote', 'solicitudes': usuarios}
+        inicio = time.perf_counter()
+        socket.send_json(mensaje)
+        respuesta = socket.recv_json()
+        latencias.append(time.perf_counter() - inicio)
+        resultados = respuesta.get('resultados', [respuesta])
+        asignados.append(sum(1 for resultado in resultados if resultado.get('exito')))
+    socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tamanos', default='1,10,100,1000')
+    parser.add_argument('--usuarios', type=int, default=20000, help="Usuarios por tamaño de lote")
+    parser.add_argument('--clientes', type=int, default=4)
+    parser.add_argument('--taxis', type=int, default=100_000)
+    parser.add_argument('--trabajadores', type=int, default=4)
+    args = parser.parse_args()
+
+    servidor = ServidorCentral(N, M, num_trabajadores=args.trabajadores)
+    threading.Thread(target=servidor.iniciar, daemon=True).start()
+    time.sleep(0.5)
+
+    for tamano in (int(t) for t in args.tamanos.split(',') if t):
+        restablecer_flota(servidor, args.taxis)
+        num_mensajes = max(1, args.usuarios // (tamano * args.clientes))
+        latencias, asignados = [], []
+        hilos = [threading.Thread(target=cliente, args=(i, tamano, num_mensajes, latencias, asignados))
+                 for i in range(args.clientes)]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        usuarios = tamano * num_mensajes * args.clientes
+        print(f"lote {tamano:>5}: {usuarios / duracion:8.0f} usuarios/s, {len(latencias) / duracion:7.0f} "
+              f"mensajes/s, latencia por mensaje p50 {percentil(latencias, 50) * 1000:7.2f} ms "
+              f"p99 {percentil(latencias, 99) * 1000:7.2f} ms, {sum(asignados)}/{usuarios} asignados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# bench_solicitudes.py
+# Mide solicitudes por segundo y latencia p50/p99 del servidor central
+# atendiendo a varios usuarios concurrentes. El servidor se levanta en el
+# mismo proceso con una flota cargada directamente en memoria, por lo que no
+# hace falta tener el broker ni taxis en ejecución.
+#
+# Uso: python -m benchmarks.bench_solicitudes [--usuarios 32] [--duracion 10] [--trabajadores 4]
+#                                            [--modo individual|lotes]
+import argparse
+import inspect
+import random
+import threading
+import time
+
+import zmq
+
+import servidor_central
+from servidor_central import ServidorCentral
+
+
+def cargar_flota(servidor, num_taxis, generador):
+    with servidor.lock:
+        for id_taxi in range(num_taxis):
+            pos = (generador.randint(0, servidor.N), generador.randint(0, servidor.M))
+            if hasattr(servidor.taxis, 'registrar'):
+                servidor.taxis.registrar(id_taxi, pos, 1)
+            else:
+                servidor.taxis[id_taxi] = {'pos': pos, 'ocupado': False, 'servicios': 0, 'velocidad': 1}
+            if hasattr(servidor, 'indice'):
+                servidor.indice.actualizar(id_taxi, pos, True)
+
+
+def percentil(valores, p):
+    if not valores:
+        return float('nan')
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def usuario(id_usuario, url, fin, N, M, latencias, exitos):
+    context = zmq.Context.instance()
+    socket = context.socket(zmq.REQ)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.connect(url)
+    generador = random.Random(id_usuario)
+    while time.time() < fin:
+        inicio = time.perf_counter()
+        socket.send_json({
+            'tipo': 'solicitud',
+            'id_usuario': id_usuario,
+            'posicion': (generador.randint(0, N), generador.randint(0, M)),
+            'tiempo_solicitud': time.time()
+        })
+        respuesta = socket.recv_json()
+        latencias.append(time.perf_counter() - inicio)
+        if respuesta.get('exito'):
+            exitos.append(1)
+    socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--usuarios', type=int, default=32)
+    parser.add_argument('--duracion', type=float, default=10)
+    parser.add_argument('--taxis', type=int, default=100_000)
+    parser.add_argument('--trabajadores', type=int, default=4)
+    parser.add_argument('--modo', choices=['individual', 'lotes'], default='individual')
+    args = parser.parse_args()
+
+    N = M = 1000
+    parametros = inspect.signature(ServidorCentral).parameters
+    if 'modo' in parametros:
+        servidor = ServidorCentral(N, M, num_trabajadores=args.trabajadores, modo=args.modo)
+    elif 'num_trabajadores' in parametros:
+        servidor = ServidorCentral(N, M, num_trabajadores=args.trabajadores)
+    else:
+        servidor = ServidorCentral(N, M)
+    cargar_flota(servidor, args.taxis, random.Random(0))
+    threading.Thread(target=servidor.iniciar, daemon=True).start()
+    time.sleep(0.5)
+
+    latencias = []
+    exitos = []
+    fin = time.time() + args.duracion
+    hilos = [threading.Thread(target=usuario,
+                              args=(i, servidor_central.USUARIO_SERVER_URL, fin, N, M, latencias, exitos))
+             for i in range(args.usuarios)]
+    inicio = time.time()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.time() - inicio
+
+    print(f"Usuarios concurrentes: {args.usuarios} | Taxis: {args.taxis}")
+    print(f"Solicitudes atendidas: {len(latencias)} ({len(exitos)} con taxi asignado)")
+    print(f"Solicitudes por segundo: {len(latencias) / transcurrido:.1f}")
+    print(f"Latencia p50: {percentil(latencias, 50) * 1e3:.2f} ms | p99: {percentil(latencias, 99) * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# bench_tabla_flota.py
+# Memoria por taxi y tiempo de búsqueda del taxi más cercano con la tabla
+# de la flota (array estructurado de NumPy) frente al dict de dicts
+# original. Incluye como referencia el índice espacial, y comprueba que un
+# segundo proceso lee la tabla en memoria compartida sin copiarla.
+#
+# Uso: python -m benchmarks.bench_tabla_flota [--tamanos 10000,100000,1000000] [--consultas 200]
+import argparse
+import multiprocessing
+import random
+import time
+import tracemalloc
+
+from benchmarks.bench_indice_espacial import busqueda_lineal
+from indice_espacial import IndiceEspacial
+from tabla_flota import TablaFlota
+
+
+def generar_flota(num_taxis, N, M, generador):
+    return [(id_taxi, (generador.randint(0, N), generador.randint(0, M)), generador.random() < 0.2)
+            for id_taxi in range(num_taxis)]
+
+
+def memoria(construir):
+    # Bytes reservados por lo que construye la función (y que sigue vivo)
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    resultado = construir()
+    usada = tracemalloc.get_traced_memory()[0] - antes
+    tracemalloc.stop()
+    return resultado, usada
+
+
+def construir_dict(flota):
+    return {id_taxi: {'pos': pos, 'ocupado': ocupado, 'servicios': 0, 'ultima_asignacion': 0.0, 'velocidad': 1}
+            for id_taxi, pos, ocupado in flota}
+
+
+def construir_tabla(flota, compartida=False):
+    tabla = TablaFlota(capacidad=len(flota), compartida=compartida)
+    for id_taxi, pos, ocupado in flota:
+        tabla.registrar(id_taxi, pos, 1, ocupado)
+    return tabla
+
+
+def medir_consultas(buscar, consultas):
+    inicio = time.perf_counter()
+    resultados = [buscar(pos) for pos in consultas]
+    return resultados, (time.perf_counter() - inicio) / len(consultas)
+
+
+def lector(nombre, consultas, salida):
+    # Otro proceso: abre la tabla compartida y busca sobre ella sin copiarla
+    tabla = TablaFlota.adjuntar(nombre)
+    resultados, tiempo = medir_consultas(lambda pos: tabla.mas_cercano(pos)[0], consultas)
+    salida.put((resultados, tiempo))
+    tabla.cerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tamanos', default='10000,100000,1000000')
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--N', type=int, default=1000)
+    parser.add_argument('--M', type=int, default=1000)
+    args = parser.parse_args()
+
+    generador = random.Random(42)
+    print(f"{'taxis':>9} | {'dict B/taxi':>11} | {'tabla B/taxi':>12} | {'dict ms':>8} | "
+          f"{'tabla ms':>8} | {'lector ms':>9} | {'índice ms':>9}")
+    for num_taxis in [int(t) for t in args.tamanos.split(',')]:
+        flota = generar_flota(num_taxis, args.N, args.M, generador)
+        consultas = [(generador.randint(0, args.N), generador.randint(0, args.M)) for _ in range(args.consultas)]
+
+        taxis, memoria_dict = memoria(lambda: construir_dict(flota))
+        tabla, memoria_tabla = memoria(lambda: construir_tabla(flota))
+        indice = IndiceEspacial(args.N, args.M)
+        for id_taxi, pos, ocupado in flota:
+            indice.actualizar(id_taxi, pos, not ocupado)
+
+        # El recorrido en Python es muy lento con flotas grandes: menos consultas
+        consultas_dict = consultas[:max(10, args.consultas * 10000 // num_taxis)]
+        resultados_dict, tiempo_dict = medir_consultas(lambda pos: busqueda_lineal(taxis, pos), consultas_dict)
+        resultados_tabla, tiempo_tabla = medir_consultas(lambda pos: tabla.mas_cercano(pos)[0], consultas)
+        resultados_indice, tiempo_indice = medir_consultas(lambda pos: indice.mas_cercano(pos)[0], consultas)
+        if resultados_tabla[:len(consultas_dict)] != resultados_dict or resultados_tabla != resultados_indice:
+            raise AssertionError("La tabla devolvió un taxi distinto al recorrido original")
+
+        compartida = construir_tabla(flota, compartida=True)
+        salida = multiprocessing.Queue()
+        proceso = multiprocessing.Process(target=lector, args=(compartida.nombre, consultas, salida))
+        proceso.start()
+        resultados_lector, tiempo_lector = salida.get()
+        proceso.join()
+        compartida.cerrar()
+        if resultados_lector != resultados_tabla:
+            raise AssertionError("El lector de memoria compartida devolvió un resultado distinto")
+
+        print(f"{num_taxis:>9} | {memoria_dict / num_taxis:>11.0f} | {memoria_tabla / num_taxis:>12.0f} | "
+              f"{tiempo_dict * 1e3:>8.2f} | {tiempo_tabla * 1e3:>8.3f} | {tiempo_lector * 1e3:>9.3f} | "
+              f"{tiempo_indice * 1e3:>9.3f}")
+        del taxis, tabla, indice
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# bench_ultimo_valor.py
+# Caché de último valor del broker (--ultimo-valor): memoria que ocupa y
+# tiempo que tarda un servidor central recién arrancado en conocer la flota
+# completa a partir de la instantánea, sin que ningún taxi vuelva a publicar.
+#
+# La flota se registra y publica una vez su posición antes de que exista
+# ningún suscriptor; después se mide la instantánea con un suscriptor
+# simple y con un ServidorCentral en este mismo proceso.
+#
+# Uso: python -m benchmarks.bench_ultimo_valor [--taxis 100000] [--sin-cache]
+import argparse
+import contextlib
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import zmq
+
+import protocolo
+from benchmarks.bench_sistema import uso_proceso
+from broker import BROKER_BACKEND_CONNECT, BROKER_FRONTEND_CONNECT
+from servidor_central import ServidorCentral
+
+TAMANO_LOTE = 1000
+
+
+def publicar_flota(num_taxis, N, M):
+    # Registro y una posición por taxi, en lotes como los de flota.py
+    generador = random.Random(3)
+    context = zmq.Context.instance()
+    socket = context.socket(zmq.PUB)
+    socket.connect(BROKER_FRONTEND_CONNECT)
+    time.sleep(0.5)
+    for tipo in ('registro', 'actualizacion'):
+        for inicio in range(0, num_taxis, TAMANO_LOTE):
+            mensajes = []
+            for id_taxi in range(inicio, min(num_taxis, inicio + TAMANO_LOTE)):
+                pos = (generador.randint(0, N), generador.randint(0, M))
+                if tipo == 'registro':
+                    mensajes.append({'tipo': 'registro', 'id': id_taxi, 'posicion': pos, 'velocidad': 1})
+                else:
+                    mensajes.append({'tipo': 'actualizacion', 'id': id_taxi, 'posicion': pos,
+                                     'ocupado': False, 'servicios': 0, 'timestamp': time.time()})
+            socket.send_multipart(protocolo.empaquetar({'tipo': 'lote', 'mensajes': mensajes}))
+    socket.close()
+
+
+def recibir_instantanea(num_taxis, limite=10.0):
+    # Segundos hasta tener registro y posición de todos los taxis, o None
+    context = zmq.Context.instance()
+    socket = context.socket(zmq.SUB)
+    socket.connect(BROKER_BACKEND_CONNECT)
+    inicio = time.perf_counter()
+    socket.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_REGISTRO)
+    socket.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_POSICION)
+    vistos = {'registro': set(), 'actualizacion': set()}
+    while min(len(ids) for ids in vistos.values()) < num_taxis:
+        if not socket.poll(max(0.0, limite - (time.perf_counter() - inicio)) * 1000):
+            socket.close()
+            return None
+        for mensaje in protocolo.desagrupar(protocolo.decodificar(socket.recv_multipart()[-1])):
+            vistos[mensaje['tipo']].add(mensaje['id'])
+    socket.close()
+    return time.perf_counter() - inicio
+
+
+def arrancar_servidor(num_taxis, N, M, limite=30.0):
+    # Segundos hasta que el servidor tiene todos los taxis con su posición publicada
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        inicio = time.perf_counter()
+        servidor = ServidorCentral(N, M)
+        threading.Thread(target=servidor.procesar_actualizaciones_taxis, daemon=True).start()
+        while time.perf_counter() - inicio < limite:
+            with servidor.lock:
+                if len(servidor.taxis) >= num_taxis and (
+                        servidor.taxis.columna('ultima_actualizacion') > 0).all():
+                    return time.perf_counter() - inicio, len(servidor.taxis)
+            time.sleep(0.01)
+        return None, len(servidor.taxis)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--taxis', type=int, default=100000)
+    parser.add_argument('--N', type=int, default=1000)
+    parser.add_argument('--M', type=int, default=1000)
+    parser.add_argument('--sin-cache', action='store_true', help="Broker original, como referencia")
+    args = parser.parse_args()
+
+    argumentos = [] if args.sin_cache else ['--ultimo-valor']
+    broker = subprocess.Popen([sys.executable, 'broker.py'] + argumentos,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(1)
+        rss_inicial = uso_proceso(broker.pid)[1]
+        inicio = time.perf_counter()
+        publicar_flota(args.taxis, args.N, args.M)
+        time.sleep(1)
+        _, rss_final = uso_proceso(broker.pid)
+        print(f"Broker {' '.join(argumentos) or '(sin caché)'}: {args.taxis} taxis publicados en "
+              f"{time.perf_counter() - inicio - 1:.2f} s; RSS {rss_inicial:.1f} -> {rss_final:.1f} MB "
+              f"({(rss_final - rss_inicial) * 2 ** 20 / args.taxis:.0f} B/taxi)")
+
+        tiempo = recibir_instantanea(args.taxis)
+        print(f"Suscriptor nuevo: " + (f"flota completa en {tiempo * 1e3:.0f} ms" if tiempo is not None
+                                       else "no recibió la flota"))
+
+        tiempo, conocidos = arrancar_servidor(args.taxis, args.N, args.M)
+        print(f"Servidor central recién arrancado: " +
+              (f"{conocidos} taxis con posición en {tiempo * 1e3:.0f} ms" if tiempo is not None
+               else f"solo conoce {conocidos} taxis"))
+    finally:
+        broker.terminate()
+        broker.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# bench_usuarios.py
+# Usuarios simulados por un proceso cliente: un hilo, un contexto y un REQ
+# por usuario (modo por defecto de usuario.py) frente a --asincrono (asyncio
+# con un DEALER compartido). Para cada número de usuarios se mide el tiempo
+# total, la CPU y la memoria máxima del proceso cliente y su resumen de
+# latencias, contra un broker, un servidor central y una flota simulada.
+#
+# ESCALA_TIEMPO se aplica solo al cliente: acorta el intervalo entre
+# usuarios (5 s / escala) y el servicio que espera cada usuario con hilos.
+# Con la escala por defecto llega un usuario cada 0,5 ms (2000 solicitudes/s,
+# cerca de la capacidad de un servidor en una sola CPU).
+#
+# Uso: python -m benchmarks.bench_usuarios [--usuarios 500,2000] [--asincronos 500,2000,20000,100000]
+#                                         [--taxis 20000] [--escala 10000]
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_sistema import uso_proceso
+
+N, M = 100, 100
+
+
+def hilos_proceso(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            return next((int(linea.split()[1]) for linea in f if linea.startswith('Threads:')), 0)
+    except OSError:
+        return 0
+
+
+def medir_cliente(num_usuarios, asincrono, entorno, intervalo):
+    comando = [sys.executable, 'usuario.py', str(num_usuarios), str(N), str(M), 'aleatorio', '--semilla', '1']
+    if asincrono:
+        comando += ['--asincrono', '--intervalo', str(intervalo)]
+    with tempfile.TemporaryFile() as registro:
+        inicio = time.time()
+        proceso = subprocess.Popen(comando, env=entorno, stdout=registro, stderr=subprocess.STDOUT)
+        cpu = rss = 0.0
+        hilos = 0
+        while proceso.poll() is None:
+            # La CPU se lee mientras el proceso existe; el último valor es casi el total
+            cpu_actual, rss_actual = uso_proceso(proceso.pid)
+            cpu = max(cpu, cpu_actual)
+            rss = max(rss, rss_actual)
+            hilos = max(hilos, hilos_proceso(proceso.pid))
+            time.sleep(0.05)
+        duracion = time.time() - inicio
+        registro.seek(0)
+        salida = registro.read().decode('utf-8', 'replace').strip().splitlines()
+    return duracion, cpu, rss, hilos, proceso.returncode, salida
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--usuarios', default='500,2000', help="Usuarios del cliente con hilos")
+    parser.add_argument('--asincronos', default='500,2000,20000,100000', help="Usuarios del cliente asíncrono")
+    parser.add_argument('--taxis', type=int, default=20000)
+    parser.add_argument('--escala', type=float, default=10000)
+    args = parser.parse_args()
+
+    entorno = dict(os.environ, MUESTREO_LOG='asignacion=1000,sin_taxi=1000', NIVEL_LOG='WARNING')
+    entorno_cliente = dict(entorno, ESCALA_TIEMPO=str(args.escala))
+    intervalo = 5 / args.escala
+
+    procesos = [subprocess.Popen([sys.executable, 'broker.py'], env=entorno,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)]
+    time.sleep(0.5)
+    procesos.append(subprocess.Popen([sys.executable, 'servidor_central.py'], env=entorno,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    time.sleep(1)
+    procesos.append(subprocess.Popen([sys.executable, 'flota.py', str(args.taxis), str(N), str(M)], env=entorno,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    time.sleep(4)
+    try:
+        casos = [(int(n), False) for n in args.usuarios.split(',') if n] + \
+                [(int(n), True) for n in args.asincronos.split(',') if n]
+        for num_usuarios, asincrono in casos:
+            duracion, cpu, rss, hilos, codigo, salida = medir_cliente(num_usuarios, asincrono,
+                                                                      entorno_cliente, intervalo)
+            modo = 'asíncrono' if asincrono else 'hilos    '
+            print(f"{modo} {num_usuarios:>6} usuarios: {duracion:6.1f} s, CPU {cpu:6.1f} s, "
+                  f"RSS máx. {rss:7.1f} MB, {hilos} hilos{'' if codigo == 0 else f', código {codigo}'}")
+            if asincrono:
+                for linea in salida[-2:]:
+                    print(f"    {linea}")
+    finally:
+        for proceso in procesos:
+            proceso.terminate()
+        for proceso in procesos:
+            proceso.wait()
+
+
+if __name__ == "__main__":
+    main()
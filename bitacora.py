@@ -0,0 +1,208 @@
+# bitacora.py
+# Registro de eventos común a todos los componentes (broker, servidor
+# central, taxis y usuarios) en lugar de print.
+#
+# Quien registra un evento solo lo encola: el formato y la escritura los hace
+# un hilo en segundo plano (QueueHandler/QueueListener), así que una
+# terminal lenta no frena el reenvío de mensajes ni las asignaciones. Si la
+# cola se llena, los registros se descartan y se cuentan.
+#
+# Cada registro lleva un tipo de evento ('asignacion', 'registro', ...). Por
+# tipo de evento se puede muestrear (uno de cada n) y limitar el número de
+# registros por segundo; los avisos y errores no se muestrean ni se limitan.
+# Cuando se suprimen registros, el siguiente que sale lo indica.
+#
+# Configuración por variables de entorno:
+#   NIVEL_LOG     DEBUG, INFO (por defecto), WARNING, ERROR
+#   FORMATO_LOG   'texto' (por defecto) o 'json' (una línea JSON por registro)
+#   MUESTREO_LOG  'evento=n,...' para quedarse con uno de cada n registros
+#   LIMITE_LOG    registros por segundo y tipo de evento (0 sin límite)
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+NIVEL = os.environ.get('NIVEL_LOG', 'INFO').upper()
+FORMATO = os.environ.get('FORMATO_LOG', 'texto')
+LIMITE = float(os.environ.get('LIMITE_LOG', '100'))
+TAMANO_COLA = 10000  # Registros pendientes de escribir antes de empezar a descartar
+
+# Eventos que se repiten con cada mensaje o solicitud y no aportan leídos uno a uno
+MUESTREO_POR_DEFECTO = {'reenvio': 100, 'posicion': 10}
+
+RAIZ = 'taxis'
+
+
+def _leer_muestreo(texto):
+    muestreo = dict(MUESTREO_POR_DEFECTO)
+    for parte in filter(None, (p.strip() for p in texto.split(','))):
+        evento, n = parte.split('=')
+        muestreo[evento.strip()] = int(n)
+    return muestreo
+
+
+MUESTREO = _leer_muestreo(os.environ.get('MUESTREO_LOG', ''))
+
+
+class _SalidaEstandar(logging.StreamHandler):
+    # Escribe en el sys.stdout de cada momento (respeta redirect_stdout)
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, valor):
+        pass
+
+
+class _Encolador(logging.handlers.QueueHandler):
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def prepare(self, record):
+        # El mensaje se compone en el hilo de escritura, no en el que registra
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+class FormatoTexto(logging.Formatter):
+    def format(self, record):
+        texto = f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.componente}: " \
+                f"{record.getMessage()}"
+        if getattr(record, 'suprimidos', 0):
+            texto += f" (+{record.suprimidos} registros '{record.evento}' suprimidos)"
+        if record.exc_info:
+            texto += "\n" + self.formatException(record.exc_info)
+        return texto
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, record):
+        datos = {'t': round(record.created, 6), 'nivel': record.levelname, 'componente': record.componente,
+                 'evento': record.evento, 'mensaje': record.getMessage()}
+        datos.update(record.campos)
+        if getattr(record, 'suprimidos', 0):
+            datos['suprimidos'] = record.suprimidos
+        if record.exc_info:
+            datos['excepcion'] = self.formatException(record.exc_info)
+        return json.dumps(datos, default=str, ensure_ascii=False)
+
+
+_oyente = None
+_encolador = None
+_estados = {}  # {componente: contadores de muestreo y límite compartidos por sus bitácoras}
+
+
+def _iniciar():
+    # Un único hilo de escritura por proceso, compartido por todos los componentes
+    global _oyente, _encolador
+    if _oyente is not None:
+        return
+    salida = _SalidaEstandar()
+    salida.setFormatter(FormatoJSON() if FORMATO == 'json' else FormatoTexto())
+    _encolador = _Encolador(queue.Queue(TAMANO_COLA))
+    raiz = logging.getLogger(RAIZ)
+    raiz.addHandler(_encolador)
+    raiz.setLevel(NIVEL)
+    raiz.propagate = False
+    _oyente = logging.handlers.QueueListener(_encolador.queue, salida)
+    _oyente.start()
+    atexit.register(detener)
+
+
+def detener():
+    # Escribe lo pendiente y para el hilo de escritura
+    global _oyente
+    if _oyente is not None:
+        _oyente.stop()
+        _oyente = None
+        if _encolador.descartados:
+            print(f"Bitácora: {_encolador.descartados} registros descartados con la cola llena", file=sys.stderr)
+
+
+def estado():
+    # Registros en cola pendientes de escribir y descartados con la cola llena
+    if _encolador is None:
+        return {'pendientes': 0, 'descartados': 0}
+    return {'pendientes': _encolador.queue.qsize(), 'descartados': _encolador.descartados}
+
+
+def configurar(nivel=None):
+    # Cambia el nivel de todos los componentes del proceso (p. ej. en los benchmarks)
+    _iniciar()
+    if nivel is not None:
+        logging.getLogger(RAIZ).setLevel(nivel.upper() if isinstance(nivel, str) else nivel)
+
+
+class Bitacora:
+    # Uso: log = Bitacora('Servidor'); log.info('asignacion', "Taxi %d -> Usuario %d", t, u, taxi_id=t)
+    # Los argumentos posicionales componen el mensaje en el hilo de escritura;
+    # los de palabra clave son campos del registro JSON.
+    #
+    # `etiqueta` distingue instancias del mismo componente en la salida
+    # ('Taxi 7'); el muestreo y el límite son comunes a todo el componente
+    def __init__(self, componente, etiqueta=None):
+        _iniciar()
+        self.componente = etiqueta or componente
+        self.logger = logging.getLogger(f"{RAIZ}.{componente.lower()}")
+        # Los hilos comparten estos contadores sin lock: una carrera solo
+        # desvía un registro el muestreo o el límite
+        estado = _estados.setdefault(componente, ({}, {}, {}))
+        self.vistos, self.cubetas, self.suprimidos = estado
+        # vistos: {evento: registros vistos} para el muestreo
+        # cubetas: {evento: (fichas, instante)} para el límite por segundo
+        # suprimidos: {evento: registros suprimidos desde el último escrito}
+
+    def _permitir(self, nivel, evento):
+        if not self.logger.isEnabledFor(nivel):
+            return False
+        if nivel >= logging.WARNING:
+            return True
+        cada = MUESTREO.get(evento, 1)
+        if cada > 1:
+            visto = self.vistos.get(evento, 0) + 1
+            self.vistos[evento] = visto
+            if visto % cada:
+                return False
+        if LIMITE > 0:
+            ahora = time.monotonic()
+            fichas, instante = self.cubetas.get(evento, (LIMITE, ahora))
+            fichas = min(LIMITE, fichas + (ahora - instante) * LIMITE)
+            if fichas < 1:
+                self.cubetas[evento] = (fichas, ahora)
+                self.suprimidos[evento] = self.suprimidos.get(evento, 0) + 1
+                return False
+            self.cubetas[evento] = (fichas - 1, ahora)
+        return True
+
+    def registrar(self, nivel, evento, mensaje, *args, exc_info=None, **campos):
+        if not self._permitir(nivel, evento):
+            return
+        extra = {'componente': self.componente, 'evento': evento, 'campos': campos,
+                 'suprimidos': self.suprimidos.pop(evento, 0)}
+        self.logger.log(nivel, mensaje, *args, exc_info=exc_info, extra=extra)
+
+    def debug(self, evento, mensaje, *args, **campos):
+        self.registrar(logging.DEBUG, evento, mensaje, *args, **campos)
+
+    def info(self, evento, mensaje, *args, **campos):
+        self.registrar(logging.INFO, evento, mensaje, *args, **campos)
+
+    def warning(self, evento, mensaje, *args, **campos):
+        self.registrar(logging.WARNING, evento, mensaje, *args, **campos)
+
+    def error(self, evento, mensaje, *args, **campos):
+        self.registrar(logging.ERROR, evento, mensaje, *args, **campos)
@@ -1,7 +1,16 @@
 # broker.py
-import json
+import argparse
+import multiprocessing
+import signal
+import time
 import zmq
 
+import enrutamiento
+import protocolo
+from bitacora import Bitacora
+from captura import CANAL_BROKER, Captura
+from metricas import Metricas, ServidorMetricas
+
 # Direcciones IP de los componentes
 BROKER_IP = "127.0.0.1"       # IP del broker
 SERVIDOR_IP = "127.0.0.1"    # IP del servidor central
@@ -12,6 +21,11 @@ USUARIO_IP = "127.0.0.1"     # IP base para usuarios
 BROKER_FRONTEND_PORT = 5559       # Para publicadores (taxis y servidor)
 BROKER_BACKEND_PORT = 5560        # Para suscriptores (taxis y servidor)
 USUARIO_SERVER_PORT = 5555        # Para comunicación usuario-servidor
+USUARIO_REPLICA_PORT = 5556       # Para comunicación usuario-réplica del servidor
+SHARD_BASE_PORT = 5600            # Para comunicación frente-shards (5600 + región)
+METRICAS_BASE_PORT = 5700         # Para consultar métricas (5700 broker, 5701 servidor, 5702 réplica, 5710 + región shards)
+BROKER_FORWARDERS_BASE_PORT = 5800 # Reenviadores del broker en modo clúster (5800 + 2i, 5801 + 2i); ver enrutamiento.py
+CONSULTAS_BASE_PORT = 5900         # Para consultas de la flota (5901 servidor, 5902 réplica, 5910 + región shards); ver consultas.py
 
 # Configuraciones completas
 BROKER_FRONTEND_URL = f"tcp://*:{BROKER_FRONTEND_PORT}"
@@ -19,94 +33,293 @@ BROKER_BACKEND_URL = f"tcp://*:{BROKER_BACKEND_PORT}"
 BROKER_FRONTEND_CONNECT = f"tcp://{BROKER_IP}:{BROKER_FRONTEND_PORT}"
 BROKER_BACKEND_CONNECT = f"tcp://{BROKER_IP}:{BROKER_BACKEND_PORT}"
 USUARIO_SERVER_URL = f"tcp://{SERVIDOR_IP}:{USUARIO_SERVER_PORT}"
+USUARIO_REPLICA_URL = f"tcp://{SERVIDOR_IP}:{USUARIO_REPLICA_PORT}"
 
 
-def main():
+# Modo rápido: los mensajes se reenvían sin inspeccionarlos y solo se
+# muestrea el tópico de uno de cada MUESTREO_CONTADORES mensajes
+MUESTREO_CONTADORES = 64
+INTERVALO_ESTADISTICAS = 10  # Segundos entre resúmenes de tráfico por tópico
+
+# Modo último valor: la instantánea se envía en lotes de este número de mensajes
+TAMANO_LOTE_INSTANTANEA = 1000
+
+# Mensajes que se encolan por conexión antes de descartar (PUB/XPUB) o dejar
+# de leer (XSUB): acota la memoria del broker si un suscriptor no da abasto
+LIMITE_COLA_MENSAJES = 10000
+
+
+class CacheUltimoValor:
+    # Último registro y última actualización de cada taxi tal como llegaron
+    # (ya codificados), para que un suscriptor nuevo reciba el estado de la
+    # flota sin esperar a que cada taxi vuelva a publicar.
+    #
+    # Se guarda por taxi una tupla (tópicos, datos): un taxi que cambia de
+    # región publica el mismo mensaje en el tópico de las dos, y la entrada
+    # recuerda ambos tópicos mientras los datos sean los mismos
+    def __init__(self):
+        self.ultimos = {protocolo.TOPICO_REGISTRO: {}, protocolo.TOPICO_POSICION: {}}
+        self.tipos = {'registro': protocolo.TOPICO_REGISTRO, 'actualizacion': protocolo.TOPICO_POSICION}
+        self.compartidos = {}  # Un solo objeto por tópico (o tupla de tópicos) distinto
+
+    def compartir(self, valor):
+        return self.compartidos.setdefault(valor, valor)
+
+    def __len__(self):
+        return len(self.ultimos[protocolo.TOPICO_POSICION])
+
+    def guardar(self, message):
+        topico = message[0]
+        if not topico.startswith((protocolo.TOPICO_REGISTRO, protocolo.TOPICO_POSICION)):
+            return
+        topico = self.compartir(topico)
+        for datos in protocolo.separar_codificados(message[-1]):
+            clave = protocolo.taxi_de(datos)
+            if clave is None:
+                continue
+            tipo, id_taxi = clave
+            ultimos = self.ultimos[self.tipos[tipo]]
+            anterior = ultimos.get(id_taxi)
+            if anterior is not None and anterior[1] == datos:
+                if topico not in anterior[0]:
+                    ultimos[id_taxi] = (self.compartir(anterior[0] + (topico,)), anterior[1])
+            else:
+                ultimos[id_taxi] = (self.compartir((topico,)), datos)
+
+    def instantanea(self, suscripcion):
+        # [tópico, lote] con lo guardado que recibe quien se suscribe a `suscripcion`;
+        # primero los registros para que el servidor conozca los taxis al aplicar las posiciones
+        por_topico = {}
+        for familia, ultimos in self.ultimos.items():
+            if not (familia.startswith(suscripcion) or suscripcion.startswith(familia)):
+                continue
+            for topicos, datos in ultimos.values():
+                for topico in topicos:
+                    if topico.startswith(suscripcion):
+                        por_topico.setdefault(topico, []).append(datos)
+        for topico, partes in por_topico.items():
+            for inicio in range(0, len(partes), TAMANO_LOTE_INSTANTANEA):
+                yield [topico, protocolo.agrupar_codificados(partes[inicio:inicio + TAMANO_LOTE_INSTANTANEA])]
+
+
+log = Bitacora('Broker')
+metricas = Metricas('Broker')
+
+
+def familia_topico(topico):
+    # 'assign.12.' -> 'assign.'; agrupa los contadores por tipo de tópico
+    punto = topico.find(b'.')
+    return topico[:punto + 1] if punto >= 0 else topico
+
+
+def mostrar_mensaje(message):
+    try:
+        # El mensaje real está en la última parte del mensaje multipart
+        msg_data = protocolo.decodificar(message[-1])
+
+        tipo = msg_data.get('tipo', '')
+
+        if tipo == 'registro':
+            log.info('reenvio', "Reenviado registro del Taxi %d en posición %s", msg_data['id'],
+                     msg_data['posicion'], tipo=tipo)
+
+        elif tipo == 'actualizacion':
+            log.info('reenvio', "Reenviada actualización del Taxi %d en posición %s", msg_data['id'],
+                     msg_data['posicion'], tipo=tipo)
+
+        elif tipo == 'servicio_asignado':
+            log.info('reenvio', "Reenviada asignación de servicio al Taxi %d para Usuario %s",
+                     msg_data['taxi_id'], msg_data['id_usuario'], tipo=tipo)
+
+        elif tipo == 'lote':
+            log.info('reenvio', "Reenviado lote de %d mensajes", len(msg_data['mensajes']), tipo=tipo)
+
+        else:
+            log.info('reenvio', "Reenviado mensaje desconocido", tipo=tipo)
+
+    except Exception as e:
+        log.warning('reenvio', "Error decodificando mensaje reenviado: %s", e)
+
+
+def mostrar_estadisticas(contadores, transcurrido):
+    resumen = ", ".join(f"{familia.decode('utf-8', 'replace')} ~{total / transcurrido:.0f}/s"
+                        for familia, total in sorted(contadores.items()))
+    log.info('estadisticas', "Tráfico estimado en los últimos %.0f s: %s", transcurrido, resumen or 'sin mensajes')
+
+
+def puerto_metricas(forwarder):
+    # 5700 para el broker (o su reenviador 0); 5750 + i para el resto de reenviadores
+    return METRICAS_BASE_PORT if forwarder == 0 else METRICAS_BASE_PORT + 50 + forwarder
+
+
+def reenviar(tabla, forwarder, args):
+    global log
+    if len(tabla) > 1:
+        log = Bitacora('Broker', f"Broker {forwarder}")
+    depuracion = args.modo == 'depuracion'
+    cache = CacheUltimoValor() if args.ultimo_valor else None
+    captura = None
+    if args.captura is not None:
+        # Cada reenviador del clúster guarda su parte en su propio archivo
+        captura = Captura(args.captura if len(tabla) == 1 else f"{args.captura}.{forwarder}")
+        # terminate() también debe vaciar la captura al disco
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    # Solo se cronometra el reenvío de uno de cada MUESTREO_CONTADORES mensajes
+    h_reenvio = metricas.histograma('reenvio')
+    h_instantanea = metricas.histograma('instantanea')
+    if cache is not None:
+        metricas.indicador('taxis_en_cache', lambda: len(cache))
+    if args.metricas:
+        ServidorMetricas(metricas, puerto_metricas(forwarder)).start()
+
     try:
         context = zmq.Context()
 
         # Socket frontend para recibir mensajes de los publicadores
         frontend = context.socket(zmq.XSUB)
-        frontend.bind(BROKER_FRONTEND_URL)
+        frontend.setsockopt(zmq.RCVHWM, LIMITE_COLA_MENSAJES)
+        frontend.bind(tabla.frontend(forwarder)) # 5559
+        if cache is not None:
+            # Los publicadores descartan lo que nadie ha pedido: el broker se
+            # suscribe por su cuenta para guardar el estado aunque no haya servidor
+            for topico in (protocolo.TOPICO_REGISTRO, protocolo.TOPICO_POSICION):
+                frontend.send(b'\x01' + topico)
 
         # Socket backend para enviar mensajes a los suscriptores
         backend = context.socket(zmq.XPUB)
-        backend.bind(BROKER_BACKEND_URL)
+        backend.setsockopt(zmq.SNDHWM, LIMITE_COLA_MENSAJES)
+        if cache is not None:
+            # Sin esto XPUB solo avisa de la primera suscripción a cada tópico
+            # y un servidor que se reinicia no recibiría la instantánea
+            backend.setsockopt(zmq.XPUB_VERBOSE, 1)
+        backend.bind(tabla.backend(forwarder)) # 5560
 
-        print("Broker iniciado. Esperando mensajes...")
+        log.info('inicio', "Broker iniciado en modo %s%s en %s y %s. Esperando mensajes...", args.modo,
+                 ' con caché de último valor' if cache is not None else '', tabla.frontend(forwarder),
+                 tabla.backend(forwarder))
+        if args.metricas:
+            log.info('inicio', "Métricas en el puerto %d", puerto_metricas(forwarder))
 
         poller = zmq.Poller()
         poller.register(frontend, zmq.POLLIN)
         poller.register(backend, zmq.POLLIN)
 
+        recibidos = 0
+        contadores = {}  # {familia de tópico: mensajes estimados}
+        inicio_intervalo = time.time()
+
         while True:
             try:
                 events = dict(poller.poll())
 
                 if frontend in events:
                     message = frontend.recv_multipart()
-                    # Imprimir mensaje para depuración
-                    #print(f"Broker: Mensaje recibido: {message}")
-
-                    try:
-                        # El mensaje real está en la última parte del mensaje multipart
-                        msg_str = message[-1].decode('utf-8')
-                        msg_data = json.loads(msg_str)
-
-                        tipo = msg_data.get('tipo', '')
-                        #print(f"Broker: Tipo de mensaje recibido: {tipo}")
-
-                        if tipo == 'registro':
-                            print(
-                                f"\nBroker: Recibido registro del Taxi {msg_data['id']} en posición {msg_data['posicion']}")
-                            # Asegurar que el mensaje se reenvía
-                            backend.send_multipart(message)
-                            print(f"Broker: Mensaje de registro reenviado")
-
-                        elif tipo == 'actualizacion':
-                            print(
-                                f"Broker: Recibida actualización del Taxi {msg_data['id']} en posición {msg_data['posicion']}")
-                            # Asegurar que el mensaje se reenvía
-                            backend.send_multipart(message)
-                            print(f"Broker: Mensaje de actualización reenviado")
-
-                        elif tipo == 'servicio_asignado':
-                            print(
-                                f"Broker: Recibida asignación de servicio al Taxi {msg_data['taxi_id']} para Usuario {msg_data['id_usuario']}")
-                            # Asegurar que el mensaje se reenvía
-                            backend.send_multipart(message)
-                            print(f"Broker: Mensaje de actualización reenviado")
-
-                        else:
-                            print(f"Broker: Recibido mensaje desconocido")
-                            # Asegurar que el mensaje se reenvía
-                            backend.send_multipart(message)
-                            print(f"Broker: Mensaje desconocido reenviado")
-
-                    except json.JSONDecodeError as e:
-                        print(f"Broker: Error decodificando JSON: {e}")
-                        # Asegurar que el mensaje se reenvía
-                        backend.send_multipart(message)
-                    except Exception as e:
-                        print(f"Broker: Error procesando mensaje: {e}")
-                        # Asegurar que el mensaje se reenvía
-                        backend.send_multipart(message)
+                    recibidos += 1
+                    muestra = recibidos % MUESTREO_CONTADORES == 0
+                    if muestra:
+                        inicio = time.perf_counter()
+
+                    # Los mensajes se reenvían tal cual, sin decodificarlos
+                    backend.send_multipart(message)
+                    if cache is not None:
+                        cache.guardar(message)
+                    if captura is not None:
+                        captura.escribir(CANAL_BROKER, message)
+
+                    if muestra:
+                        h_reenvio.registrar(time.perf_counter() - inicio)
+                        familia = familia_topico(message[0])
+                        metricas.contar_por('mensajes', familia.decode('utf-8', 'replace'), MUESTREO_CONTADORES)
+
+                    if depuracion:
+                        mostrar_mensaje(message)
+                    elif muestra:
+                        contadores[familia] = contadores.get(familia, 0) + MUESTREO_CONTADORES
+
+                        transcurrido = time.time() - inicio_intervalo
+                        if transcurrido >= INTERVALO_ESTADISTICAS:
+                            mostrar_estadisticas(contadores, transcurrido)
+                            contadores = {}
+                            inicio_intervalo = time.time()
 
                 if backend in events:
                     message = backend.recv_multipart()
-                    print(f"Broker: Nueva suscripción recibida: {message}")
+                    log.info('suscripcion', "Nueva suscripción recibida: %s", message)
+                    metricas.contar_por('suscripciones', 'alta' if message[0][:1] == b'\x01' else 'baja')
                     frontend.send_multipart(message)
 
+                    # El primer byte es 1 al suscribirse y 0 al cancelar la suscripción
+                    if cache is not None and message[0][:1] == b'\x01':
+                        # XPUB no puede enviar a un único suscriptor: los que ya
+                        # estaban suscritos también la reciben y la descartan como repetida
+                        enviados = 0
+                        inicio = time.perf_counter()
+                        for parte in cache.instantanea(message[0][1:]):
+                            backend.send_multipart(parte)
+                            enviados += 1
+                        h_instantanea.registrar(time.perf_counter() - inicio)
+                        if enviados:
+                            log.info('instantanea', "Enviada instantánea de %d taxis en %d lotes para la "
+                                     "suscripción %s", len(cache), enviados, message[0][1:])
+
             except Exception as e:
-                print(f"Error en ciclo principal del broker: {e}")
+                metricas.contar('errores')
+                log.error('ciclo', "Error en ciclo principal del broker: %s", e)
 
     except Exception as e:
-        print(f"Error crítico en el broker: {e}")
+        log.error('ciclo', "Error crítico en el broker: %s", e)
     finally:
+        if captura is not None:
+            captura.cerrar()
+            log.info('fin', "Captura de %d mensajes guardada en %s", captura.registros, captura.ruta)
         frontend.close()
         backend.close()
         context.term()
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Broker XSUB/XPUB entre taxis y servidor central")
+    parser.add_argument('--modo', choices=['rapido', 'depuracion'], default='rapido',
+                        help="'rapido' reenvía sin inspeccionar; 'depuracion' registra cada mensaje "
+                             "(con MUESTREO_LOG=reenvio=1 LIMITE_LOG=0 para no muestrear ninguno)")
+    parser.add_argument('--ultimo-valor', action='store_true',
+                        help="Guarda el último registro y posición de cada taxi y los envía a cada suscriptor nuevo")
+    parser.add_argument('--metricas', action='store_true',
+                        help="Atender consultas de métricas y perfiles en METRICAS_BASE_PORT; ver metricas.py")
+    parser.add_argument('--captura', default=None, metavar='ARCHIVO',
+                        help="Guardar cada mensaje reenviado con su instante para repetidor.py; ver captura.py")
+    parser.add_argument('--forwarders', type=int, default=enrutamiento.num_forwarders(),
+                        help="Reenviadores en procesos separados que se reparten los taxis por id "
+                             "(BROKER_FORWARDERS); ver enrutamiento.py")
+    parser.add_argument('--forwarder', type=int, default=None,
+                        help="Ejecutar solo este reenviador del clúster (p. ej. uno por máquina)")
+    args = parser.parse_args()
+    tabla = enrutamiento.Enrutamiento('*', BROKER_FRONTEND_PORT, BROKER_BACKEND_PORT,
+                                      BROKER_FORWARDERS_BASE_PORT, args.forwarders)
+
+    if args.forwarder is not None:
+        reenviar(tabla, args.forwarder, args)
+    elif len(tabla) == 1:
+        reenviar(tabla, 0, args)
+    else:
+        # Cada reenviador en su propio proceso (y su propio núcleo); 'spawn'
+        # para que cada uno arranque su propia bitácora y sus propias métricas
+        contexto = multiprocessing.get_context('spawn')
+        procesos = [contexto.Process(target=reenviar, args=(tabla, i, args), daemon=True) for i in range(len(tabla))]
+        for proceso in procesos:
+            proceso.start()
+        log.info('inicio', "Clúster de %d reenviadores iniciado", len(tabla))
+        # terminate() del proceso principal también cierra los reenviadores
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            for proceso in procesos:
+                proceso.join()
+        except KeyboardInterrupt:
+            log.info('fin', "Cerrando clúster de reenviadores...")
+        finally:
+            for proceso in procesos:
+                proceso.terminate()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
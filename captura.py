@@ -0,0 +1,144 @@
+# captura.py
+# Registro binario del tráfico del sistema para reproducirlo después con
+# repetidor.py: el broker guarda cada mensaje que reenvía (broker.py
+# --captura) y el servidor central cada solicitud de usuario y su respuesta
+# (servidor_central.py --captura).
+#
+# Formato: una cabecera <magia, versión, instante de inicio> y a
+# continuación registros <instante, canal, número de partes> seguidos de
+# cada parte precedida de su longitud. Todo es de longitud conocida, así
+# que leer() recorre el archivo proyectado en memoria (mmap) sin copiarlo.
+# Un registro incompleto al final (proceso terminado a mitad de escritura)
+# se ignora.
+#
+# Uso: python captura.py <archivo> [...]  (resumen de cada captura)
+import mmap
+import struct
+import sys
+import threading
+import time
+
+import zmq
+
+MAGIA = b'CAPT'
+VERSION = 1
+CABECERA = struct.Struct('<4sHd')   # magia, versión, instante de inicio
+REGISTRO = struct.Struct('<dBB')    # instante, canal, número de partes
+LARGO = struct.Struct('<I')         # longitud de cada parte
+
+CANAL_BROKER = 0     # [tópico, datos] reenviado por el broker
+CANAL_USUARIOS = 1   # Solicitud de un usuario (con 'tipo') o respuesta del servidor (JSON)
+NOMBRES_CANALES = {CANAL_BROKER: 'broker', CANAL_USUARIOS: 'usuarios'}
+
+TAMANO_BUFFER = 1 << 20
+LIMITE_COLA_CAPTURA = 100000   # SNDHWM/RCVHWM del PUB y el SUB de captura: si el escritor se atrasa se pierden mensajes
+
+
+class Captura:
+    def __init__(self, ruta, tamano_buffer=TAMANO_BUFFER):
+        self.ruta = ruta
+        self.archivo = open(ruta, 'wb', buffering=tamano_buffer)
+        self.archivo.write(CABECERA.pack(MAGIA, VERSION, time.time()))
+        self.lock = threading.Lock()  # El broker escribe desde un hilo; el servidor, desde varios
+        self.registros = 0
+
+    def escribir(self, canal, partes, instante=None):
+        registro = [REGISTRO.pack(time.time() if instante is None else instante, canal, len(partes))]
+        for parte in partes:
+            registro.append(LARGO.pack(len(parte)))
+            registro.append(parte)
+        with self.lock:
+            if self.archivo.closed:
+                return  # Mensajes que llegan mientras se cierra el componente
+            self.archivo.write(b''.join(registro))
+            self.registros += 1
+
+    def escuchar(self, context, url, canal, solo_ultima=True):
+        # Hilo que guarda lo que llega a un SUB conectado a `url`, p. ej. el
+        # socket de captura del enrutador del servidor (que recibe todas las partes, incluido
+        # el sobre del ROUTER: con solo_ultima se guarda solo el contenido)
+        socket = context.socket(zmq.SUB)
+        socket.setsockopt(zmq.RCVHWM, LIMITE_COLA_CAPTURA)
+        socket.setsockopt(zmq.SUBSCRIBE, b'')
+        socket.connect(url)
+
+        def escuchar():
+            try:
+                while True:
+                    partes = socket.recv_multipart()
+                    self.escribir(canal, partes[-1:] if solo_ultima else partes)
+            except zmq.ContextTerminated:
+                socket.close()
+
+        hilo = threading.Thread(target=escuchar, daemon=True)
+        hilo.start()
+        return hilo
+
+    def cerrar(self):
+        with self.lock:
+            self.archivo.close()
+
+
+def leer(ruta):
+    # (instante, canal, [partes]) de cada registro, en orden; las partes son
+    # memoryview sobre el archivo proyectado (bytes(parte) para conservarlas)
+    with open(ruta, 'rb') as f:
+        if f.seek(0, 2) < CABECERA.size:
+            return
+        datos = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    vista = memoryview(datos)
+    try:
+        magia, version, _ = CABECERA.unpack_from(vista, 0)
+        if magia != MAGIA or version != VERSION:
+            raise ValueError(f"{ruta} no es una captura (versión {VERSION})")
+        desplazamiento = CABECERA.size
+        fin = len(vista)
+        while desplazamiento + REGISTRO.size <= fin:
+            instante, canal, num_partes = REGISTRO.unpack_from(vista, desplazamiento)
+            posicion = desplazamiento + REGISTRO.size
+            partes = []
+            for _ in range(num_partes):
+                if posicion + LARGO.size > fin:
+                    return
+                (largo,) = LARGO.unpack_from(vista, posicion)
+                posicion += LARGO.size
+                if posicion + largo > fin:
+                    return
+                partes.append(vista[posicion:posicion + largo])
+                posicion += largo
+            yield instante, canal, partes
+            desplazamiento = posicion
+    finally:
+        # Las memoryview entregadas deben liberarse antes de cerrar el mmap
+        vista.release()
+        try:
+            datos.close()
+        except BufferError:
+            pass
+
+
+def inicio_de(ruta):
+    with open(ruta, 'rb') as f:
+        return CABECERA.unpack(f.read(CABECERA.size))[2]
+
+
+def resumen(ruta):
+    por_canal = {}
+    primero = ultimo = None
+    total = 0
+    for instante, canal, partes in leer(ruta):
+        por_canal[canal] = por_canal.get(canal, 0) + 1
+        total += sum(len(parte) for parte in partes)
+        primero = instante if primero is None else primero
+        ultimo = instante
+    duracion = 0.0 if primero is None else ultimo - primero
+    canales = ', '.join(f"{NOMBRES_CANALES.get(canal, canal)} {n}" for canal, n in sorted(por_canal.items()))
+    print(f"{ruta}: {sum(por_canal.values())} registros ({canales or 'vacía'}) en {duracion:.1f} s, "
+          f"{total / 1e6:.1f} MB de datos")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python captura.py <archivo> [...]")
+    for ruta in sys.argv[1:]:
+        resumen(ruta)
@@ -0,0 +1,3 @@
+# conftest.py
+# Hace importables los módulos de la raíz del proyecto desde tests/ al
+# ejecutar pytest (python -m pytest tests)
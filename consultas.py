@@ -0,0 +1,298 @@
+# consultas.py
+# Consultas de solo lectura sobre la flota del servidor central para los
+# operadores: taxis a menos de una distancia de un punto, los k taxis libres
+# más cercanos y recuentos de toda la flota, en un socket REP propio
+# (servidor_central.py --consultas).
+#
+# Las consultas nunca toman el lock del servidor: se responden sobre una
+# InstantaneaFlota inmutable que un hilo reconstruye cada `intervalo`
+# segundos y publica sustituyendo una sola referencia. Cada consulta toma
+# la referencia una vez y trabaja con esa instantánea hasta el final aunque
+# entretanto se publique otra; la anterior se libera cuando nadie la usa.
+#
+# Tampoco la toma el hilo de las instantáneas: la copia de la tabla de la
+# flota (TablaFlota.copia, una copia del buffer) y de los estados de
+# disponibilidad la hace el hilo de actualizaciones del servidor al final
+# de un lote, cuando ya tiene el lock (copiar), y la deja en `copia`. Los
+# arrays y recuentos de la instantánea se construyen después, en el hilo
+# de las instantáneas. Así cada taxi aparece con una posición y un estado
+# que tuvo de verdad.
+#
+# Órdenes del puerto de consultas (JSON), distancias Manhattan como en la asignación:
+#   {'orden': 'rango', 'posicion': [x, y], 'radio': r}     taxis a distancia <= r
+#        opcionales 'solo_libres': true, 'limite': n (por defecto MAX_RESULTADOS)
+#   {'orden': 'cercanos', 'posicion': [x, y], 'k': k}      los k taxis libres más cercanos
+#   {'orden': 'resumen'}                                   recuentos por estado y por servicios
+#
+# Consulta desde la terminal: python consultas.py PUERTO resumen
+#                             python consultas.py PUERTO rango X Y R [--libres]
+#                             python consultas.py PUERTO cercanos X Y K
+import argparse
+import collections
+import json
+import threading
+import time
+
+import numpy as np
+import zmq
+
+from bitacora import Bitacora
+from disponibilidad import EN_ESPERA, LIBRE
+
+INTERVALO_INSTANTANEA = 1.0   # Segundos entre instantáneas de la flota
+MAX_RESULTADOS = 1000         # Taxis que devuelve como mucho una consulta de rango
+LIMITE_COLA_CONSULTAS = 1000  # SNDHWM/RCVHWM del puerto de consultas
+
+log = Bitacora('Consultas')
+
+
+def posicion_valida(valor):
+    if (not isinstance(valor, (list, tuple)) or len(valor) != 2 or
+            not all(isinstance(c, (int, float)) and not isinstance(c, bool) for c in valor)):
+        raise ValueError(f"Posición no válida: {valor!r}")
+    return tuple(valor)
+
+
+class InstantaneaFlota:
+    def __init__(self, tabla, estados, fin_espera, instante, numero):
+        self.instante = instante
+        self.numero = numero                   # Crece con cada instantánea publicada
+        n = len(tabla)
+        self.ids = tabla.columna('id')
+        self.x = tabla.columna('x').astype(np.int64)
+        self.y = tabla.columna('y').astype(np.int64)
+        self.servicios = tabla.columna('servicios')
+        # Las esperas se vencen de forma perezosa en el servidor: aquí se
+        # aplican las que ya terminaron en el instante de la copia
+        self.estados = estados  # Copia propia: se puede modificar
+        for id_taxi, fin in fin_espera.items():
+            if fin < instante and estados.get(id_taxi) == EN_ESPERA:
+                estados[id_taxi] = LIBRE
+        libres = np.fromiter((id_taxi for id_taxi, estado in estados.items() if estado == LIBRE), dtype=np.int64)
+        self.libre = np.isin(self.ids, libres)
+
+        por_estado = dict(collections.Counter(estados.values()))
+        if len(estados) < n:
+            por_estado['desconocido'] = n - len(estados)
+        valores, cuentas = np.unique(self.servicios, return_counts=True)
+        self.resumen = {'taxis': n, 'por_estado': por_estado,
+                        'por_servicios': {str(v): int(c) for v, c in zip(valores.tolist(), cuentas.tolist())}}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def distancias(self, pos):
+        return np.abs(self.x - pos[0]) + np.abs(self.y - pos[1])
+
+    def taxi(self, fila, distancia):
+        id_taxi = int(self.ids[fila])
+        return {'id': id_taxi, 'posicion': [int(self.x[fila]), int(self.y[fila])],
+                'estado': self.estados.get(id_taxi), 'servicios': int(self.servicios[fila]),
+                'distancia': int(distancia)}
+
+    def rango(self, pos, radio, solo_libres=False, limite=MAX_RESULTADOS):
+        # (total, [taxis más cercanos primero, como mucho `limite`])
+        distancias = self.distancias(pos)
+        mascara = distancias <= radio
+        if solo_libres:
+            mascara &= self.libre
+        filas = np.flatnonzero(mascara)
+        if limite <= 0:
+            return len(filas), []
+        return len(filas), [self.taxi(fila, distancias[fila])
+                            for fila in self.mas_cercanas(filas, distancias[filas], limite)]
+
+    def cercanos(self, pos, k):
+        filas = np.flatnonzero(self.libre)
+        if k <= 0 or not len(filas):
+            return []
+        distancias = self.distancias(pos)
+        return [self.taxi(fila, distancias[fila]) for fila in self.mas_cercanas(filas, distancias[filas], k)]
+
+    def mas_cercanas(self, filas, distancias, k):
+        # Las k filas más cercanas, y a igual distancia la de menor id, como
+        # en la asignación; los empates con la k-ésima también compiten
+        if len(filas) > k:
+            dentro = distancias <= np.partition(distancias, k - 1)[k - 1]
+            filas, distancias = filas[dentro], distancias[dentro]
+        return filas[np.lexsort((self.ids[filas], distancias))[:k]].tolist()
+
+
+class ServidorConsultas:
+    # Dos hilos: uno construye cada instantánea con la copia que deja el
+    # servidor y otro atiende el puerto de consultas con la última publicada
+    def __init__(self, servidor, puerto, intervalo=INTERVALO_INSTANTANEA):
+        self.servidor = servidor
+        self.puerto = puerto
+        self.intervalo = intervalo
+        self.instantanea = None  # Solo se sustituye entera, nunca se modifica
+        self.copia = None        # (tabla, estados, fin_espera, instante) aún sin instantánea
+        self.copia_lista = threading.Event()
+        self.proxima_copia = 0.0
+        m = servidor.metricas
+        self.h_instantanea = m.histograma('consultas.instantanea')
+        self.h_consultas = {orden: m.histograma(f"consultas.{orden}") for orden in ('rango', 'cercanos', 'resumen')}
+        m.indicador('consultas.edad_instantanea', self.edad)
+
+    def edad(self):
+        instantanea = self.instantanea
+        return None if instantanea is None else round(time.time() - instantanea.instante, 3)
+
+    def toca_copiar(self):
+        return time.monotonic() >= self.proxima_copia
+
+    def copiar(self):
+        # Debe llamarse con el lock del servidor adquirido; solo copia
+        disponibilidad = self.servidor.disponibilidad
+        self.copia = (self.servidor.taxis.copia(), disponibilidad.estados.copy(),
+                      disponibilidad.fin_espera.copy(), self.servidor.reloj())
+        self.proxima_copia = time.monotonic() + self.intervalo
+        self.copia_lista.set()
+
+    def publicar(self):
+        # Construye y publica la instantánea de la última copia, sin el lock
+        inicio = time.perf_counter()
+        self.copia_lista.clear()
+        tabla, estados, fin_espera, instante = self.copia
+        anterior = self.instantanea
+        instantanea = InstantaneaFlota(tabla, estados, fin_espera, instante,
+                                       0 if anterior is None else anterior.numero + 1)
+        self.instantanea = instantanea
+        self.h_instantanea.registrar(time.perf_counter() - inicio)
+        return instantanea
+
+    def renovar(self):
+        while True:
+            self.copia_lista.wait()
+            try:
+                self.publicar()
+            except Exception as e:
+                log.error('instantanea', "Error tomando la instantánea de la flota: %s", e)
+
+    def responder(self, peticion):
+        instantanea = self.instantanea
+        if instantanea is None:
+            return {'error': "Aún no hay instantánea de la flota"}
+        if not isinstance(peticion, dict):
+            raise ValueError("La consulta debe ser un objeto JSON")
+        orden = peticion.get('orden')
+        respuesta = {'instante': instantanea.instante, 'numero': instantanea.numero}
+        if orden == 'resumen':
+            respuesta.update(instantanea.resumen)
+        elif orden == 'rango':
+            total, taxis = instantanea.rango(posicion_valida(peticion.get('posicion')), peticion['radio'],
+                                             peticion.get('solo_libres', False),
+                                             peticion.get('limite', MAX_RESULTADOS))
+            respuesta.update(total=total, taxis=taxis)
+        elif orden == 'cercanos':
+            respuesta['taxis'] = instantanea.cercanos(posicion_valida(peticion.get('posicion')), peticion.get('k', 1))
+        else:
+            return {'error': f"Orden desconocida: {orden}"}
+        return respuesta
+
+    def atender(self):
+        socket = zmq.Context.instance().socket(zmq.REP)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.setsockopt(zmq.SNDHWM, LIMITE_COLA_CONSULTAS)
+        socket.setsockopt(zmq.RCVHWM, LIMITE_COLA_CONSULTAS)
+        socket.bind(f"tcp://*:{self.puerto}")
+        while True:
+            try:
+                peticion = socket.recv_json()
+            except zmq.ZMQError:
+                return
+            except ValueError as e:
+                socket.send_json({'error': str(e)})
+                continue
+            inicio = time.perf_counter()
+            # Cualquier fallo se contesta: el REP no admite otra petición sin responder
+            try:
+                respuesta = self.responder(peticion)
+            except (KeyError, TypeError, ValueError) as e:
+                respuesta = {'error': f"Consulta mal formada: {e}"}
+            except Exception as e:
+                log.error('consulta', "Error respondiendo la consulta %r: %s", peticion, e)
+                respuesta = {'error': f"Error respondiendo la consulta: {e}"}
+            try:
+                socket.send_json(respuesta)
+            except zmq.ZMQError:
+                return
+            except Exception as e:
+                socket.send_json({'error': f"Respuesta no serializable: {e}"})
+            histograma = self.h_consultas.get(peticion.get('orden')) if isinstance(peticion, dict) else None
+            if histograma is not None:
+                histograma.registrar(time.perf_counter() - inicio)
+
+    def iniciar(self):
+        # La primera copia se hace aquí para contestar desde el arranque
+        with self.servidor.lock:
+            self.copiar()
+        self.publicar()
+        for objetivo, nombre in ((self.renovar, 'instantanea_consultas'), (self.atender, 'consultas')):
+            threading.Thread(target=objetivo, name=nombre, daemon=True).start()
+        log.info('inicio', "Consultas de la flota en el puerto %d (instantánea cada %g s)", self.puerto,
+                 self.intervalo)
+
+
+def consultar(puerto, peticion, espera=5.0):
+    socket = zmq.Context.instance().socket(zmq.REQ)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.connect(f"tcp://127.0.0.1:{puerto}")
+    try:
+        socket.send_json(peticion)
+        if not socket.poll(espera * 1000):
+            return None
+        return socket.recv_json()
+    finally:
+        socket.close()
+
+
+def mostrar(datos):
+    edad = time.time() - datos['instante']
+    print(f"Instantánea {datos['numero']} (hace {edad:.1f} s)")
+    if 'por_estado' in datos:
+        print(f"  {datos['taxis']} taxis")
+        for estado, cuenta in sorted(datos['por_estado'].items()):
+            print(f"  {estado:<18} {cuenta}")
+        for servicios, cuenta in sorted(datos['por_servicios'].items()):
+            print(f"  {servicios} servicios{'':<8} {cuenta}")
+        return
+    if 'total' in datos:
+        print(f"  {datos['total']} taxis en el rango, {len(datos['taxis'])} mostrados")
+    for taxi in datos['taxis']:
+        print(f"  Taxi {taxi['id']:<8} en {tuple(taxi['posicion'])} a distancia {taxi['distancia']:<5} "
+              f"{taxi['estado']} ({taxi['servicios']} servicios)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta la flota de un servidor central")
+    parser.add_argument('puerto', type=int)
+    parser.add_argument('--json', action='store_true', help="Mostrar la respuesta tal cual")
+    ordenes = parser.add_subparsers(dest='orden', required=True)
+    ordenes.add_parser('resumen')
+    rango = ordenes.add_parser('rango')
+    for nombre in ('x', 'y', 'radio'):
+        rango.add_argument(nombre, type=int)
+    rango.add_argument('--libres', action='store_true', help="Solo taxis libres")
+    rango.add_argument('--limite', type=int, default=MAX_RESULTADOS)
+    cercanos = ordenes.add_parser('cercanos')
+    for nombre in ('x', 'y', 'k'):
+        cercanos.add_argument(nombre, type=int)
+    args = parser.parse_args()
+
+    peticion = {'orden': args.orden}
+    if args.orden == 'rango':
+        peticion.update(posicion=[args.x, args.y], radio=args.radio, solo_libres=args.libres, limite=args.limite)
+    elif args.orden == 'cercanos':
+        peticion.update(posicion=[args.x, args.y], k=args.k)
+    datos = consultar(args.puerto, peticion)
+    if datos is None:
+        print(f"Sin respuesta en el puerto {args.puerto}")
+    elif args.json or 'error' in datos:
+        print(json.dumps(datos, indent=2, ensure_ascii=False))
+    else:
+        mostrar(datos)
+
+
+if __name__ == "__main__":
+    main()
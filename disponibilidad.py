@@ -0,0 +1,122 @@
+# disponibilidad.py
+# Máquina de estados de disponibilidad de los taxis del servidor central.
+#
+# El índice espacial solo contiene como elegibles a los taxis LIBRES, así
+# que una búsqueda nunca revisa taxis ocupados, en espera o fuera de
+# servicio. Los cambios que dependen del paso del tiempo se programan en un
+# montículo de mínimos y se aplican con vencer(ahora) antes de cada búsqueda:
+#   - EN_ESPERA -> LIBRE cuando termina la espera tras la última asignación;
+#   - cualquier estado -> CADUCADO si el taxi lleva `ttl` segundos sin
+#     publicar (un taxi parado, velocidad 0, no publica: ttl=None lo desactiva).
+# Un taxi que completa su máximo de servicios queda RETIRADO para siempre.
+#
+# Cada taxi tiene como mucho una entrada de caducidad en el montículo: al
+# vencer se vuelve a programar con la última señal si el taxi publicó
+# mientras tanto. Las entradas de espera que ya no corresponden al estado
+# del taxi se descartan al salir del montículo.
+import heapq
+
+LIBRE = 'libre'
+OCUPADO = 'ocupado'
+EN_ESPERA = 'en_espera'
+FUERA_DE_REGION = 'fuera_de_region'
+CADUCADO = 'caducado'
+RETIRADO = 'retirado'
+
+_ESPERA = 0
+_CADUCIDAD = 1
+
+
+class Disponibilidad:
+    def __init__(self, indice, espera, ttl=None, max_servicios=3):
+        self.indice = indice
+        self.espera = espera              # Segundos tras una asignación sin poder recibir otra
+        self.ttl = ttl                    # Segundos sin publicar para dar un taxi por caducado
+        self.max_servicios = max_servicios
+        self.estados = {}                 # {id_taxi: estado}
+        self.fin_espera = {}              # {id_taxi: instante} de los taxis EN_ESPERA
+        self.ultima_senal = {}            # {id_taxi: instante en que se supo de él por última vez}
+        self.eventos = []                 # Montículo de (instante, tipo, id_taxi)
+
+    def __len__(self):
+        return len(self.estados)
+
+    def estado(self, id_taxi):
+        return self.estados.get(id_taxi)
+
+    def resumen(self):
+        # {estado: número de taxis}
+        conteo = {}
+        for estado in self.estados.values():
+            conteo[estado] = conteo.get(estado, 0) + 1
+        return conteo
+
+    def _cambiar(self, id_taxi, estado, pos=None):
+        self.estados[id_taxi] = estado
+        if estado != EN_ESPERA:
+            self.fin_espera.pop(id_taxi, None)
+        if pos is None:
+            self.indice.marcar_elegible(id_taxi, estado == LIBRE)
+        else:
+            self.indice.actualizar(id_taxi, pos, estado == LIBRE)
+
+    def actualizar(self, id_taxi, pos, ocupado, servicios, ultima_asignacion, ahora, en_region=True):
+        # Estado conocido del taxi (registro, actualización o estado recuperado al
+        # arrancar); cuenta como señal de vida y renueva su caducidad
+        if self.estados.get(id_taxi) == RETIRADO or servicios >= self.max_servicios:
+            self._cambiar(id_taxi, RETIRADO, pos)
+            self.ultima_senal.pop(id_taxi, None)
+            return
+
+        if self.ttl is not None and id_taxi not in self.ultima_senal:
+            heapq.heappush(self.eventos, (ahora + self.ttl, _CADUCIDAD, id_taxi))
+        self.ultima_senal[id_taxi] = ahora
+
+        fin = ultima_asignacion + self.espera
+        if ocupado:
+            self._cambiar(id_taxi, OCUPADO, pos)
+        elif not en_region:
+            self._cambiar(id_taxi, FUERA_DE_REGION, pos)
+        elif fin >= ahora:
+            if self.fin_espera.get(id_taxi) != fin:
+                heapq.heappush(self.eventos, (fin, _ESPERA, id_taxi))
+            self._cambiar(id_taxi, EN_ESPERA, pos)
+            self.fin_espera[id_taxi] = fin
+        else:
+            self._cambiar(id_taxi, LIBRE, pos)
+
+    def reservar(self, id_taxi):
+        # Asignado un servicio: deja de ser elegible hasta que vuelva a
+        # publicar que está libre, y entonces esperará hasta fin de la espera
+        if self.estados.get(id_taxi) != RETIRADO:
+            self._cambiar(id_taxi, OCUPADO)
+
+    def quitar(self, id_taxi):
+        self.estados.pop(id_taxi, None)
+        self.fin_espera.pop(id_taxi, None)
+        self.ultima_senal.pop(id_taxi, None)
+        self.indice.eliminar(id_taxi)
+
+    def vencer(self, ahora):
+        # Aplica los cambios programados hasta `ahora`; devuelve cuántos se aplicaron
+        aplicados = 0
+        while self.eventos and self.eventos[0][0] < ahora:
+            instante, tipo, id_taxi = heapq.heappop(self.eventos)
+            if tipo == _ESPERA:
+                if self.fin_espera.get(id_taxi) == instante and self.estados.get(id_taxi) == EN_ESPERA:
+                    self._cambiar(id_taxi, LIBRE)
+                    aplicados += 1
+                continue
+
+            senal = self.ultima_senal.get(id_taxi)
+            if senal is None:
+                continue  # Retirado o eliminado
+            if senal + self.ttl > instante:
+                # Publicó después de programarse: se vuelve a programar con su última señal
+                heapq.heappush(self.eventos, (senal + self.ttl, _CADUCIDAD, id_taxi))
+            elif self.estados.get(id_taxi) != CADUCADO:
+                self._cambiar(id_taxi, CADUCADO)
+                aplicados += 1
+                # Vuelve a programarse cuando publique de nuevo
+                del self.ultima_senal[id_taxi]
+        return aplicados
@@ -0,0 +1,71 @@
+# enrutamiento.py
+# Tabla de enrutamiento del broker en modo clúster: el tráfico se reparte
+# entre varios reenviadores (procesos XSUB/XPUB independientes, ver
+# broker.py --forwarders) según el id del taxi.
+#
+# Todo lo de un taxi (registro, posiciones y asignaciones) pasa por el mismo
+# reenviador, id % número de reenviadores, así que el orden de sus mensajes
+# se conserva. Cada publicador envía cada mensaje solo al reenviador que le
+# corresponde; quien necesita los mensajes de toda la flota (el servidor, la
+# flota simulada) conecta su SUB a todos. Las suscripciones siguen el camino
+# XPUB -> XSUB de cada reenviador hasta los publicadores conectados a él.
+#
+# El reenviador 0 usa los puertos de siempre (5559/5560); el i-ésimo usa
+# puerto_base + 2i y puerto_base + 2i + 1. El número de reenviadores se
+# configura con la variable de entorno BROKER_FORWARDERS (1 por defecto) en
+# todos los componentes.
+import os
+
+
+class Enrutamiento:
+    def __init__(self, ip, puerto_frontend, puerto_backend, puerto_base, num_forwarders=1):
+        if num_forwarders < 1:
+            raise ValueError("Se necesita al menos un reenviador")
+        self.ip = ip
+        self.puertos = [(puerto_frontend, puerto_backend)]
+        self.puertos += [(puerto_base + 2 * i, puerto_base + 2 * i + 1) for i in range(1, num_forwarders)]
+
+    def __len__(self):
+        return len(self.puertos)
+
+    def forwarder_de(self, id_taxi):
+        return id_taxi % len(self.puertos)
+
+    def forwarder_de_mensaje(self, mensaje):
+        # Mensajes de un taxi (registro, actualización, asignación) por su id;
+        # el resto (latidos) por el reenviador 0
+        id_taxi = mensaje.get('taxi_id', mensaje.get('id'))
+        if mensaje.get('tipo') == 'lote' and mensaje['mensajes']:
+            # Un lote solo debe agrupar taxis del mismo reenviador (ver repartir)
+            return self.forwarder_de_mensaje(mensaje['mensajes'][0])
+        return 0 if id_taxi is None else self.forwarder_de(id_taxi)
+
+    def repartir(self, mensajes):
+        # {reenviador: [mensajes]} conservando el orden dentro de cada uno
+        if len(self.puertos) == 1:
+            return {0: mensajes} if mensajes else {}
+        por_forwarder = {}
+        for mensaje in mensajes:
+            por_forwarder.setdefault(self.forwarder_de_mensaje(mensaje), []).append(mensaje)
+        return por_forwarder
+
+    def frontend(self, forwarder):
+        return f"tcp://{self.ip}:{self.puertos[forwarder][0]}"
+
+    def backend(self, forwarder):
+        return f"tcp://{self.ip}:{self.puertos[forwarder][1]}"
+
+    def frontends(self):
+        return [self.frontend(i) for i in range(len(self))]
+
+    def backends(self):
+        return [self.backend(i) for i in range(len(self))]
+
+
+def num_forwarders():
+    return int(os.environ.get('BROKER_FORWARDERS', '1'))
+
+
+def desde_entorno(ip, puerto_frontend, puerto_backend, puerto_base):
+    # Tabla con los BROKER_FORWARDERS reenviadores configurados
+    return Enrutamiento(ip, puerto_frontend, puerto_backend, puerto_base, num_forwarders())
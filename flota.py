@@ -0,0 +1,311 @@
+# flota.py
+# Simulador de flota: un único proceso asyncio aloja miles de taxis que
+# comparten un socket PUB y uno SUB, en lugar de un proceso con su propio
+# contexto ZMQ por taxi. El estado de todos los taxis vive en arrays de
+# NumPy; el movimiento se calcula para la flota entera en cada paso con la
+# misma regla que Taxi.mover, y las actualizaciones salen agrupadas en
+# mensajes 'lote' (ver protocolo.py).
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+import zmq
+import zmq.asyncio
+
+import enrutamiento
+import particion
+import protocolo
+from bitacora import Bitacora
+
+# Direcciones IP de los componentes
+BROKER_IP = "127.0.0.1"       # IP del broker
+SERVIDOR_IP = "127.0.0.1"    # IP del servidor central
+TAXI_IP = "127.0.0.1"      # IP base para taxis
+USUARIO_IP = "127.0.0.1"     # IP base para usuarios
+
+# Puertos del sistema
+BROKER_FRONTEND_PORT = 5559       # Para publicadores (taxis y servidor)
+BROKER_BACKEND_PORT = 5560        # Para suscriptores (taxis y servidor)
+USUARIO_SERVER_PORT = 5555        # Para comunicación usuario-servidor
+USUARIO_REPLICA_PORT = 5556       # Para comunicación usuario-réplica del servidor
+SHARD_BASE_PORT = 5600            # Para comunicación frente-shards (5600 + región)
+METRICAS_BASE_PORT = 5700         # Para consultar métricas (5700 broker, 5701 servidor, 5702 réplica, 5710 + región shards)
+BROKER_FORWARDERS_BASE_PORT = 5800 # Reenviadores del broker en modo clúster (5800 + 2i, 5801 + 2i); ver enrutamiento.py
+CONSULTAS_BASE_PORT = 5900         # Para consultas de la flota (5901 servidor, 5902 réplica, 5910 + región shards); ver consultas.py
+
+# Configuraciones completas
+BROKER_FRONTEND_URL = f"tcp://*:{BROKER_FRONTEND_PORT}"
+BROKER_BACKEND_URL = f"tcp://*:{BROKER_BACKEND_PORT}"
+BROKER_FRONTEND_CONNECT = f"tcp://{BROKER_IP}:{BROKER_FRONTEND_PORT}"
+BROKER_BACKEND_CONNECT = f"tcp://{BROKER_IP}:{BROKER_BACKEND_PORT}"
+USUARIO_SERVER_URL = f"tcp://{SERVIDOR_IP}:{USUARIO_SERVER_PORT}"
+USUARIO_REPLICA_URL = f"tcp://{SERVIDOR_IP}:{USUARIO_REPLICA_PORT}"
+
+# Tiempos de la simulación; ESCALA_TIEMPO > 1 los acorta para pruebas de carga
+ESCALA_TIEMPO = float(os.environ.get('ESCALA_TIEMPO', '1'))
+DURACION_SERVICIO = 30 / ESCALA_TIEMPO       # Segundos que dura un servicio
+INTERVALO_MOVIMIENTO = 30 / ESCALA_TIEMPO    # Segundos (30 minutos simulados) entre movimientos
+
+INTERVALO_CICLO = 0.05        # Segundos entre pasos de la simulación
+TAMANO_LOTE = 1000            # Actualizaciones por mensaje publicado
+INTERVALO_ESTADISTICAS = 10   # Segundos entre resúmenes del estado de la flota
+LIMITE_COLA_MENSAJES = 10000  # SNDHWM/RCVHWM de los sockets con el broker
+
+
+log = Bitacora('Flota')
+
+
+class Flota:
+    def __init__(self, N, M, posiciones, velocidades, id_inicial=0, semilla=None):
+        self.N = N
+        self.M = M
+        self.id_inicial = id_inicial
+        self.posiciones = np.array(posiciones, dtype=np.int64).reshape(-1, 2)
+        self.pos_inicial = self.posiciones.copy()
+        self.velocidades = np.asarray(velocidades, dtype=np.int64)
+        # Celdas recorridas por movimiento: km/h durante 30 minutos, cada celda es 1 km
+        self.celdas = (self.velocidades * 0.5).astype(np.int64)
+        self.ids = np.arange(id_inicial, id_inicial + len(self.posiciones))
+
+        n = len(self.ids)
+        self.ocupado = np.zeros(n, dtype=bool)
+        self.servicios = np.zeros(n, dtype=np.int64)
+        self.fin_servicio = np.full(n, np.inf)
+        self.proximo_movimiento = np.full(n, np.inf)
+        self.por_publicar = np.zeros(n, dtype=bool)  # Taxis con cambios aún no publicados
+        self.asignaciones_atendidas = set()  # El servidor reenvía cada asignación hasta que se confirma
+        self.rng = np.random.default_rng(semilla)
+        self.particion = particion.desde_entorno(N, M)  # None si la ciudad no está dividida en regiones
+        self.region_publicada = np.full(n, -1)
+
+        self.actualizaciones_enviadas = 0
+        self.mensajes_enviados = 0
+        self.asignaciones_recibidas = 0
+        self.retraso_maximo = 0.0  # Mayor retraso de un paso respecto a su instante previsto
+
+        self.context = zmq.asyncio.Context()
+        self.enrutamiento = enrutamiento.desde_entorno(BROKER_IP, BROKER_FRONTEND_PORT, BROKER_BACKEND_PORT,
+                                                       BROKER_FORWARDERS_BASE_PORT)
+
+        # Un único socket para publicar las posiciones de toda la flota; con el
+        # broker en modo clúster, uno por reenviador, y cada lote va al de sus taxis
+        self.sockets_pub = []
+        for url in self.enrutamiento.frontends():
+            socket_pub = self.context.socket(zmq.PUB)
+            socket_pub.setsockopt(zmq.SNDHWM, LIMITE_COLA_MENSAJES)
+            socket_pub.connect(url) # 5559
+            self.sockets_pub.append(socket_pub)
+
+        # Se reciben todas las asignaciones y se descartan las de taxis ajenos
+        self.socket_sub = self.context.socket(zmq.SUB)
+        self.socket_sub.setsockopt(zmq.RCVHWM, LIMITE_COLA_MENSAJES)
+        for url in self.enrutamiento.backends():
+            self.socket_sub.connect(url) # 5560
+        self.socket_sub.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_ASIGNACION)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def activos(self):
+        # Un taxi deja de simularse al terminar su tercer servicio, como en Taxi.iniciar
+        return (self.servicios < 3) | self.ocupado
+
+    def mover(self, ahora):
+        indices = np.flatnonzero(~self.ocupado & (self.servicios < 3) & (self.velocidades > 0) &
+                                 (self.proximo_movimiento <= ahora))
+        if not len(indices):
+            return
+
+        # Dirección aleatoria (horizontal o vertical, en cualquier sentido) para cada taxi
+        eje = self.rng.integers(0, 2, len(indices))
+        signo = self.rng.choice((-1, 1), len(indices))
+        destino = self.posiciones[indices, eje] + signo * self.celdas[indices]
+        self.posiciones[indices, eje] = np.clip(destino, 0, np.where(eje == 0, self.N, self.M))
+
+        # Cada taxi publica su posición tras cada intervalo, se haya movido o no
+        self.proximo_movimiento[indices] = ahora + INTERVALO_MOVIMIENTO
+        self.por_publicar[indices] = True
+
+    def finalizar_servicios(self, ahora):
+        indices = np.flatnonzero(self.ocupado & (self.fin_servicio <= ahora))
+        if not len(indices):
+            return
+
+        # Volver a posición inicial
+        self.posiciones[indices] = self.pos_inicial[indices]
+        self.ocupado[indices] = False
+        self.fin_servicio[indices] = np.inf
+        self.proximo_movimiento[indices] = ahora + INTERVALO_MOVIMIENTO
+        self.por_publicar[indices] = True
+
+    def atender_asignacion(self, mensaje, ahora):
+        if mensaje.get('tipo') != 'servicio_asignado':
+            return
+        i = mensaje['taxi_id'] - self.id_inicial
+        if not 0 <= i < len(self.ids):
+            return  # Asignación para un taxi de otra flota
+
+        if mensaje.get('id_asignacion') in self.asignaciones_atendidas:
+            # Reenvío de una asignación ya atendida: solo se vuelve a confirmar
+            self.por_publicar[i] = True
+            return
+
+        if self.ocupado[i] or self.servicios[i] >= 3:
+            log.info('asignacion_ignorada', "Asignación del Taxi %d para Usuario %s ignorada, taxi no disponible",
+                     mensaje['taxi_id'], mensaje['id_usuario'])
+            return
+        self.asignaciones_atendidas.add(mensaje.get('id_asignacion'))
+
+        self.ocupado[i] = True
+        self.servicios[i] += 1
+        self.fin_servicio[i] = ahora + DURACION_SERVICIO
+        self.por_publicar[i] = True  # Publicar que está ocupado sirve de confirmación
+        self.asignaciones_recibidas += 1
+        log.info('asignacion', "Taxi %d asignado al Usuario %s en posición %s, servicio #%d", mensaje['taxi_id'],
+                 mensaje['id_usuario'], mensaje['pos_usuario'], self.servicios[i],
+                 taxi_id=mensaje['taxi_id'], id_usuario=mensaje['id_usuario'])
+
+    def mensajes_registro(self):
+        return [{'tipo': 'registro', 'id': id_taxi, 'posicion': tuple(pos), 'velocidad': velocidad}
+                for id_taxi, pos, velocidad in zip(self.ids.tolist(), self.posiciones.tolist(),
+                                                   self.velocidades.tolist())]
+
+    def mensajes_actualizacion(self, indices, ahora):
+        return [{'tipo': 'actualizacion', 'id': id_taxi, 'posicion': tuple(pos), 'ocupado': ocupado,
+                 'servicios': servicios, 'timestamp': ahora}
+                for id_taxi, pos, ocupado, servicios in zip(self.ids[indices].tolist(),
+                                                            self.posiciones[indices].tolist(),
+                                                            self.ocupado[indices].tolist(),
+                                                            self.servicios[indices].tolist())]
+
+    async def enviar_en_lotes(self, mensajes, region=None):
+        for forwarder, mensajes_forwarder in self.enrutamiento.repartir(mensajes).items():
+            socket_pub = self.sockets_pub[forwarder]
+            for inicio in range(0, len(mensajes_forwarder), TAMANO_LOTE):
+                lote = {'tipo': 'lote', 'mensajes': mensajes_forwarder[inicio:inicio + TAMANO_LOTE]}
+                await socket_pub.send_multipart(protocolo.empaquetar(lote, region=region))
+                self.mensajes_enviados += 1
+
+    async def enviar_por_region(self, indices, mensajes):
+        # mensajes[i] corresponde al taxi indices[i]
+        if self.particion is None:
+            await self.enviar_en_lotes(mensajes)
+            return
+        # Cada lote va al tópico de una región; un taxi que acaba de cambiar
+        # de región se envía también a la anterior para que su shard lo suelte
+        regiones = self.particion.region_de((self.posiciones[indices, 0], self.posiciones[indices, 1]))
+        anteriores = self.region_publicada[indices]
+        self.region_publicada[indices] = regiones
+        for region in np.union1d(regiones, anteriores[anteriores >= 0]).tolist():
+            seleccion = np.flatnonzero((regiones == region) | (anteriores == region))
+            await self.enviar_en_lotes([mensajes[i] for i in seleccion.tolist()], region)
+
+    async def publicar_pendientes(self, ahora):
+        indices = np.flatnonzero(self.por_publicar)
+        if not len(indices):
+            return
+        self.por_publicar[indices] = False
+        await self.enviar_por_region(indices, self.mensajes_actualizacion(indices, ahora))
+        self.actualizaciones_enviadas += len(indices)
+
+    async def recibir_asignaciones(self):
+        while True:
+            partes = await self.socket_sub.recv_multipart()
+            try:
+                self.atender_asignacion(protocolo.decodificar(partes[-1]), time.time())
+            except Exception as e:
+                log.error('asignacion', "Error procesando asignación: %s", e)
+                continue
+
+            # La confirmación sale en cuanto no quedan asignaciones en cola,
+            # sin esperar al siguiente paso de la simulación
+            if not self.socket_sub.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                await self.publicar_pendientes(time.time())
+
+    def mostrar_estadisticas(self, transcurrido):
+        activos = self.activos()
+        log.info('estadisticas', "%d libres, %d ocupados, %d retirados | %.0f actualizaciones/s en %.0f "
+                 "mensajes/s | retraso máximo del ciclo %.1f ms", int((activos & ~self.ocupado).sum()),
+                 int(self.ocupado.sum()), int((~activos).sum()), self.actualizaciones_enviadas / transcurrido,
+                 self.mensajes_enviados / transcurrido, self.retraso_maximo * 1000)
+        self.actualizaciones_enviadas = 0
+        self.mensajes_enviados = 0
+        self.retraso_maximo = 0.0
+
+    async def simular(self):
+        previsto = time.time()
+        inicio_intervalo = previsto
+        while self.activos().any():
+            ahora = time.time()
+            self.retraso_maximo = max(self.retraso_maximo, ahora - previsto)
+
+            self.finalizar_servicios(ahora)
+            self.mover(ahora)
+            await self.publicar_pendientes(ahora)
+
+            if ahora - inicio_intervalo >= INTERVALO_ESTADISTICAS:
+                self.mostrar_estadisticas(ahora - inicio_intervalo)
+                inicio_intervalo = ahora
+
+            previsto = max(previsto + INTERVALO_CICLO, time.time())
+            await asyncio.sleep(previsto - time.time())
+
+        log.info('fin', "Todos los taxis completaron sus servicios del día")
+
+    async def iniciar(self):
+        # Dar tiempo a que las conexiones con el broker se establezcan
+        await asyncio.sleep(1)
+
+        await self.enviar_por_region(np.arange(len(self)), self.mensajes_registro())
+        log.info('registro', "Registrados %d taxis (ids %d a %d)", len(self), self.id_inicial,
+                 self.id_inicial + len(self) - 1)
+
+        # Como Taxi.iniciar, cada taxi publica su posición al arrancar; los
+        # movimientos se reparten a lo largo del primer intervalo
+        self.proximo_movimiento[:] = time.time() + self.rng.random(len(self)) * INTERVALO_MOVIMIENTO
+        self.por_publicar[:] = True
+
+        receptor = asyncio.create_task(self.recibir_asignaciones())
+        try:
+            await self.simular()
+        finally:
+            receptor.cancel()
+            for socket_pub in self.sockets_pub:
+                socket_pub.close()
+            self.socket_sub.close()
+            self.context.term()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador de una flota de taxis en un solo proceso")
+    parser.add_argument('num_taxis', type=int)
+    parser.add_argument('N', type=int)
+    parser.add_argument('M', type=int)
+    parser.add_argument('--id-inicial', type=int, default=0,
+                        help="Id del primer taxi; permite repartir la flota entre varios procesos")
+    parser.add_argument('--velocidades', default='0,1,2,4',
+                        help="Velocidades posibles, asignadas al azar a cada taxi")
+    parser.add_argument('--semilla', type=int, default=None,
+                        help="Semilla para reproducir posiciones, velocidades y movimientos")
+    args = parser.parse_args()
+
+    velocidades = [int(v) for v in args.velocidades.split(',')]
+    if any(v not in [0, 1, 2, 4] for v in velocidades):
+        print("Velocidad no válida")
+        return
+
+    rng = np.random.default_rng(args.semilla)
+    posiciones = np.column_stack((rng.integers(0, args.N + 1, args.num_taxis),
+                                  rng.integers(0, args.M + 1, args.num_taxis)))
+    flota = Flota(args.N, args.M, posiciones, rng.choice(velocidades, args.num_taxis),
+                  id_inicial=args.id_inicial, semilla=None if args.semilla is None else args.semilla + 1)
+    try:
+        asyncio.run(flota.iniciar())
+    except KeyboardInterrupt:
+        log.info('fin', "Cerrando flota...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+# frente_shards.py
+# Frente del servidor central dividido en shards geográficos: recibe las
+# solicitudes de los usuarios en el puerto habitual (5555) y las reparte
+# entre los shards de cada región (servidor_central.py --region R).
+#
+# El taxi más cercano puede estar en una región vecina cuando el usuario
+# está cerca de un borde. Las regiones se consultan de la más cercana a la
+# más lejana según la menor distancia posible desde el usuario:
+#   - mientras no hay candidato, el shard asigna directamente si su taxi
+#     está más cerca que cualquier región pendiente (el caso habitual, una
+#     sola consulta);
+#   - si no, cada shard propone su mejor taxi sin reservarlo, hasta que la
+#     región siguiente ya no puede mejorar la mejor propuesta, y se confirma
+#     la propuesta ganadora en su shard.
+# Como mucho se consultan max_regiones regiones por solicitud.
+import argparse
+import json
+import threading
+import time
+
+import zmq
+
+import particion as particiones
+from bitacora import Bitacora
+
+# Direcciones IP de los componentes
+BROKER_IP = "127.0.0.1"       # IP del broker
+SERVIDOR_IP = "127.0.0.1"    # IP del servidor central
+TAXI_IP = "127.0.0.1"      # IP base para taxis
+USUARIO_IP = "127.0.0.1"     # IP base para usuarios
+
+# Puertos del sistema
+BROKER_FRONTEND_PORT = 5559       # Para publicadores (taxis y servidor)
+BROKER_BACKEND_PORT = 5560        # Para suscriptores (taxis y servidor)
+USUARIO_SERVER_PORT = 5555        # Para comunicación usuario-servidor
+USUARIO_REPLICA_PORT = 5556       # Para comunicación usuario-réplica del servidor
+SHARD_BASE_PORT = 5600            # Para comunicación frente-shards (5600 + región)
+METRICAS_BASE_PORT = 5700         # Para consultar métricas (5700 broker, 5701 servidor, 5702 réplica, 5710 + región shards)
+BROKER_FORWARDERS_BASE_PORT = 5800 # Reenviadores del broker en modo clúster (5800 + 2i, 5801 + 2i); ver enrutamiento.py
+CONSULTAS_BASE_PORT = 5900         # Para consultas de la flota (5901 servidor, 5902 réplica, 5910 + región shards); ver consultas.py
+
+# Configuraciones completas
+BROKER_FRONTEND_URL = f"tcp://*:{BROKER_FRONTEND_PORT}"
+BROKER_BACKEND_URL = f"tcp://*:{BROKER_BACKEND_PORT}"
+BROKER_FRONTEND_CONNECT = f"tcp://{BROKER_IP}:{BROKER_FRONTEND_PORT}"
+BROKER_BACKEND_CONNECT = f"tcp://{BROKER_IP}:{BROKER_BACKEND_PORT}"
+USUARIO_SERVER_URL = f"tcp://{SERVIDOR_IP}:{USUARIO_SERVER_PORT}"
+USUARIO_REPLICA_URL = f"tcp://{SERVIDOR_IP}:{USUARIO_REPLICA_PORT}"
+
+TRABAJADORES_URL = "inproc://trabajadores_frente"
+
+TIMEOUT_SHARD = 1.0       # Segundos de espera a un shard antes de darlo por caído
+MAX_CONFIRMACIONES = 3    # Intentos si otro usuario se lleva el candidato antes de confirmarlo
+LIMITE_COLA_MENSAJES = 10000  # SNDHWM/RCVHWM de cada socket
+TIMEOUT_SOLICITUD = 5.0   # Presupuesto de una solicitud que no lo indica (ver servidor_central.py)
+
+
+log = Bitacora('Frente')
+
+
+def resolver_solicitud(particion, pos_usuario, id_usuario, consultar, max_regiones=None):
+    # consultar(region, solicitud) devuelve la respuesta del shard, o None si no responde
+    orden = particion.regiones_por_cercania(pos_usuario)[:max_regiones]
+    base = {'tipo': 'solicitud', 'id_usuario': id_usuario, 'posicion': pos_usuario}
+
+    for _ in range(MAX_CONFIRMACIONES):
+        mejor = None  # (distancia, id_taxi, region)
+        for i, (cota, region) in enumerate(orden):
+            if mejor is not None and cota > mejor[0]:
+                break  # Ninguna región restante puede tener un taxi más cercano
+
+            if mejor is None:
+                # None: es la última región que se consulta y puede asignar sin condiciones
+                distancia_maxima = orden[i + 1][0] if i + 1 < len(orden) else None
+            else:
+                distancia_maxima = 0  # Solo proponer
+            respuesta = consultar(region, dict(base, distancia_maxima=distancia_maxima))
+            if respuesta is None:
+                continue
+            if respuesta.get('exito'):
+                return respuesta
+
+            candidato = respuesta.get('candidato')
+            if candidato is not None and (mejor is None or (candidato[1], candidato[0]) < mejor[:2]):
+                mejor = (candidato[1], candidato[0], region)
+
+        if mejor is None:
+            return {'exito': False}
+        respuesta = consultar(mejor[2], dict(base, taxi_id=mejor[1]))
+        if respuesta is not None and respuesta.get('exito'):
+            return respuesta
+        # Otro usuario se llevó el candidato mientras tanto: se repite la búsqueda
+
+    return {'exito': False}
+
+
+def resolver_lote(particion, solicitudes, consultar, max_regiones=None):
+    # 'solicitud_lote': cada usuario se resuelve en orden como una solicitud
+    # normal; los shards no comparten lock, así que el lote no es atómico
+    resultados = []
+    for id_usuario, posicion in solicitudes:
+        resultado = resolver_solicitud(particion, tuple(posicion), id_usuario, consultar, max_regiones)
+        resultado.pop('candidato', None)
+        resultado.pop('tiempo_respuesta', None)
+        resultado['id_usuario'] = id_usuario
+        resultados.append(resultado)
+    return {'exito': any(resultado['exito'] for resultado in resultados), 'resultados': resultados}
+
+
+class FrenteShards:
+    def __init__(self, particion, num_trabajadores=4, max_regiones=None):
+        self.particion = particion
+        self.num_trabajadores = num_trabajadores
+        self.max_regiones = max_regiones
+        self.context = zmq.Context()
+
+        # Mismo esquema que el servidor central: el ROUTER reparte las
+        # solicitudes entre los hilos trabajadores a través del DEALER
+        self.socket_frontend = self.context.socket(zmq.ROUTER)
+        self.socket_frontend.setsockopt(zmq.RCVHWM, LIMITE_COLA_MENSAJES)
+        self.socket_frontend.setsockopt(zmq.SNDHWM, LIMITE_COLA_MENSAJES)
+        self.socket_frontend.bind(f"tcp://*:{USUARIO_SERVER_PORT}") # 5555
+        self.socket_backend = self.context.socket(zmq.DEALER)
+        self.socket_backend.setsockopt(zmq.SNDHWM, LIMITE_COLA_MENSAJES)
+        self.socket_backend.setsockopt(zmq.RCVHWM, LIMITE_COLA_MENSAJES)
+        self.socket_backend.bind(TRABAJADORES_URL)
+
+    def conectar_shard(self, region):
+        socket = self.context.socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.setsockopt(zmq.SNDHWM, LIMITE_COLA_MENSAJES)
+        socket.setsockopt(zmq.RCVHWM, LIMITE_COLA_MENSAJES)
+        socket.connect(f"tcp://{SERVIDOR_IP}:{SHARD_BASE_PORT + region}")
+        return socket
+
+    def consultar(self, sockets, region, solicitud):
+        # Cada trabajador tiene su propio socket REQ hacia cada shard
+        socket = sockets.get(region)
+        if socket is None:
+            socket = sockets[region] = self.conectar_shard(region)
+        socket.send_json(solicitud)
+        if not socket.poll(TIMEOUT_SHARD * 1000):
+            # Un REQ sin respuesta no puede volver a enviar: se recrea
+            log.warning('shard_caido', "El shard de la región %d no responde", region)
+            socket.close()
+            del sockets[region]
+            return None
+        return socket.recv_json()
+
+    def procesar_solicitudes(self):
+        socket_rep = self.context.socket(zmq.REP)
+        socket_rep.connect(TRABAJADORES_URL)
+        sockets = {}
+
+        while True:
+            mensaje = {}
+            try:
+                mensaje = socket_rep.recv_json()
+                tiempo_inicio = time.time()
+                if not isinstance(mensaje, dict):
+                    raise ValueError("La solicitud debe ser un objeto JSON")
+                if mensaje.get('presupuesto', TIMEOUT_SOLICITUD) <= 0:
+                    # Como en el servidor central: no se consulta a los shards por quien ya no espera
+                    socket_rep.send_json({'exito': False, 'vencida': True,
+                                          'id_solicitud': mensaje.get('id_solicitud')})
+                    continue
+                consultar = lambda region, solicitud: self.consultar(sockets, region, solicitud)
+                if mensaje.get('tipo') == 'solicitud_lote':
+                    respuesta = resolver_lote(self.particion, mensaje['solicitudes'], consultar, self.max_regiones)
+                    respuesta['tiempo_respuesta'] = time.time() - tiempo_inicio
+                    if 'id_solicitud' in mensaje:
+                        respuesta['id_solicitud'] = mensaje['id_solicitud']
+                    log.info('asignacion', "Lote de %d solicitudes: %d asignadas", len(respuesta['resultados']),
+                             sum(resultado['exito'] for resultado in respuesta['resultados']))
+                    socket_rep.send_json(respuesta)
+                    continue
+                pos_usuario = tuple(mensaje['posicion'])
+                id_usuario = mensaje['id_usuario']
+
+                respuesta = resolver_solicitud(self.particion, pos_usuario, id_usuario, consultar,
+                                               self.max_regiones)
+                respuesta['tiempo_respuesta'] = time.time() - tiempo_inicio
+                respuesta.pop('candidato', None)
+                if 'id_solicitud' in mensaje:
+                    respuesta['id_solicitud'] = mensaje['id_solicitud']
+
+                if respuesta['exito']:
+                    log.info('asignacion', "Usuario %s en %s -> Taxi %d en %s", id_usuario, pos_usuario,
+                             respuesta['taxi_id'], respuesta['pos_taxi'], id_usuario=id_usuario,
+                             taxi_id=respuesta['taxi_id'])
+                else:
+                    log.info('sin_taxi', "No hay taxis disponibles para Usuario %s", id_usuario)
+                socket_rep.send_json(respuesta)
+
+            except zmq.ContextTerminated:
+                for socket in [socket_rep, *sockets.values()]:
+                    socket.close()
+                return
+            except Exception as e:
+                if socket_rep.closed:
+                    return  # Contexto cerrado
+                log.error('solicitud', "Error procesando solicitud en el frente: %s", e)
+                try:
+                    socket_rep.send_json({'exito': False, 'error': str(e),
+                                          'id_solicitud': mensaje.get('id_solicitud')
+                                          if isinstance(mensaje, dict) else None})
+                except Exception as e:
+                    log.error('solicitud', "Error enviando la respuesta de error: %s", e)
+
+    def enrutar_solicitudes(self):
+        try:
+            zmq.proxy(self.socket_frontend, self.socket_backend)
+        except zmq.ContextTerminated:
+            pass
+
+    def iniciar(self):
+        hilos = [threading.Thread(target=self.enrutar_solicitudes)]
+        hilos += [threading.Thread(target=self.procesar_solicitudes) for _ in range(self.num_trabajadores)]
+        for hilo in hilos:
+            hilo.daemon = True
+            hilo.start()
+
+        regiones = {region: self.particion.limites(region) for region in range(len(self.particion))}
+        log.info('inicio', "Frente de shards iniciado con %d regiones: %s", len(self.particion), json.dumps(regiones))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            log.info('fin', "Cerrando frente de shards...")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frente que reparte las solicitudes entre los shards por región")
+    parser.add_argument('--trabajadores', type=int, default=8,
+                        help="Hilos que atienden solicitudes de usuarios en paralelo")
+    parser.add_argument('--max-regiones', type=int, default=4,
+                        help="Máximo de regiones consultadas por solicitud")
+    args = parser.parse_args()
+
+    particion = particiones.desde_entorno(100, 100)  # Ejemplo con ciudad 100x100
+    if particion is None:
+        print("Defina REGIONES_CIUDAD (por ejemplo 2x2) con la misma partición que los shards")
+        return
+
+    frente = FrenteShards(particion, num_trabajadores=args.trabajadores, max_regiones=args.max_regiones)
+    frente.iniciar()
+
+
+if __name__ == "__main__":
+    main()
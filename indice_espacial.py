@@ -0,0 +1,175 @@
+# indice_espacial.py
+# Índice espacial incremental para buscar el taxi disponible más cercano
+# sobre la cuadrícula N×M sin recorrer toda la flota.
+#
+# La ciudad se divide en celdas cuadradas de lado `tamano_celda`. Cada celda
+# guarda solo los taxis elegibles que hay en ella, de modo que la búsqueda
+# revisa anillos de celdas alrededor del usuario y se detiene en cuanto
+# ninguna celda pendiente puede contener un taxi más cercano.
+import heapq
+
+
+class IndiceEspacial:
+    def __init__(self, N, M, tamano_celda=None):
+        self.N = N
+        self.M = M
+        if tamano_celda is None:
+            # Unas 32 celdas por lado son suficientes para ciudades pequeñas
+            # y mantienen las celdas poco pobladas en flotas grandes
+            tamano_celda = max(1, max(N, M) // 32)
+        self.tamano_celda = tamano_celda
+        self.celdas_x = N // tamano_celda + 1
+        self.celdas_y = M // tamano_celda + 1
+        self.celdas = {}        # {(cx, cy): set(id_taxi)} solo taxis elegibles
+        self.posiciones = {}    # {id_taxi: (x, y)} todos los taxis conocidos
+        self.elegibles = set()  # ids de taxis que pueden recibir un servicio
+
+    def _celda(self, pos):
+        # int(): el usuario puede estar en una posición con decimales
+        return int(pos[0] // self.tamano_celda), int(pos[1] // self.tamano_celda)
+
+    def __len__(self):
+        return len(self.posiciones)
+
+    def __contains__(self, id_taxi):
+        return id_taxi in self.posiciones
+
+    def _quitar_de_celda(self, id_taxi, pos):
+        celda = self._celda(pos)
+        ocupantes = self.celdas.get(celda)
+        if ocupantes is not None:
+            ocupantes.discard(id_taxi)
+            if not ocupantes:
+                del self.celdas[celda]
+
+    def _poner_en_celda(self, id_taxi, pos):
+        self.celdas.setdefault(self._celda(pos), set()).add(id_taxi)
+
+    def actualizar(self, id_taxi, pos, elegible):
+        anterior = self.posiciones.get(id_taxi)
+        era_elegible = id_taxi in self.elegibles
+
+        if era_elegible and (not elegible or self._celda(anterior) != self._celda(pos)):
+            self._quitar_de_celda(id_taxi, anterior)
+        if elegible and (not era_elegible or self._celda(anterior) != self._celda(pos)):
+            self._poner_en_celda(id_taxi, pos)
+
+        self.posiciones[id_taxi] = pos
+        if elegible:
+            self.elegibles.add(id_taxi)
+        else:
+            self.elegibles.discard(id_taxi)
+
+    def marcar_elegible(self, id_taxi, elegible):
+        pos = self.posiciones.get(id_taxi)
+        if pos is not None:
+            self.actualizar(id_taxi, pos, elegible)
+
+    def eliminar(self, id_taxi):
+        pos = self.posiciones.pop(id_taxi, None)
+        if pos is not None and id_taxi in self.elegibles:
+            self._quitar_de_celda(id_taxi, pos)
+        self.elegibles.discard(id_taxi)
+
+    def _distancia_minima_a_celda(self, pos, celda):
+        # Menor distancia Manhattan posible desde pos a cualquier punto de la celda
+        x0 = celda[0] * self.tamano_celda
+        y0 = celda[1] * self.tamano_celda
+        x1 = x0 + self.tamano_celda - 1
+        y1 = y0 + self.tamano_celda - 1
+        dx = x0 - pos[0] if pos[0] < x0 else (pos[0] - x1 if pos[0] > x1 else 0)
+        dy = y0 - pos[1] if pos[1] < y0 else (pos[1] - y1 if pos[1] > y1 else 0)
+        return dx + dy
+
+    def _celdas_del_anillo(self, centro, radio):
+        cx, cy = centro
+        if radio == 0:
+            yield centro
+            return
+        for x in range(cx - radio, cx + radio + 1):
+            if 0 <= x < self.celdas_x:
+                if cy - radio >= 0:
+                    yield x, cy - radio
+                if cy + radio < self.celdas_y:
+                    yield x, cy + radio
+        for y in range(cy - radio + 1, cy + radio):
+            if 0 <= y < self.celdas_y:
+                if cx - radio >= 0:
+                    yield cx - radio, y
+                if cx + radio < self.celdas_x:
+                    yield cx + radio, y
+
+    def mas_cercano(self, pos, filtro=None):
+        # Devuelve (id_taxi, distancia) del taxi elegible más cercano en
+        # distancia Manhattan; en empate gana el id menor. `filtro` permite
+        # descartar candidatos con una condición adicional.
+        if not self.elegibles:
+            return None, None
+
+        centro = self._celda(pos)
+        mejor_id = None
+        mejor_distancia = float('inf')
+        radio_maximo = max(centro[0], self.celdas_x - 1 - centro[0],
+                           centro[1], self.celdas_y - 1 - centro[1])
+
+        for radio in range(radio_maximo + 1):
+            # Toda celda del anillo r está a más de (r - 1) * tamano_celda del
+            # usuario (a + 1 con posiciones enteras); si ya no puede mejorar ni
+            # empatar, se termina
+            if mejor_id is not None and (radio - 1) * self.tamano_celda >= mejor_distancia:
+                break
+
+            for celda in self._celdas_del_anillo(centro, radio):
+                ocupantes = self.celdas.get(celda)
+                if not ocupantes:
+                    continue
+                if self._distancia_minima_a_celda(pos, celda) > mejor_distancia:
+                    continue
+                for id_taxi in ocupantes:
+                    tx, ty = self.posiciones[id_taxi]
+                    distancia = abs(tx - pos[0]) + abs(ty - pos[1])
+                    if distancia < mejor_distancia or (
+                            distancia == mejor_distancia and id_taxi < mejor_id):
+                        if filtro is not None and not filtro(id_taxi):
+                            continue
+                        mejor_distancia = distancia
+                        mejor_id = id_taxi
+
+        if mejor_id is None:
+            return None, None
+        return mejor_id, mejor_distancia
+
+    def k_mas_cercanos(self, pos, k, filtro=None):
+        # Devuelve una lista [(distancia, id_taxi)] con los k taxis elegibles
+        # más cercanos, ordenada por distancia y luego por id
+        if k <= 0 or not self.elegibles:
+            return []
+
+        centro = self._celda(pos)
+        peores = []  # Montículo de máximos con los k mejores: (-distancia, -id_taxi)
+        radio_maximo = max(centro[0], self.celdas_x - 1 - centro[0],
+                           centro[1], self.celdas_y - 1 - centro[1])
+
+        for radio in range(radio_maximo + 1):
+            if len(peores) == k and (radio - 1) * self.tamano_celda >= -peores[0][0]:
+                break
+
+            for celda in self._celdas_del_anillo(centro, radio):
+                ocupantes = self.celdas.get(celda)
+                if not ocupantes:
+                    continue
+                if len(peores) == k and self._distancia_minima_a_celda(pos, celda) > -peores[0][0]:
+                    continue
+                for id_taxi in ocupantes:
+                    tx, ty = self.posiciones[id_taxi]
+                    clave = (-(abs(tx - pos[0]) + abs(ty - pos[1])), -id_taxi)
+                    if len(peores) == k and clave <= peores[0]:
+                        continue
+                    if filtro is not None and not filtro(id_taxi):
+                        continue
+                    if len(peores) == k:
+                        heapq.heapreplace(peores, clave)
+                    else:
+                        heapq.heappush(peores, clave)
+
+        return sorted((-distancia, -id_taxi) for distancia, id_taxi in peores)
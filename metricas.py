@@ -0,0 +1,260 @@
+# metricas.py
+# Métricas de latencia y contadores de un componente (servidor central,
+# broker, taxis), consultables en caliente por un socket REP local.
+#
+# Los histogramas son logarítmicos: cada potencia de 2 se divide en
+# SUBCUBETAS cubetas, así que un percentil se conoce con un error relativo
+# menor de 1/SUBCUBETAS y registrar un valor cuesta un frexp y un incremento.
+# Los hilos registran sin lock: una carrera como mucho pierde una muestra.
+#
+# Órdenes del puerto de métricas (JSON):
+#   {'orden': 'metricas'}                 contadores, indicadores y percentiles
+#   {'orden': 'perfil', 'segundos': s}    pilas de todos los hilos muestreadas
+#                                         durante s segundos, sin reiniciar nada
+#
+# Consulta desde la terminal: python metricas.py PUERTO [--perfil SEGUNDOS] [--json]
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+import zmq
+
+import bitacora
+
+SUBCUBETAS = 16        # Cubetas por potencia de 2 (error relativo < 6,25 %)
+EXPONENTE_MIN = -20    # Valores por debajo de 2^-21 (~0,5 µs) van a la primera cubeta
+EXPONENTE_MAX = 12     # Valores por encima de 2^12 (4096) van a la última
+PERCENTILES = (50, 90, 99, 99.9)
+
+INTERVALO_PERFIL = 0.005   # Segundos entre muestras de las pilas
+MAX_SEGUNDOS_PERFIL = 60
+MAX_PILAS_PERFIL = 40      # Pilas distintas que se devuelven (las más frecuentes)
+LIMITE_COLA_CONSULTAS = 100  # SNDHWM/RCVHWM del puerto de métricas
+
+
+class Histograma:
+    __slots__ = ('unidad', 'cubetas', 'total', 'suma', 'maximo')
+
+    def __init__(self, unidad='s'):
+        self.unidad = unidad  # 's' para latencias (se muestran en ms); '' para tamaños
+        self.cubetas = [0] * ((EXPONENTE_MAX - EXPONENTE_MIN) * SUBCUBETAS)
+        self.total = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, valor):
+        mantisa, exponente = math.frexp(valor)  # valor = mantisa * 2^exponente, 0.5 <= mantisa < 1
+        if valor <= 0 or exponente <= EXPONENTE_MIN:
+            indice = 0
+        elif exponente > EXPONENTE_MAX:
+            indice = len(self.cubetas) - 1
+        else:
+            indice = (exponente - EXPONENTE_MIN - 1) * SUBCUBETAS + int((mantisa - 0.5) * 2 * SUBCUBETAS)
+        self.cubetas[indice] += 1
+        self.total += 1
+        self.suma += valor
+        if valor > self.maximo:
+            self.maximo = valor
+
+    @staticmethod
+    def limite_superior(indice):
+        exponente, sub = divmod(indice, SUBCUBETAS)
+        return math.ldexp(0.5 + (sub + 1) / (2 * SUBCUBETAS), exponente + EXPONENTE_MIN + 1)
+
+    def percentil(self, p):
+        # Límite superior de la cubeta donde cae el percentil p (nunca por encima del máximo)
+        if not self.total:
+            return 0.0
+        objetivo = max(1, math.ceil(self.total * p / 100))
+        acumulado = 0
+        for indice, cuenta in enumerate(self.cubetas):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                return min(self.limite_superior(indice), self.maximo)
+        return self.maximo
+
+    def resumen(self):
+        escala = 1000 if self.unidad == 's' else 1
+        datos = {'unidad': 'ms' if self.unidad == 's' else self.unidad, 'n': self.total,
+                 'media': self.suma / self.total * escala if self.total else 0.0, 'max': self.maximo * escala}
+        for p in PERCENTILES:
+            datos[f'p{p:g}'] = self.percentil(p) * escala
+        return datos
+
+
+class Metricas:
+    # Registro de métricas de un componente. Los histogramas del camino
+    # crítico se guardan en atributos al crear el componente para no
+    # buscarlos por nombre en cada solicitud:
+    #   self.h_busqueda = self.metricas.histograma('busqueda')
+    def __init__(self, componente):
+        self.componente = componente
+        self.inicio = time.time()
+        self.contadores = {}    # {nombre: n} o {nombre: {etiqueta: n}}
+        self.histogramas = {}   # {nombre: Histograma}
+        self.indicadores = {}   # {nombre: función sin argumentos evaluada en cada consulta}
+
+    def histograma(self, nombre, unidad='s'):
+        return self.histogramas.setdefault(nombre, Histograma(unidad))
+
+    def contar(self, nombre, n=1):
+        self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+    def contar_por(self, nombre, etiqueta, n=1):
+        # Contador desglosado, p. ej. contar_por('mensajes', 'registro')
+        por_etiqueta = self.contadores.get(nombre)
+        if por_etiqueta is None:
+            por_etiqueta = self.contadores.setdefault(nombre, {})
+        por_etiqueta[etiqueta] = por_etiqueta.get(etiqueta, 0) + n
+
+    def indicador(self, nombre, funcion):
+        self.indicadores[nombre] = funcion
+
+    def instantanea(self):
+        indicadores = {}
+        for nombre, funcion in list(self.indicadores.items()):
+            try:
+                indicadores[nombre] = funcion()
+            except Exception as e:
+                indicadores[nombre] = f"error: {e}"
+        indicadores['bitacora'] = bitacora.estado()
+        return {
+            'componente': self.componente,
+            'pid': os.getpid(),
+            'instante': time.time(),
+            'segundos_activo': time.time() - self.inicio,
+            'contadores': {nombre: dict(valor) if isinstance(valor, dict) else valor
+                           for nombre, valor in list(self.contadores.items())},
+            'indicadores': indicadores,
+            'histogramas': {nombre: h.resumen() for nombre, h in list(self.histogramas.items())},
+        }
+
+
+def muestrear_pilas(segundos, intervalo=INTERVALO_PERFIL):
+    # Perfil por muestreo de todos los hilos del proceso (cProfile solo ve el
+    # hilo que lo activa). Devuelve las pilas más frecuentes en formato
+    # "hilo;función (archivo:línea);..." y las funciones en lo alto de la pila
+    propio = threading.get_ident()
+    pilas = {}
+    muestras = 0
+    fin = time.monotonic() + min(segundos, MAX_SEGUNDOS_PERFIL)
+    while time.monotonic() < fin:
+        nombres = {hilo.ident: hilo.name for hilo in threading.enumerate()}
+        for ident, marco in sys._current_frames().items():
+            if ident == propio:
+                continue
+            pila = []
+            while marco is not None:
+                codigo = marco.f_code
+                pila.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{marco.f_lineno})")
+                marco = marco.f_back
+            pila.append(nombres.get(ident, str(ident)))
+            clave = ';'.join(reversed(pila))
+            pilas[clave] = pilas.get(clave, 0) + 1
+        muestras += 1
+        time.sleep(intervalo)
+
+    funciones = {}
+    for clave, cuenta in pilas.items():
+        funcion = clave.rsplit(';', 1)[-1]
+        funciones[funcion] = funciones.get(funcion, 0) + cuenta
+    mas_frecuentes = sorted(pilas.items(), key=lambda item: -item[1])[:MAX_PILAS_PERFIL]
+    return {'muestras': muestras, 'intervalo': intervalo,
+            'funciones': dict(sorted(funciones.items(), key=lambda item: -item[1])[:MAX_PILAS_PERFIL]),
+            'pilas': dict(mas_frecuentes)}
+
+
+class ServidorMetricas(threading.Thread):
+    # Atiende las consultas del puerto de métricas en un hilo propio, con su
+    # propio contexto ZMQ para no interferir con el cierre del componente
+    def __init__(self, metricas, puerto):
+        super().__init__(daemon=True, name='metricas')
+        self.metricas = metricas
+        self.puerto = puerto
+
+    def responder(self, peticion):
+        orden = peticion.get('orden', 'metricas')
+        if orden == 'metricas':
+            return self.metricas.instantanea()
+        if orden == 'perfil':
+            return muestrear_pilas(float(peticion.get('segundos', 5)))
+        return {'error': f"Orden desconocida: {orden}"}
+
+    def run(self):
+        socket = zmq.Context.instance().socket(zmq.REP)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.setsockopt(zmq.SNDHWM, LIMITE_COLA_CONSULTAS)
+        socket.setsockopt(zmq.RCVHWM, LIMITE_COLA_CONSULTAS)
+        socket.bind(f"tcp://127.0.0.1:{self.puerto}")
+        while True:
+            try:
+                peticion = socket.recv_json()
+            except zmq.ZMQError:
+                return
+            except ValueError as e:
+                peticion = {'orden': None, 'error': str(e)}
+            try:
+                respuesta = self.responder(peticion)
+            except Exception as e:
+                respuesta = {'error': str(e)}
+            socket.send_json(respuesta)
+
+
+def consultar(puerto, peticion, espera=5.0):
+    socket = zmq.Context.instance().socket(zmq.REQ)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.connect(f"tcp://127.0.0.1:{puerto}")
+    try:
+        socket.send_json(peticion)
+        if not socket.poll(espera * 1000):
+            return None
+        return socket.recv_json()
+    finally:
+        socket.close()
+
+
+def mostrar(datos):
+    print(f"{datos['componente']} (pid {datos['pid']}, {datos['segundos_activo']:.0f} s activo)")
+    for nombre, h in sorted(datos['histogramas'].items()):
+        if h['n']:
+            print(f"  {nombre:<28} n={h['n']:<9} media {h['media']:.3f}  p50 {h['p50']:.3f}  p90 {h['p90']:.3f}  "
+                  f"p99 {h['p99']:.3f}  p99.9 {h['p99.9']:.3f}  max {h['max']:.3f} {h['unidad']}")
+    for nombre, valor in sorted(datos['contadores'].items()):
+        print(f"  {nombre:<28} {valor}")
+    for nombre, valor in sorted(datos['indicadores'].items()):
+        print(f"  {nombre:<28} {valor}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta el puerto de métricas de un componente")
+    parser.add_argument('puerto', type=int)
+    parser.add_argument('--perfil', type=float, default=None, metavar='SEGUNDOS',
+                        help="Muestrear las pilas de todos los hilos durante SEGUNDOS")
+    parser.add_argument('--json', action='store_true', help="Mostrar la respuesta tal cual")
+    args = parser.parse_args()
+
+    if args.perfil is not None:
+        datos = consultar(args.puerto, {'orden': 'perfil', 'segundos': args.perfil}, espera=args.perfil + 5)
+    else:
+        datos = consultar(args.puerto, {'orden': 'metricas'})
+    if datos is None:
+        print(f"Sin respuesta en el puerto {args.puerto}")
+    elif args.json or 'error' in datos:
+        print(json.dumps(datos, indent=2, ensure_ascii=False))
+    elif args.perfil is not None:
+        print(f"{datos['muestras']} muestras cada {datos['intervalo'] * 1000:.0f} ms")
+        for funcion, cuenta in datos['funciones'].items():
+            print(f"  {cuenta:>7}  {funcion}")
+        print("Pilas más frecuentes (formato plegado de flamegraph):")
+        for pila, cuenta in datos['pilas'].items():
+            print(f"{pila} {cuenta}")
+    else:
+        mostrar(datos)
+
+
+if __name__ == "__main__":
+    main()
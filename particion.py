@@ -0,0 +1,76 @@
+# particion.py
+# División de la ciudad N×M en regiones rectangulares (filas × columnas)
+# para repartir la flota entre varios servidores centrales ("shards").
+#
+# Cada shard atiende una región y solo recibe por el broker los mensajes de
+# los taxis que están en ella (tópicos 'reg.<region>.' y 'pos.<region>.').
+# La partición se configura con la variable de entorno REGIONES_CIUDAD
+# ("2x2", "1x4", ...) en todos los componentes.
+import os
+
+import protocolo
+
+
+class Particion:
+    def __init__(self, N, M, filas, columnas):
+        self.N = N
+        self.M = M
+        self.filas = filas
+        self.columnas = columnas
+        # Las coordenadas van de 0 a N (y de 0 a M) ambas incluidas
+        self.ancho = -(-(N + 1) // columnas)
+        self.alto = -(-(M + 1) // filas)
+
+    @classmethod
+    def desde_texto(cls, N, M, texto):
+        filas, columnas = (int(parte) for parte in texto.lower().split('x'))
+        if filas < 1 or columnas < 1:
+            raise ValueError(f"Partición no válida: {texto}")
+        return cls(N, M, filas, columnas)
+
+    def __len__(self):
+        return self.filas * self.columnas
+
+    def region_de(self, pos):
+        # Funciona también con arrays de NumPy de coordenadas x e y
+        x, y = pos
+        columna = x // self.ancho
+        fila = y // self.alto
+        if isinstance(columna, int):
+            columna = min(columna, self.columnas - 1)
+            fila = min(fila, self.filas - 1)
+        else:
+            columna = columna.clip(max=self.columnas - 1)
+            fila = fila.clip(max=self.filas - 1)
+        return fila * self.columnas + columna
+
+    def limites(self, region):
+        # (x0, x1, y0, y1) inclusivos; la última fila y columna llegan hasta el borde
+        fila, columna = divmod(region, self.columnas)
+        x0 = columna * self.ancho
+        y0 = fila * self.alto
+        x1 = self.N if columna == self.columnas - 1 else x0 + self.ancho - 1
+        y1 = self.M if fila == self.filas - 1 else y0 + self.alto - 1
+        return x0, x1, y0, y1
+
+    def distancia_minima(self, pos, region):
+        # Menor distancia Manhattan posible desde pos a un punto de la región
+        x0, x1, y0, y1 = self.limites(region)
+        dx = x0 - pos[0] if pos[0] < x0 else (pos[0] - x1 if pos[0] > x1 else 0)
+        dy = y0 - pos[1] if pos[1] < y0 else (pos[1] - y1 if pos[1] > y1 else 0)
+        return dx + dy
+
+    def regiones_por_cercania(self, pos):
+        # [(cota, region)] de todas las regiones, de la más cercana a la más lejana
+        return sorted((self.distancia_minima(pos, region), region) for region in range(len(self)))
+
+    def topicos(self, region):
+        # Tópicos a los que se suscribe el shard de la región
+        return [protocolo.topico_region(protocolo.TOPICO_REGISTRO, region),
+                protocolo.topico_region(protocolo.TOPICO_POSICION, region)]
+
+
+def desde_entorno(N, M):
+    # Partición configurada en REGIONES_CIUDAD, o None si la ciudad no está dividida
+    texto = os.environ.get('REGIONES_CIUDAD')
+    return Particion.desde_texto(N, M, texto) if texto else None
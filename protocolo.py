@@ -0,0 +1,234 @@
+# protocolo.py
+# Formato de los mensajes que viajan por el broker.
+#
+# Por defecto los mensajes se codifican en registros binarios de disposición
+# fija (struct). Todos empiezan con dos bytes: versión del formato y tipo de
+# mensaje. JSON se mantiene como alternativa para depuración
+# (FORMATO_MENSAJES=json); como un mensaje JSON siempre empieza por '{',
+# decodificar() acepta ambos formatos sin configuración adicional.
+#
+# Cada mensaje viaja como [tópico, datos]. El tópico permite que el broker
+# reenvíe sin mirar los datos y que cada suscriptor reciba solo lo suyo:
+# los taxis se suscriben únicamente a sus propias asignaciones.
+#
+# Un 'lote' agrupa varios mensajes en uno solo (la flota simulada publica así
+# miles de actualizaciones por envío): cabecera con el número de mensajes y
+# cada mensaje codificado precedido de su longitud.
+#
+# Un mensaje cuyos campos no caben en su registro (un id que no es un
+# entero de 32 bits sin signo, como una cadena o un número negativo, o una
+# posición con decimales) viaja como JSON aunque el formato sea binario.
+import json
+import os
+import struct
+
+VERSION = 1
+FORMATO = os.environ.get('FORMATO_MENSAJES', 'binario')  # 'binario' o 'json'
+
+REGISTRO = 1
+ACTUALIZACION = 2
+SERVICIO_ASIGNADO = 3
+LOTE = 4
+
+TIPOS = {
+    'registro': REGISTRO,
+    'actualizacion': ACTUALIZACION,
+    'servicio_asignado': SERVICIO_ASIGNADO,
+    'lote': LOTE,
+}
+NOMBRES_TIPOS = {codigo: nombre for nombre, codigo in TIPOS.items()}
+
+# <versión, tipo, ...campos>
+ESTRUCTURAS = {
+    REGISTRO: struct.Struct('<BBIiiB'),             # id, x, y, velocidad
+    ACTUALIZACION: struct.Struct('<BBIiiBBd'),      # id, x, y, ocupado, servicios, timestamp
+    SERVICIO_ASIGNADO: struct.Struct('<BBIiiIQ'),   # taxi_id, x, y, id_usuario, id_asignacion
+}
+CABECERA_LOTE = struct.Struct('<BBH')   # número de mensajes
+LARGO_MENSAJE = struct.Struct('<H')     # longitud de cada mensaje del lote
+MAX_MENSAJES_LOTE = 0xFFFF
+
+_JSON_INICIO = ord('{')
+_MAX_UINT32 = 0xFFFFFFFF
+_MAX_UINT64 = 0xFFFFFFFFFFFFFFFF
+_MIN_INT32, _MAX_INT32 = -0x80000000, 0x7FFFFFFF
+
+TOPICO_REGISTRO = b'reg.'
+TOPICO_POSICION = b'pos.'
+TOPICO_ASIGNACION = b'assign.'
+TOPICO_LATIDO = b'hb.'
+
+
+def topico_asignacion(taxi_id):
+    # El punto final evita que la suscripción de 'assign.1.' reciba 'assign.12.'
+    return TOPICO_ASIGNACION + b'%d.' % taxi_id
+
+
+def topico_region(topico, region):
+    # 'pos.' -> 'pos.3.': con la ciudad dividida en regiones cada shard del
+    # servidor se suscribe solo a las suyas; quien se suscribe a 'pos.' las recibe todas
+    return topico + b'%d.' % region
+
+
+def topico_de(mensaje):
+    tipo = mensaje.get('tipo')
+    if tipo == 'registro':
+        return TOPICO_REGISTRO
+    if tipo == 'actualizacion':
+        return TOPICO_POSICION
+    if tipo == 'servicio_asignado':
+        return topico_asignacion(mensaje['taxi_id'])
+    if tipo == 'latido':
+        return TOPICO_LATIDO
+    if tipo == 'lote':
+        # Un lote viaja con el tópico de sus mensajes, que son todos del mismo tipo
+        return topico_de(mensaje['mensajes'][0]) if mensaje['mensajes'] else TOPICO_POSICION
+    return tipo.encode('utf-8') + b'.' if tipo else b''
+
+
+def _entero_entre(valor, minimo, maximo):
+    return isinstance(valor, int) and not isinstance(valor, bool) and minimo <= valor <= maximo
+
+
+def _posicion_binaria(pos):
+    x, y = pos
+    return _entero_entre(x, _MIN_INT32, _MAX_INT32) and _entero_entre(y, _MIN_INT32, _MAX_INT32)
+
+
+def asignacion_binaria(mensaje):
+    # True si los campos de la asignación caben en su registro binario
+    return (_entero_entre(mensaje['taxi_id'], 0, _MAX_UINT32) and _posicion_binaria(mensaje['pos_usuario']) and
+            _entero_entre(mensaje['id_usuario'], 0, _MAX_UINT32) and
+            _entero_entre(mensaje.get('id_asignacion', 0), 0, _MAX_UINT64))
+
+
+def empaquetar(mensaje, formato=None, region=None):
+    # Partes del mensaje multipart listo para send_multipart
+    topico = topico_de(mensaje)
+    if region is not None:
+        topico = topico_region(topico, region)
+    return [topico, codificar(mensaje, formato)]
+
+
+def codificar(mensaje, formato=None):
+    if (formato or FORMATO) == 'json':
+        return json.dumps(mensaje).encode('utf-8')
+
+    tipo = mensaje['tipo']
+    try:
+        # Los mensajes de la flota casi siempre caben: se intenta empaquetar
+        # sin comprobar antes cada campo y, si no, van como JSON
+        if tipo == 'registro':
+            x, y = mensaje['posicion']
+            return ESTRUCTURAS[REGISTRO].pack(VERSION, REGISTRO, mensaje['id'], x, y,
+                                              mensaje.get('velocidad', 0))
+        if tipo == 'actualizacion':
+            x, y = mensaje['posicion']
+            return ESTRUCTURAS[ACTUALIZACION].pack(VERSION, ACTUALIZACION, mensaje['id'], x, y,
+                                                   bool(mensaje.get('ocupado', False)),
+                                                   mensaje.get('servicios', 0),
+                                                   mensaje.get('timestamp', 0.0))
+    except struct.error:
+        return json.dumps(mensaje).encode('utf-8')
+    if tipo == 'servicio_asignado' and asignacion_binaria(mensaje):
+        x, y = mensaje['pos_usuario']
+        return ESTRUCTURAS[SERVICIO_ASIGNADO].pack(VERSION, SERVICIO_ASIGNADO, mensaje['taxi_id'], x, y,
+                                                   mensaje['id_usuario'],
+                                                   mensaje.get('id_asignacion', 0))
+    if tipo == 'lote':
+        return agrupar_codificados([codificar(m, formato) for m in mensaje['mensajes']])
+
+    # Mensajes sin formato binario propio viajan como JSON
+    return json.dumps(mensaje).encode('utf-8')
+
+
+def decodificar(datos):
+    if not datos:
+        raise ValueError("Mensaje vacío")
+    if datos[0] == _JSON_INICIO:
+        return json.loads(datos)
+    if datos[0] != VERSION:
+        raise ValueError(f"Versión de formato no soportada: {datos[0]}")
+
+    tipo = datos[1]
+    if tipo == LOTE:
+        return {'tipo': 'lote', 'mensajes': _decodificar_lote(datos)}
+    estructura = ESTRUCTURAS.get(tipo)
+    if estructura is None:
+        raise ValueError(f"Tipo de mensaje desconocido: {tipo}")
+    campos = estructura.unpack(datos)
+
+    if tipo == REGISTRO:
+        _, _, id_taxi, x, y, velocidad = campos
+        return {'tipo': 'registro', 'id': id_taxi, 'posicion': (x, y), 'velocidad': velocidad}
+    if tipo == ACTUALIZACION:
+        _, _, id_taxi, x, y, ocupado, servicios, timestamp = campos
+        return {'tipo': 'actualizacion', 'id': id_taxi, 'posicion': (x, y), 'ocupado': bool(ocupado),
+                'servicios': servicios, 'timestamp': timestamp}
+    _, _, taxi_id, x, y, id_usuario, id_asignacion = campos
+    return {'tipo': 'servicio_asignado', 'taxi_id': taxi_id, 'pos_usuario': (x, y),
+            'id_usuario': id_usuario, 'id_asignacion': id_asignacion}
+
+
+def _decodificar_lote(datos):
+    _, _, cantidad = CABECERA_LOTE.unpack_from(datos)
+    mensajes = []
+    desplazamiento = CABECERA_LOTE.size
+    for _ in range(cantidad):
+        largo, = LARGO_MENSAJE.unpack_from(datos, desplazamiento)
+        desplazamiento += LARGO_MENSAJE.size
+        mensajes.append(decodificar(datos[desplazamiento:desplazamiento + largo]))
+        desplazamiento += largo
+    return mensajes
+
+
+def agrupar_codificados(partes):
+    # Lote binario a partir de mensajes ya codificados (binarios o JSON)
+    if len(partes) > MAX_MENSAJES_LOTE:
+        raise ValueError(f"Un lote admite como máximo {MAX_MENSAJES_LOTE} mensajes")
+    return CABECERA_LOTE.pack(VERSION, LOTE, len(partes)) + b''.join(
+        LARGO_MENSAJE.pack(len(parte)) + parte for parte in partes)
+
+
+def separar_codificados(datos):
+    # Mensajes codificados que contiene un lote binario, sin decodificarlos
+    if not (datos and datos[0] == VERSION and len(datos) > 1 and datos[1] == LOTE):
+        return [datos]
+    _, _, cantidad = CABECERA_LOTE.unpack_from(datos)
+    partes = []
+    desplazamiento = CABECERA_LOTE.size
+    for _ in range(cantidad):
+        largo, = LARGO_MENSAJE.unpack_from(datos, desplazamiento)
+        desplazamiento += LARGO_MENSAJE.size
+        partes.append(bytes(datos[desplazamiento:desplazamiento + largo]))
+        desplazamiento += largo
+    return partes
+
+
+_ID_TAXI = struct.Struct('<I')  # Primer campo tras la cabecera en registro y actualización
+
+
+def taxi_de(datos):
+    # (tipo, id del taxi) de un registro o una actualización; None para otros mensajes
+    if datos and datos[0] == VERSION and len(datos) > 1:
+        if datos[1] not in (REGISTRO, ACTUALIZACION):
+            return None
+        return NOMBRES_TIPOS[datos[1]], _ID_TAXI.unpack_from(datos, 2)[0]
+    mensaje = decodificar(datos)
+    if mensaje.get('tipo') not in ('registro', 'actualizacion'):
+        return None
+    return mensaje['tipo'], mensaje['id']
+
+
+def desagrupar(mensaje):
+    # Mensajes individuales contenidos en un mensaje (un lote o él mismo)
+    if mensaje.get('tipo') == 'lote':
+        return mensaje['mensajes']
+    return [mensaje]
+
+
+def tipo_de(datos):
+    # Tipo de un mensaje leyendo solo la cabecera cuando es binario
+    if datos and datos[0] == VERSION and len(datos) > 1:
+        return NOMBRES_TIPOS.get(datos[1], '')
+    return decodificar(datos).get('tipo', '')
@@ -0,0 +1,197 @@
+# repetidor.py
+# Reproduce contra un servidor central el tráfico guardado con --captura:
+# los mensajes de los taxis que reenvió el broker (broker.py --captura, un
+# archivo por reenviador en modo clúster) y las solicitudes de los usuarios
+# que recibió el servidor (servidor_central.py --captura).
+#
+# Los eventos de todas las capturas se mezclan por instante y se aplican
+# uno a uno en este proceso, sin broker ni sockets de por medio, a un
+# ServidorCentral cuyo reloj marca el instante capturado de cada evento.
+# Así las decisiones (qué taxi recibe cada usuario) no dependen de la
+# velocidad de la reproducción ni de la máquina: dos reproducciones de la
+# misma captura dan la misma huella de decisiones, y una diferencia de
+# huella entre dos versiones del servidor señala un cambio de comportamiento.
+#
+# --velocidad 1 o 10 respeta los intervalos capturados (divididos por la
+# velocidad) y mide si el servidor da abasto; 'max' los aplica sin pausa.
+# Las esperas del servidor dependen de ESCALA_TIEMPO: la reproducción debe
+# usar el mismo valor que la ejecución capturada.
+#
+# El servidor de la reproducción no abre ningún socket: no escucha a los
+# usuarios y sus asignaciones se cuentan en memoria en lugar de publicarse,
+# para no mandar taxis de verdad a usuarios de la captura. Con --broker se
+# publican además en el broker configurado (BROKER_IP, BROKER_FORWARDERS).
+#
+# Uso: python repetidor.py <captura del servidor> <capturas del broker...> [--velocidad 1|10|max]
+#                          [--decisiones ARCHIVO] [--broker]
+import argparse
+import hashlib
+import heapq
+import json
+import time
+
+import zmq
+
+import protocolo
+from captura import CANAL_BROKER, inicio_de, leer
+from metricas import Histograma
+from servidor_central import LIMITE_COLA_MENSAJES, ServidorCentral
+
+
+class Reloj:
+    # Reloj de la reproducción: el instante capturado del evento en curso
+    def __init__(self, ahora):
+        self.ahora = ahora
+
+    def __call__(self):
+        return self.ahora
+
+
+class Repetidor:
+    def __init__(self, servidor, reloj):
+        self.servidor = servidor
+        self.reloj = reloj
+        self.decisiones = []        # (id_usuario, id_taxi o None) en orden
+        self.originales = {}        # {id_solicitud: id_taxi o None} respondido en la captura
+        self.reproducidas = {}      # {id_solicitud: id_taxi o None} en esta reproducción
+        self.h_solicitud = Histograma()
+        self.h_retraso = Histograma()  # Retraso de cada evento respecto a su momento previsto
+        self.contadores = {'eventos': 0, 'mensajes_taxis': 0, 'solicitudes': 0, 'asignaciones_publicadas': 0}
+        self.sockets_pub = None     # Solo con --broker
+
+    def publicar(self, mensajes):
+        # Publicador del servidor de la reproducción
+        self.contadores['asignaciones_publicadas'] += len(mensajes)
+        if self.sockets_pub is not None:
+            enrutamiento = self.servidor.enrutamiento
+            for mensaje in mensajes:
+                self.sockets_pub[enrutamiento.forwarder_de_mensaje(mensaje)].send_multipart(
+                    protocolo.empaquetar(mensaje))
+
+    def conectar_broker(self, context):
+        self.sockets_pub = []
+        for url in self.servidor.enrutamiento.frontends():
+            socket_pub = context.socket(zmq.PUB)
+            socket_pub.setsockopt(zmq.SNDHWM, LIMITE_COLA_MENSAJES)
+            socket_pub.connect(url) # 5559
+            self.sockets_pub.append(socket_pub)
+
+    def aplicar_taxis(self, partes):
+        # Lo mismo que hace procesar_actualizaciones_taxis con un lote recibido
+        if not bytes(partes[0]).startswith((protocolo.TOPICO_REGISTRO, protocolo.TOPICO_POSICION)):
+            return  # Asignaciones y latidos del servidor capturado
+        mensajes = self.servidor.fusionar_actualizaciones(
+            self.servidor.decodificar_actualizaciones(bytes(partes[-1])))
+        with self.servidor.lock:
+            self.servidor.aplicar_actualizaciones(mensajes)
+            self.servidor.disponibilidad.vencer(self.reloj())
+        self.contadores['mensajes_taxis'] += len(mensajes)
+
+    def atender_usuario(self, partes):
+        mensaje = json.loads(bytes(partes[-1]))
+        if 'tipo' not in mensaje:
+            # Respuesta del servidor capturado: sirve para comparar decisiones
+            if mensaje.get('id_solicitud') is not None and 'resultados' not in mensaje:
+                self.originales[mensaje['id_solicitud']] = mensaje.get('taxi_id')
+            return
+
+        inicio = time.perf_counter()
+        respuesta = self.servidor.responder_solicitud(mensaje)
+        self.h_solicitud.registrar(time.perf_counter() - inicio)
+        self.contadores['solicitudes'] += 1
+        if 'resultados' in respuesta:
+            for resultado in respuesta['resultados']:
+                self.decisiones.append((resultado['id_usuario'], resultado.get('taxi_id')))
+        else:
+            self.decisiones.append((mensaje['id_usuario'], respuesta.get('taxi_id')))
+            if mensaje.get('id_solicitud') is not None:
+                self.reproducidas[mensaje['id_solicitud']] = respuesta.get('taxi_id')
+
+    def ejecutar(self, eventos, velocidad=None):
+        # velocidad=None: sin pausas entre eventos
+        inicio_real = time.perf_counter()
+        inicio_captura = None
+        for instante, canal, partes in eventos:
+            if inicio_captura is None:
+                inicio_captura = instante
+            if velocidad is not None:
+                previsto = inicio_real + (instante - inicio_captura) / velocidad
+                espera = previsto - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+                self.h_retraso.registrar(max(0.0, time.perf_counter() - previsto))
+
+            self.reloj.ahora = instante
+            self.contadores['eventos'] += 1
+            if canal == CANAL_BROKER:
+                self.aplicar_taxis(partes)
+            else:
+                self.atender_usuario(partes)
+        return time.perf_counter() - inicio_real
+
+    def huella(self):
+        return hashlib.sha256(repr(self.decisiones).encode('utf-8')).hexdigest()[:16]
+
+    def mostrar_resumen(self, duracion):
+        c = self.contadores
+        asignadas = sum(1 for _, id_taxi in self.decisiones if id_taxi is not None)
+        solicitud = self.h_solicitud.resumen()
+        print(f"{c['eventos']} eventos ({c['mensajes_taxis']} mensajes de taxis, {c['solicitudes']} solicitudes) "
+              f"en {duracion:.2f} s: {c['eventos'] / max(duracion, 1e-9):.0f} eventos/s")
+        print(f"Solicitudes: {asignadas} de {len(self.decisiones)} usuarios con taxi; p50 {solicitud['p50']:.3f} ms, "
+              f"p99 {solicitud['p99']:.3f} ms, máximo {solicitud['max']:.3f} ms")
+        destino = "en el broker" if self.sockets_pub is not None else "sin publicar (no se usó --broker)"
+        print(f"Asignaciones a taxis: {c['asignaciones_publicadas']} {destino}")
+        if self.h_retraso.total:
+            retraso = self.h_retraso.resumen()
+            print(f"Retraso respecto a la captura: p50 {retraso['p50']:.3f} ms, p99 {retraso['p99']:.3f} ms, "
+                  f"máximo {retraso['max']:.3f} ms")
+        comunes = self.originales.keys() & self.reproducidas.keys()
+        if comunes:
+            iguales = sum(1 for id_solicitud in comunes
+                          if self.originales[id_solicitud] == self.reproducidas[id_solicitud])
+            print(f"Coinciden con la captura {iguales} de {len(comunes)} respuestas con id_solicitud")
+        print(f"Huella de las decisiones: {self.huella()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce una captura del sistema contra un servidor central")
+    parser.add_argument('usuarios', help="Captura del servidor central (solicitudes de usuarios)")
+    parser.add_argument('taxis', nargs='*', help="Capturas del broker (mensajes de los taxis)")
+    parser.add_argument('--velocidad', default='max', help="1, 10, ... veces la velocidad capturada, o 'max'")
+    parser.add_argument('--decisiones', default=None, metavar='ARCHIVO',
+                        help="Guardar 'id_usuario id_taxi' de cada decisión para compararlas entre ejecuciones")
+    parser.add_argument('--N', type=int, default=100)
+    parser.add_argument('--M', type=int, default=100)
+    parser.add_argument('--broker', action='store_true',
+                        help="Publicar las asignaciones en el broker: llegan a los taxis conectados")
+    args = parser.parse_args()
+    velocidad = None if args.velocidad == 'max' else float(args.velocidad)
+
+    # El reloj empieza en el instante de la captura para que también los
+    # identificadores de asignación se repitan de una reproducción a otra
+    reloj = Reloj(inicio_de(args.usuarios))
+    repetidor = Repetidor(None, reloj)
+    servidor = ServidorCentral(args.N, args.M, reloj=reloj, red=False, publicador=repetidor.publicar)
+    repetidor.servidor = servidor
+    context = None
+    if args.broker:
+        context = zmq.Context()
+        repetidor.conectar_broker(context)
+        time.sleep(0.5)  # Dar tiempo a las conexiones antes de publicar
+
+    # Mezcla estable por instante: a igual instante, el orden de los archivos
+    eventos = heapq.merge(*(leer(ruta) for ruta in [args.usuarios] + args.taxis), key=lambda evento: evento[0])
+    duracion = repetidor.ejecutar(eventos, velocidad)
+    repetidor.mostrar_resumen(duracion)
+
+    if args.decisiones is not None:
+        with open(args.decisiones, 'w') as f:
+            for id_usuario, id_taxi in repetidor.decisiones:
+                f.write(f"{id_usuario} {'-' if id_taxi is None else id_taxi}\n")
+    if context is not None:
+        context.destroy(linger=1000)
+
+
+if __name__ == "__main__":
+    main()
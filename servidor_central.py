@@ -1,8 +1,26 @@
 # servidor_central.py
+import argparse
+import itertools
+import json
+import os
+import struct
 import zmq
 import threading
 import time
 
+import asignacion_lotes
+from almacen_estado import AlmacenEstado
+from bitacora import Bitacora
+from captura import CANAL_USUARIOS, LIMITE_COLA_CAPTURA, Captura
+from consultas import INTERVALO_INSTANTANEA as INTERVALO_CONSULTAS, ServidorConsultas
+import enrutamiento
+import particion as particiones
+import protocolo
+from disponibilidad import Disponibilidad
+from indice_espacial import IndiceEspacial
+from metricas import Metricas, ServidorMetricas
+from tabla_flota import TablaFlota
+
 # Direcciones IP de los componentes
 BROKER_IP = "127.0.0.1"       # IP del broker
 SERVIDOR_IP = "127.0.0.1"    # IP del servidor central
@@ -13,6 +31,11 @@ USUARIO_IP = "127.0.0.1"     # IP base para usuarios
 BROKER_FRONTEND_PORT = 5559       # Para publicadores (taxis y servidor)
 BROKER_BACKEND_PORT = 5560        # Para suscriptores (taxis y servidor)
 USUARIO_SERVER_PORT = 5555        # Para comunicación usuario-servidor
+USUARIO_REPLICA_PORT = 5556       # Para comunicación usuario-réplica del servidor
+SHARD_BASE_PORT = 5600            # Para comunicación frente-shards (5600 + región)
+METRICAS_BASE_PORT = 5700         # Para consultar métricas (5700 broker, 5701 servidor, 5702 réplica, 5710 + región shards)
+BROKER_FORWARDERS_BASE_PORT = 5800 # Reenviadores del broker en modo clúster (5800 + 2i, 5801 + 2i); ver enrutamiento.py
+CONSULTAS_BASE_PORT = 5900         # Para consultas de la flota (5901 servidor, 5902 réplica, 5910 + región shards); ver consultas.py
 
 # Configuraciones completas
 BROKER_FRONTEND_URL = f"tcp://*:{BROKER_FRONTEND_PORT}"
@@ -20,163 +43,1132 @@ BROKER_BACKEND_URL = f"tcp://*:{BROKER_BACKEND_PORT}"
 BROKER_FRONTEND_CONNECT = f"tcp://{BROKER_IP}:{BROKER_FRONTEND_PORT}"
 BROKER_BACKEND_CONNECT = f"tcp://{BROKER_IP}:{BROKER_BACKEND_PORT}"
 USUARIO_SERVER_URL = f"tcp://{SERVIDOR_IP}:{USUARIO_SERVER_PORT}"
+USUARIO_REPLICA_URL = f"tcp://{SERVIDOR_IP}:{USUARIO_REPLICA_PORT}"
+TRABAJADORES_URL = "inproc://trabajadores"  # Cola interna entre el ROUTER y los hilos trabajadores
+CAPTURA_URL = "inproc://captura"            # Copia de lo que pasa por el ROUTER, para --captura
+
+# Tiempos de la simulación; ESCALA_TIEMPO > 1 los acorta para pruebas de carga
+ESCALA_TIEMPO = float(os.environ.get('ESCALA_TIEMPO', '1'))
+ESPERA_REASIGNACION = 31 / ESCALA_TIEMPO  # Un servicio dura 30 segundos; 31 para margen
+
+# Reenvío de asignaciones hasta que el taxi las confirma publicando que está ocupado
+TIEMPO_REENVIO_ASIGNACION = 0.5   # Segundos entre reenvíos de una asignación sin confirmar
+MAX_REENVIOS_ASIGNACION = 20      # Los taxis confirman al instante; 10 s sin respuesta es un taxi caído
+
+INTERVALO_INSTANTANEA = 60        # Segundos entre instantáneas del estado persistente
+
+# Control de admisión: las colas de cada socket están acotadas y el hilo
+# que lee el ROUTER anota en cada solicitud el instante de llegada con el
+# reloj del servidor. Cada solicitud trae su 'presupuesto', los segundos que
+# el usuario aún espera ese intento, que se cuenta desde esa llegada: la
+# que lo agota en cola se descarta sin buscarle taxi. La que esperó en cola
+# más de MAX_ESPERA_COLA se contesta enseguida con 'sobrecargado' para que
+# el usuario reintente pasado REINTENTO_SOBRECARGA. Nada de esto compara
+# relojes de máquinas distintas
+LIMITE_COLA_MENSAJES = 10000      # SNDHWM/RCVHWM de cada socket
+MAX_ESPERA_COLA = 0.1             # Segundos en cola a partir de los cuales se rechaza (0: sin límite)
+MAX_ENRUTADOS = 256               # Mensajes que el enrutador mueve de una vez en cada sentido
+LLEGADA = struct.Struct('<d')     # Parte que el enrutador añade a cada solicitud: instante de llegada
+REINTENTO_SOBRECARGA = 0.1        # Segundos que se pide esperar al usuario rechazado por sobrecarga
+TIMEOUT_SOLICITUD = 5.0           # Presupuesto de una solicitud que no lo indica
+
+# Réplica en espera: sigue el estado del primario y lo sustituye si deja de emitir latidos
+INTERVALO_LATIDO = 0.25           # Segundos entre latidos del servidor activo
+TIEMPO_FALLO_PRIMARIO = 1.0       # Segundos sin latidos para dar por caído al primario
+
+# Aplicación por lotes de las actualizaciones de los taxis
+MAX_ACTUALIZACIONES_LOTE = 2000   # Máximo de mensajes que se sacan de la cola antes de aplicarlos
+INTERVALO_ESTADISTICAS = 10       # Segundos entre resúmenes de las actualizaciones aplicadas
+
+log = Bitacora('Servidor')
+
+
+def posicion_valida(valor):
+    # (x, y) de un mensaje de usuario; ValueError si no es un par de números
+    if (not isinstance(valor, (list, tuple)) or len(valor) != 2 or
+            not all(isinstance(c, (int, float)) and not isinstance(c, bool) for c in valor)):
+        raise ValueError(f"Posición no válida: {valor!r}")
+    return tuple(valor)
+
+
+def usuario_valido(valor):
+    # Los usuarios se identifican con un entero o una cadena
+    if not isinstance(valor, (int, str)) or isinstance(valor, bool):
+        raise ValueError(f"id_usuario no válido: {valor!r}")
+    return valor
+
+
+def validar_solicitud(mensaje):
+    # (pos_usuario, id_usuario) de una solicitud; ValueError si está mal formada
+    if 'id_usuario' not in mensaje:
+        raise ValueError("Falta 'id_usuario'")
+    return posicion_valida(mensaje.get('posicion')), usuario_valido(mensaje['id_usuario'])
+
+
+def validar_lote(mensaje):
+    # [(pos_usuario, id_usuario), ...] de una 'solicitud_lote', todas
+    # validadas antes de reservar ningún taxi
+    entradas = mensaje.get('solicitudes')
+    if not isinstance(entradas, list):
+        raise ValueError("'solicitudes' debe ser una lista de [id_usuario, [x, y]]")
+    solicitudes = []
+    for entrada in entradas:
+        if not isinstance(entrada, (list, tuple)) or len(entrada) != 2:
+            raise ValueError(f"Entrada del lote no válida: {entrada!r}")
+        id_usuario, posicion = entrada
+        solicitudes.append((posicion_valida(posicion), usuario_valido(id_usuario)))
+    return solicitudes
+
+
+class SolicitudVencida(Exception):
+    # El presupuesto de la solicitud se agotó antes de reservarle un taxi
+    pass
+
+
+def comprobar_limite(limite):
+    if limite is not None and time.time() > limite:
+        raise SolicitudVencida()
+
+
 class ServidorCentral:
-    def __init__(self, N, M):
+    def __init__(self, N, M, num_trabajadores=4, modo='individual', ventana_lote=0.05, max_lote=64,
+                 ruta_estado=None, replica=False, memoria_compartida=None, particion=None, region=None,
+                 ttl_taxis=None, puerto_metricas=None, reloj=None, captura=None,
+                 max_espera_cola=MAX_ESPERA_COLA, puerto_consultas=None,
+                 intervalo_consultas=INTERVALO_CONSULTAS, red=True, publicador=None):
+        # Reloj de las decisiones (esperas, caducidades, reservas); repetidor.py
+        # lo sustituye por el de la captura para que la reproducción sea determinista
+        self.reloj = reloj or time.time
         self.N = N
         self.M = M
-        self.taxis = {}  # {id: {'pos': (x,y), 'ocupado': False, 'servicios': 0}}
+        self.num_trabajadores = num_trabajadores
+        self.modo = modo                  # 'individual' (un trabajador por solicitud) o 'lotes'
+        self.ventana_lote = ventana_lote  # Segundos que se acumulan solicitudes en modo lotes
+        self.max_lote = max_lote          # Máximo de solicitudes resueltas juntas
+        self.max_espera_cola = max_espera_cola  # None o 0: sin límite
+        self.puerto_consultas = puerto_consultas
+        self.intervalo_consultas = intervalo_consultas  # Segundos entre instantáneas para las consultas
+        self.consultas = None              # ServidorConsultas; copia la flota al final de un lote
+        # Estado de cada taxi (pos, ocupado, servicios, ultima_asignacion, velocidad);
+        # con memoria_compartida=capacidad otros procesos pueden leerlo sin copiarlo
+        if memoria_compartida:
+            self.taxis = TablaFlota(capacidad=memoria_compartida, compartida=True)
+        else:
+            self.taxis = TablaFlota()
+        self.indice = IndiceEspacial(N, M)  # Solo contiene como elegibles a los taxis libres
+        # Decide qué taxis están libres; las esperas y caducidades vencen con el tiempo
+        self.disponibilidad = Disponibilidad(self.indice, ESPERA_REASIGNACION, ttl=ttl_taxis)
+        self.asignaciones_pendientes = {}  # {id_taxi: {'mensaje': {...}, 'enviado': t, 'reenvios': n}}
+        self.contador_asignaciones = itertools.count(int(self.reloj() * 1000))
+        self.ultima_asignacion_vista = {}  # {id_taxi: id_asignacion} para no contar dos veces un reenvío
+        self.replica = replica
+        self.particion = particion         # Con partición, este servidor es el shard de una sola región
+        self.region = region
+        self.activo = not replica          # Una réplica no asigna taxis hasta que cae el primario
+        self.ultimo_latido = time.time()
+        self.ultima_cola_vacia = 0.0       # Último instante en que no quedaban actualizaciones por aplicar
+        # recibidas: actualizaciones leídas del broker; fusionadas: sustituidas por otra más
+        # reciente del mismo taxi en el mismo lote; obsoletas: más antiguas que la ya aplicada
+        self.contadores = {'lotes': 0, 'recibidas': 0, 'aplicadas': 0, 'fusionadas': 0, 'obsoletas': 0,
+                           'errores': 0}
+        self.puerto_metricas = puerto_metricas
+        self.metricas = Metricas('Servidor')
+        self.crear_metricas()
         self.context = zmq.Context()
         self.lock = threading.Lock()
+        self.lock_pub = threading.Lock()  # Los sockets ZMQ no se pueden compartir entre hilos
+
+        # Estado persistente opcional: se recupera la flota al arrancar
+        self.almacen = None
+        if ruta_estado is not None:
+            self.almacen = AlmacenEstado(ruta_estado)
+            self.recuperar_estado()
+
+        # Con el broker en modo clúster cada taxi pasa por un reenviador: el
+        # servidor escucha a todos y publica cada asignación en el de su taxi
+        self.enrutamiento = enrutamiento.desde_entorno(BROKER_IP, BROKER_FRONTEND_PORT, BROKER_BACKEND_PORT,
+                                                       BROKER_FORWARDERS_BASE_PORT)
 
+        # Sin red (repetidor.py) no se crea ningún socket: las asignaciones van
+        # a `publicador`, una función que recibe la lista de mensajes
+        self.publicador = publicador
+        self.captura = None
+        self.socket_captura = None
+        self.sockets_pub = []
+        if red:
+            self.conectar(captura)
+
+    def conectar(self, captura):
         # Socket para recibir actualizaciones de posición de taxis
         self.socket_sub = self.context.socket(zmq.SUB)
-        self.socket_sub.connect(BROKER_BACKEND_CONNECT) # 5560
-        self.socket_sub.setsockopt_string(zmq.SUBSCRIBE, "")
+        self.socket_sub.setsockopt(zmq.RCVHWM, LIMITE_COLA_MENSAJES)
+        for url in self.enrutamiento.backends():
+            self.socket_sub.connect(url) # 5560
+        if self.particion is None:
+            self.socket_sub.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_REGISTRO)
+            self.socket_sub.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_POSICION)
+        else:
+            # Un shard solo recibe los mensajes de los taxis de su región
+            for topico in self.particion.topicos(self.region):
+                self.socket_sub.setsockopt(zmq.SUBSCRIBE, topico)
+        if self.replica:
+            # La réplica también sigue las decisiones del primario
+            self.socket_sub.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_ASIGNACION)
+
+            # Los latidos llegan por un socket propio para que una cola de
+            # actualizaciones atrasada no parezca una caída del primario
+            self.socket_latidos = self.context.socket(zmq.SUB)
+            self.socket_latidos.setsockopt(zmq.RCVHWM, LIMITE_COLA_MENSAJES)
+            self.socket_latidos.connect(self.enrutamiento.backend(0)) # 5560
+            self.socket_latidos.setsockopt(zmq.SUBSCRIBE, protocolo.TOPICO_LATIDO)
+
+        # Sockets para recibir solicitudes de usuarios: el ROUTER reparte las
+        # solicitudes entre los hilos trabajadores a través del DEALER
+        self.socket_frontend = self.context.socket(zmq.ROUTER)
+        self.socket_frontend.setsockopt(zmq.RCVHWM, LIMITE_COLA_MENSAJES)
+        self.socket_frontend.setsockopt(zmq.SNDHWM, LIMITE_COLA_MENSAJES)
+        if self.particion is not None:
+            puerto = SHARD_BASE_PORT + self.region  # El frente de shards reparte las solicitudes
+        else:
+            puerto = USUARIO_REPLICA_PORT if self.replica else USUARIO_SERVER_PORT
+        self.socket_frontend.bind(f"tcp://*:{puerto}") # 5555 / 5556 / 5600 + región
+        self.socket_backend = self.context.socket(zmq.DEALER)
+        self.socket_backend.setsockopt(zmq.SNDHWM, LIMITE_COLA_MENSAJES)
+        self.socket_backend.setsockopt(zmq.RCVHWM, LIMITE_COLA_MENSAJES)
+        self.socket_backend.bind(TRABAJADORES_URL)
+
+        # Captura opcional de las solicitudes y respuestas para repetidor.py:
+        # en modo individual la hace el socket de captura del enrutador
+        if captura is not None:
+            self.captura = Captura(captura)
+            if self.modo != 'lotes':
+                self.socket_captura = self.context.socket(zmq.PUB)
+                self.socket_captura.setsockopt(zmq.SNDHWM, LIMITE_COLA_CAPTURA)
+                self.socket_captura.bind(CAPTURA_URL)
+
+        # Sockets para notificar a taxis, uno por reenviador del broker
+        self.sockets_pub = []
+        for url in self.enrutamiento.frontends():
+            socket_pub = self.context.socket(zmq.PUB)
+            socket_pub.setsockopt(zmq.SNDHWM, LIMITE_COLA_MENSAJES)
+            socket_pub.connect(url) # 5559
+            self.sockets_pub.append(socket_pub)
+
+    def crear_metricas(self):
+        # Etapas de una solicitud: recepción (desde que el usuario la envía
+        # hasta que la toma un trabajador), espera del lock, búsqueda del
+        # taxi, publicación de la asignación y envío de la respuesta
+        m = self.metricas
+        self.h_recepcion = m.histograma('solicitud.recepcion')
+        self.h_espera_lock = m.histograma('solicitud.espera_lock')
+        self.h_busqueda = m.histograma('solicitud.busqueda')
+        self.h_publicacion = m.histograma('solicitud.publicacion')
+        self.h_respuesta = m.histograma('solicitud.respuesta')
+        self.h_solicitud = m.histograma('solicitud.total')
+        self.h_lote_solicitudes = m.histograma('solicitud.tamano_lote', unidad='')
+        self.h_lote_actualizaciones = m.histograma('actualizacion.tamano_lote', unidad='')
+        self.h_espera_lock_actualizaciones = m.histograma('actualizacion.espera_lock')
+        self.h_aplicar_lote = m.histograma('actualizacion.aplicar_lote')
+        m.indicador('taxis', lambda: len(self.taxis))
+        m.indicador('asignaciones_pendientes', lambda: len(self.asignaciones_pendientes))
+        m.indicador('actualizaciones', lambda: dict(self.contadores))
+        # Atraso de la cola de actualizaciones: segundos desde que se vació por última vez
+        m.indicador('segundos_desde_cola_vacia', lambda: max(0.0, time.time() - self.ultima_cola_vacia))
+        m.indicador('activo', lambda: self.activo)
+
+        def disponibilidad():
+            with self.lock:
+                return self.disponibilidad.resumen()
+        m.indicador('disponibilidad', disponibilidad)
 
-        # Socket para recibir solicitudes de usuarios
-        self.socket_rep = self.context.socket(zmq.REP)
-        self.socket_rep.bind(f"tcp://*:{USUARIO_SERVER_PORT}") # 5555
+    def recuperar_estado(self):
+        inicio = time.time()
+        self.taxis.cargar(self.almacen.cargar())
+        ahora = time.time()
+        for taxi_id, info in self.taxis.items():
+            self.actualizar_disponibilidad(taxi_id, info, ahora)
+        log.info('recuperacion', "Recuperados %d taxis del estado persistente en %.3f segundos",
+                 len(self.taxis), time.time() - inicio)
 
-        # Socket para notificar a taxis
-        self.socket_pub = self.context.socket(zmq.PUB)
-        self.socket_pub.connect(BROKER_FRONTEND_CONNECT) # 5559
+    def persistir(self, tipo, taxi_id):
+        # Debe llamarse con self.lock adquirido para conservar el orden de los eventos
+        if self.almacen is not None:
+            self.almacen.registrar(tipo, taxi_id, self.taxis.info(taxi_id))
+
+    def guardar_instantaneas(self):
+        while True:
+            time.sleep(INTERVALO_INSTANTANEA)
+            try:
+                # Bajo el lock solo se copia la tabla (una copia del buffer)
+                with self.lock:
+                    self.almacen.guardar_instantanea(self.taxis.copia())
+            except Exception as e:
+                log.error('instantanea', "Error guardando instantánea del estado: %s", e)
 
     def calcular_distancia(self, pos1, pos2):
         return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
 
+    def en_region(self, pos):
+        # Sin partición toda la ciudad es del servidor; un shard suelta los taxis que salen de su región
+        return self.particion is None or self.particion.region_de(pos) == self.region
+
+    def actualizar_disponibilidad(self, taxi_id, info, ahora):
+        # Debe llamarse con self.lock adquirido
+        self.disponibilidad.actualizar(taxi_id, info['pos'], info['ocupado'], info['servicios'],
+                                       info['ultima_asignacion'], ahora, self.en_region(info['pos']))
+
+    def _buscar_taxi_cercano(self, pos_usuario, tiempo_actual):
+        # Debe llamarse con self.lock adquirido. El índice solo tiene como
+        # elegibles a los taxis libres una vez vencidas las esperas pendientes
+        inicio = time.perf_counter()
+        self.disponibilidad.vencer(tiempo_actual)
+        taxi_cercano, _ = self.indice.mas_cercano(pos_usuario)
+        self.h_busqueda.registrar(time.perf_counter() - inicio)
+        return taxi_cercano
+
     def encontrar_taxi_cercano(self, pos_usuario):
-        taxi_cercano = None
-        menor_distancia = float('inf')
-        tiempo_actual = time.time()
+        with self.lock:
+            return self._buscar_taxi_cercano(pos_usuario, self.reloj())
 
+    def asignar_taxi(self, pos_usuario, id_usuario, limite=None):
+        # Búsqueda y reserva en una sola sección crítica para que dos
+        # trabajadores nunca asignen el mismo taxi
+        inicio = time.perf_counter()
         with self.lock:
-            for id_taxi, info in self.taxis.items():
-                # Verificar si el taxi está realmente disponible
-                if (not info['ocupado'] and
-                        info['servicios'] < 3 and
-                        (tiempo_actual - info.get('ultima_asignacion', 0)) > 31):  # 31 segundos para margen
-
-                    distancia = self.calcular_distancia(info['pos'], pos_usuario)
-                    if distancia < menor_distancia or (
-                            distancia == menor_distancia and
-                            (taxi_cercano is None or id_taxi < taxi_cercano)
-                    ):
-                        menor_distancia = distancia
-                        taxi_cercano = id_taxi
+            self.h_espera_lock.registrar(time.perf_counter() - inicio)
+            comprobar_limite(limite)
+            tiempo_actual = self.reloj()
+            taxi_id = self._buscar_taxi_cercano(pos_usuario, tiempo_actual)
+            if taxi_id is None:
+                return None
+            return self._reservar_taxi(taxi_id, pos_usuario, id_usuario, tiempo_actual)
 
-        return taxi_cercano
+    def asignar_en_shard(self, pos_usuario, id_usuario, distancia_maxima=None, taxi_id=None, limite=None):
+        # Asignación coordinada por el frente de shards. Sin taxi_id se asigna
+        # el taxi más cercano solo si está a menos de distancia_maxima (ningún
+        # otro shard puede tener uno mejor); si no, se devuelve como candidato
+        # (id, distancia). Con taxi_id se confirma ese taxi si sigue disponible.
+        inicio = time.perf_counter()
+        with self.lock:
+            self.h_espera_lock.registrar(time.perf_counter() - inicio)
+            comprobar_limite(limite)
+            tiempo_actual = self.reloj()
+            self.disponibilidad.vencer(tiempo_actual)
+            if taxi_id is None:
+                inicio = time.perf_counter()
+                taxi_id, distancia = self.indice.mas_cercano(pos_usuario)
+                self.h_busqueda.registrar(time.perf_counter() - inicio)
+                if taxi_id is None:
+                    return None, None
+                if distancia_maxima is not None and distancia >= distancia_maxima:
+                    return None, (taxi_id, distancia)
+            elif taxi_id not in self.indice.elegibles:
+                return None, None
+            return self._reservar_taxi(taxi_id, pos_usuario, id_usuario, tiempo_actual), None
+
+    def asignar_lote(self, solicitudes):
+        # solicitudes: lista de (pos_usuario, id_usuario). Resuelve todo el lote
+        # a la vez minimizando la distancia total de recogida
+        self.h_lote_solicitudes.registrar(len(solicitudes))
+        inicio = time.perf_counter()
+        with self.lock:
+            self.h_espera_lock.registrar(time.perf_counter() - inicio)
+            tiempo_actual = self.reloj()
+            inicio = time.perf_counter()
+            self.disponibilidad.vencer(tiempo_actual)
+
+            # Con los k más cercanos de cada usuario (k = tamaño del lote) la
+            # solución óptima sobre los candidatos es también óptima sobre toda la flota
+            candidatos = {}
+            for pos_usuario, _ in solicitudes:
+                for _, taxi_id in self.indice.k_mas_cercanos(pos_usuario, len(solicitudes)):
+                    candidatos[taxi_id] = self.taxis.posicion(taxi_id)
+
+            elegidos = asignacion_lotes.asignar_lote([pos for pos, _ in solicitudes],
+                                                     sorted(candidatos.items()))
+            self.h_busqueda.registrar(time.perf_counter() - inicio)
+            return [None if taxi_id is None else
+                    self._reservar_taxi(taxi_id, pos_usuario, id_usuario, tiempo_actual)
+                    for (pos_usuario, id_usuario), taxi_id in zip(solicitudes, elegidos)]
+
+    def asignar_varias(self, solicitudes, limite=None):
+        # solicitudes: lista de (pos_usuario, id_usuario) de un mismo mensaje
+        # 'solicitud_lote'. Cada usuario recibe en orden el taxi libre más
+        # cercano, igual que si llegaran una tras otra, pero todas se
+        # resuelven en una sola pasada con una sola adquisición del lock
+        inicio = time.perf_counter()
+        with self.lock:
+            self.h_espera_lock.registrar(time.perf_counter() - inicio)
+            comprobar_limite(limite)
+            tiempo_actual = self.reloj()
+            inicio = time.perf_counter()
+            self.disponibilidad.vencer(tiempo_actual)
+            asignaciones = []
+            for pos_usuario, id_usuario in solicitudes:
+                taxi_id, _ = self.indice.mas_cercano(pos_usuario)
+                if taxi_id is None:
+                    # No queda ningún taxi libre: tampoco para el resto del lote
+                    asignaciones += [None] * (len(solicitudes) - len(asignaciones))
+                    break
+                asignaciones.append(self._reservar_taxi(taxi_id, pos_usuario, id_usuario, tiempo_actual))
+            self.h_busqueda.registrar(time.perf_counter() - inicio)
+            return asignaciones
+
+    def _reservar_taxi(self, taxi_id, pos_usuario, id_usuario, tiempo_actual):
+        # Debe llamarse con self.lock adquirido
+        ultima_asignacion = self.taxis.ultima_asignacion_de(taxi_id)
+        servicios = self.taxis.reservar(taxi_id, tiempo_actual)
+        self.disponibilidad.reservar(taxi_id)
+        self.persistir('asignacion', taxi_id)
+
+        mensaje_asignacion = {
+            'tipo': 'servicio_asignado',
+            'taxi_id': taxi_id,
+            'pos_usuario': pos_usuario,
+            'id_usuario': id_usuario,
+            'id_asignacion': next(self.contador_asignaciones)
+        }
+        self.ultima_asignacion_vista[taxi_id] = mensaje_asignacion['id_asignacion']
+        self.asignaciones_pendientes[taxi_id] = {
+            'mensaje': mensaje_asignacion,
+            'enviado': tiempo_actual,
+            'reenvios': 0,
+            'ultima_asignacion': ultima_asignacion  # Para anular la reserva si no se publica
+        }
+        return taxi_id, self.taxis.posicion(taxi_id), servicios, mensaje_asignacion
+
+    def anular_reservas(self, asignaciones):
+        # Devuelve a la flota los taxis de asignaciones que no se llegaron a publicar
+        with self.lock:
+            for asignacion in asignaciones:
+                if asignacion is None:
+                    continue
+                taxi_id = asignacion[0]
+                pendiente = self.asignaciones_pendientes.get(taxi_id)
+                if pendiente is None or pendiente['mensaje'] is not asignacion[3]:
+                    continue  # Ya confirmada por el taxi o sustituida por otra
+                del self.asignaciones_pendientes[taxi_id]
+                self.taxis.anular_reserva(taxi_id, pendiente['ultima_asignacion'])
+                self.actualizar_disponibilidad(taxi_id, self.taxis.info(taxi_id), self.reloj())
+                self.persistir('anulacion', taxi_id)
+                log.warning('asignacion_anulada', "Anulada la asignación del Taxi %d al Usuario %s: no se publicó",
+                            taxi_id, asignacion[3]['id_usuario'], taxi_id=taxi_id)
+
+    def replicar_asignacion(self, mensaje):
+        # Debe llamarse con self.lock adquirido. Aplica en la réplica una
+        # asignación decidida por el primario
+        taxi_id = mensaje['taxi_id']
+        if taxi_id not in self.taxis or self.ultima_asignacion_vista.get(taxi_id) == mensaje['id_asignacion']:
+            return
+        self.ultima_asignacion_vista[taxi_id] = mensaje['id_asignacion']
+        self.taxis.reservar(taxi_id, self.reloj())
+        self.disponibilidad.reservar(taxi_id)
+        self.persistir('asignacion', taxi_id)
+
+    def publicar_latidos(self):
+        while True:
+            time.sleep(INTERVALO_LATIDO)
+            if self.activo:
+                try:
+                    self.publicar({'tipo': 'latido', 'replica': self.replica, 'instante': time.time()})
+                except Exception as e:
+                    log.error('latido', "Error publicando latido: %s", e)
+
+    def vigilar_primario(self):
+        deteccion = None
+        while not self.activo:
+            if self.socket_latidos.poll(INTERVALO_LATIDO * 1000 / 2):
+                self.socket_latidos.recv_multipart()
+                self.ultimo_latido = time.time()
+                deteccion = None
+                continue
+
+            if time.time() - self.ultimo_latido <= TIEMPO_FALLO_PRIMARIO:
+                continue
+            if deteccion is None:
+                deteccion = time.time()
+                log.warning('failover', "Sin latidos del primario durante %s s", TIEMPO_FALLO_PRIMARIO)
+            # Antes de asignar se aplican todas las decisiones del primario que
+            # aún estén en cola, para no repetir un taxi ya asignado
+            if self.ultima_cola_vacia > deteccion:
+                self.activo = True
+                log.warning('failover', "La réplica pasa a atender solicitudes")
+
+    def esperar_rol_activo(self):
+        # En la réplica, si el primario parece haber dejado de emitir latidos
+        # se retiene la solicitud hasta confirmar el fallo en lugar de
+        # devolverla, para que el usuario no tenga que volver a intentarlo
+        limite = time.time() + 2 * TIEMPO_FALLO_PRIMARIO
+        while not self.activo and time.time() < limite:
+            if time.time() - self.ultimo_latido < 2 * INTERVALO_LATIDO:
+                break
+            time.sleep(INTERVALO_LATIDO / 5)
+        return self.activo
+
+    def publicar(self, mensaje):
+        if self.publicador is not None:
+            self.publicador([mensaje])
+            return
+        socket_pub = self.sockets_pub[self.enrutamiento.forwarder_de_mensaje(mensaje)]
+        with self.lock_pub:
+            socket_pub.send_multipart(protocolo.empaquetar(mensaje))
+
+    def publicar_varios(self, mensajes):
+        # Cada asignación va al tópico de su taxi, pero con una sola adquisición del lock
+        if self.publicador is not None:
+            self.publicador(mensajes)
+            return
+        with self.lock_pub:
+            for mensaje in mensajes:
+                self.sockets_pub[self.enrutamiento.forwarder_de_mensaje(mensaje)].send_multipart(
+                    protocolo.empaquetar(mensaje))
+
+    def reenviar_asignaciones_pendientes(self):
+        # Un PUB no garantiza la entrega: se reenvía cada asignación hasta que
+        # el taxi confirma publicando una actualización con ocupado=True
+        while True:
+            time.sleep(TIEMPO_REENVIO_ASIGNACION / 2)
+            tiempo_actual = self.reloj()
+            reenviar = []
+            with self.lock:
+                for taxi_id, pendiente in list(self.asignaciones_pendientes.items()):
+                    if tiempo_actual - pendiente['enviado'] < TIEMPO_REENVIO_ASIGNACION:
+                        continue
+                    if pendiente['reenvios'] >= MAX_REENVIOS_ASIGNACION:
+                        log.warning('asignacion_descartada', "Taxi %d no confirmó la asignación, se descarta",
+                                    taxi_id, taxi_id=taxi_id)
+                        del self.asignaciones_pendientes[taxi_id]
+                        continue
+                    pendiente['enviado'] = tiempo_actual
+                    pendiente['reenvios'] += 1
+                    reenviar.append(pendiente['mensaje'])
+
+            for mensaje in reenviar:
+                try:
+                    self.publicar(mensaje)
+                except Exception as e:
+                    log.error('reenvio_asignacion', "Error reenviando asignación: %s", e)
+
+    def notificar_asignacion(self, asignacion, id_usuario, tiempo_respuesta):
+        # Publica la asignación al taxi y construye la respuesta para el usuario
+        if asignacion is not None:
+            # Enviar notificación al taxi a través del broker
+            inicio = time.perf_counter()
+            try:
+                self.publicar(asignacion[3])
+            except Exception:
+                self.anular_reservas([asignacion])
+                raise
+            self.h_publicacion.registrar(time.perf_counter() - inicio)
+        return self.respuesta_asignacion(asignacion, id_usuario, tiempo_respuesta)
+
+    def respuesta_asignacion(self, asignacion, id_usuario, tiempo_respuesta):
+        if asignacion is None:
+            self.metricas.contar_por('solicitudes', 'sin_taxi')
+            log.info('sin_taxi', "No hay taxis disponibles para Usuario %s", id_usuario, id_usuario=id_usuario)
+            return {'exito': False, 'tiempo_respuesta': tiempo_respuesta}
+
+        taxi_id, pos_taxi, servicios, _ = asignacion
+        self.metricas.contar_por('solicitudes', 'asignadas')
+        log.info('asignacion', "Asignado Taxi %d en %s al Usuario %s (%d servicios)",
+                 taxi_id, pos_taxi, id_usuario, servicios, taxi_id=taxi_id, id_usuario=id_usuario,
+                 servicios=servicios, tiempo_respuesta=tiempo_respuesta)
+
+        return {
+            'exito': True,
+            'taxi_id': taxi_id,
+            'pos_taxi': pos_taxi,
+            'tiempo_respuesta': tiempo_respuesta
+        }
+
+    def responder_lote(self, mensaje, tiempo_inicio, limite=None):
+        # 'solicitud_lote': {'solicitudes': [[id_usuario, [x, y]], ...]} de una
+        # central de reservas o un quiosco en un solo viaje. La respuesta lleva
+        # en 'resultados' el de cada usuario, en el mismo orden
+        solicitudes = validar_lote(mensaje)
+        self.h_lote_solicitudes.registrar(len(solicitudes))
+        log.debug('solicitud', "Procesando lote de %d solicitudes", len(solicitudes))
+
+        if not self.esperar_rol_activo():
+            self.metricas.contar_por('solicitudes', 'en_espera', len(solicitudes))
+            return {'exito': False, 'en_espera': True, 'tiempo_respuesta': time.time() - tiempo_inicio}
+
+        asignaciones = self.asignar_varias(solicitudes, limite)
+        inicio = time.perf_counter()
+        try:
+            self.publicar_varios([asignacion[3] for asignacion in asignaciones if asignacion is not None])
+        except Exception:
+            # Ningún taxi queda reservado para un usuario que recibe un error
+            self.anular_reservas(asignaciones)
+            raise
+        self.h_publicacion.registrar(time.perf_counter() - inicio)
+
+        tiempo_respuesta = time.time() - tiempo_inicio
+        resultados = []
+        for (_, id_usuario), asignacion in zip(solicitudes, asignaciones):
+            resultado = self.respuesta_asignacion(asignacion, id_usuario, tiempo_respuesta)
+            del resultado['tiempo_respuesta']
+            resultado['id_usuario'] = id_usuario
+            resultados.append(resultado)
+        return {'exito': any(resultado['exito'] for resultado in resultados), 'resultados': resultados,
+                'tiempo_respuesta': tiempo_respuesta}
+
+    def responder_solicitud(self, mensaje, limite=None):
+        # limite: instante (reloj de pared local) a partir del cual el usuario
+        # ya no espera; se vuelve a comprobar justo antes de reservar el taxi,
+        # porque la réplica puede retener la solicitud en esperar_rol_activo
+        tiempo_inicio = time.time()
+        if 'tiempo_solicitud' in mensaje:
+            self.h_recepcion.registrar(max(0.0, tiempo_inicio - mensaje['tiempo_solicitud']))
+        try:
+            if mensaje.get('tipo') == 'solicitud_lote':
+                return self.responder_lote(mensaje, tiempo_inicio, limite)
+            return self.responder_individual(mensaje, tiempo_inicio, limite)
+        except SolicitudVencida:
+            self.metricas.contar_por('solicitudes', 'vencidas')
+            log.debug('vencida', "Solicitud del Usuario %s vencida antes de reservarle un taxi",
+                      mensaje.get('id_usuario'))
+            return {'exito': False, 'vencida': True, 'tiempo_respuesta': time.time() - tiempo_inicio}
+
+    def responder_individual(self, mensaje, tiempo_inicio, limite):
+        pos_usuario, id_usuario = validar_solicitud(mensaje)
+
+        log.debug('solicitud', "Procesando solicitud del Usuario %s en posición %s", id_usuario, pos_usuario)
+
+        if not self.esperar_rol_activo():
+            # Réplica en espera con el primario activo: el usuario debe volver al primario
+            self.metricas.contar_por('solicitudes', 'en_espera')
+            return {'exito': False, 'en_espera': True, 'tiempo_respuesta': time.time() - tiempo_inicio}
+
+        if 'distancia_maxima' in mensaje or 'taxi_id' in mensaje:
+            asignacion, candidato = self.asignar_en_shard(pos_usuario, id_usuario, mensaje.get('distancia_maxima'),
+                                                          mensaje.get('taxi_id'), limite)
+        else:
+            asignacion, candidato = self.asignar_taxi(pos_usuario, id_usuario, limite), None
+        respuesta = self.notificar_asignacion(asignacion, id_usuario, time.time() - tiempo_inicio)
+        if candidato is not None:
+            respuesta['candidato'] = candidato
+        return respuesta
 
     def procesar_solicitudes_usuarios(self):
+        # Cada trabajador tiene su propio socket REP conectado al DEALER interno
+        socket_rep = self.context.socket(zmq.REP)
+        socket_rep.connect(TRABAJADORES_URL)
+
         while True:
+            mensaje = {}
             try:
-                mensaje = self.socket_rep.recv_json()
-                tiempo_inicio = time.time()
-                pos_usuario = tuple(mensaje['posicion'])
-                id_usuario = mensaje['id_usuario']
-
-                print(f"\nProcesando solicitud del Usuario {id_usuario} en posición {pos_usuario}")
-
-                taxi_id = self.encontrar_taxi_cercano(pos_usuario)
-                tiempo_respuesta = time.time() - tiempo_inicio
-
-                if taxi_id is not None:
-                    with self.lock:
-                        if not self.taxis[taxi_id]['ocupado']:
-                            self.taxis[taxi_id]['ocupado'] = True
-                            self.taxis[taxi_id]['servicios'] += 1
-                            self.taxis[taxi_id]['ultima_asignacion'] = time.time()
-                            pos_taxi = self.taxis[taxi_id]['pos']
-
-                            print(f"Servidor: Asignando Taxi {taxi_id} en {pos_taxi} al Usuario {id_usuario}")
-                            print(f"Servidor: Taxi {taxi_id} ha realizado {self.taxis[taxi_id]['servicios']} servicios")
-
-                            # Enviar notificación al taxi a través del broker
-                            mensaje_asignacion = {
-                                'tipo': 'servicio_asignado',
-                                'taxi_id': taxi_id,
-                                'pos_usuario': pos_usuario,
-                                'id_usuario': id_usuario
-                            }
-
-                            time.sleep(0.1)
-
-                            self.socket_pub.send_json(mensaje_asignacion)
-                            print(f"Servidor: Enviando asignación a través del broker para Taxi {taxi_id}")
-
-                            respuesta = {
-                                'exito': True,
-                                'taxi_id': taxi_id,
-                                'pos_taxi': pos_taxi,
-                                'tiempo_respuesta': tiempo_respuesta
-                            }
-                        else:
-                            print(f"Servidor: Taxi {taxi_id} ya fue asignado, buscando otro...")
-                            respuesta = {'exito': False, 'tiempo_respuesta': tiempo_respuesta}
+                partes = socket_rep.recv_multipart()
+                inicio = time.perf_counter()
+                # [llegada, solicitud] desde enrutar_solicitudes; sin la
+                # llegada, la solicitud cuenta como recién llegada
+                llegada = LLEGADA.unpack(partes[0])[0] if len(partes) == 2 else time.time()
+                mensaje = json.loads(partes[-1])
+                if not isinstance(mensaje, dict):
+                    raise ValueError("La solicitud debe ser un objeto JSON")
+                rechazo = self.admitir(mensaje, llegada)
+                if rechazo is not None:
+                    socket_rep.send_json(rechazo)
+                    continue
+                respuesta = self.responder_solicitud(mensaje, self.limite_de(mensaje, llegada))
+                if 'id_solicitud' in mensaje:
+                    # Los clientes asíncronos comparten un DEALER y casan respuestas por este id
+                    respuesta['id_solicitud'] = mensaje['id_solicitud']
+                envio = time.perf_counter()
+                socket_rep.send_json(respuesta)
+                fin = time.perf_counter()
+                self.h_respuesta.registrar(fin - envio)
+                self.h_solicitud.registrar(fin - inicio)
+
+            except zmq.ContextTerminated:
+                socket_rep.close()
+                return
+            except Exception as e:
+                if socket_rep.closed:
+                    return  # Contexto cerrado
+                self.metricas.contar_por('solicitudes', 'error')
+                log.error('solicitud', "Error procesando solicitud: %s", e)
+                # El REP exige responder antes de recibir la siguiente solicitud
+                try:
+                    socket_rep.send_json({'exito': False, 'error': str(e),
+                                          'id_solicitud': mensaje.get('id_solicitud')
+                                          if isinstance(mensaje, dict) else None})
+                except Exception as e:
+                    log.error('solicitud', "Error enviando la respuesta de error: %s", e)
+
+    def admitir(self, mensaje, llegada):
+        # None si la solicitud se atiende; si no, la respuesta inmediata.
+        # `llegada`: instante (reloj de pared del servidor) en que se leyó del
+        # ROUTER. Se comprueba antes de responder_solicitud, y no con
+        # self.reloj, para que repetidor.py atienda todo lo capturado
+        ahora = time.time()
+        if ahora > self.limite_de(mensaje, llegada):
+            # El usuario ya no espera la respuesta: no se le reserva un taxi
+            self.metricas.contar_por('solicitudes', 'vencidas')
+            log.debug('vencida', "Descartada solicitud vencida del Usuario %s", mensaje.get('id_usuario'))
+            return {'exito': False, 'vencida': True, 'id_solicitud': mensaje.get('id_solicitud')}
+
+        if self.max_espera_cola and ahora - llegada > self.max_espera_cola:
+            self.metricas.contar_por('solicitudes', 'sobrecargado')
+            log.debug('sobrecarga', "Solicitud del Usuario %s rechazada tras %.3f s en cola",
+                      mensaje.get('id_usuario'), ahora - llegada)
+            return {'exito': False, 'sobrecargado': True, 'reintentar_en': REINTENTO_SOBRECARGA,
+                    'id_solicitud': mensaje.get('id_solicitud')}
+        return None
+
+    def limite_de(self, mensaje, llegada):
+        # El presupuesto se cuenta desde que la solicitud llega al servidor
+        return llegada + mensaje.get('presupuesto', TIMEOUT_SOLICITUD)
+
+    def responder_error(self, partes, mensaje, error):
+        # Respuesta de error a una sola solicitud del modo lotes
+        self.metricas.contar_por('solicitudes', 'error')
+        log.error('solicitud', "Error procesando solicitud: %s", error)
+        try:
+            self.responder_por_router(partes, {'exito': False, 'error': str(error),
+                                               'id_solicitud': mensaje.get('id_solicitud')
+                                               if isinstance(mensaje, dict) else None})
+        except Exception as e:
+            log.error('solicitud', "Error enviando la respuesta de error: %s", e)
+
+    def responder_por_router(self, partes, respuesta):
+        # Se conserva el sobre de enrutamiento del ROUTER
+        datos = json.dumps(respuesta).encode('utf-8')
+        if self.captura is not None:
+            self.captura.escribir(CANAL_USUARIOS, [datos])
+        self.socket_frontend.send_multipart(partes[:-1] + [datos])
+
+    def procesar_lotes(self):
+        # Modo lotes: se leen las solicitudes directamente del ROUTER durante
+        # una ventana corta y se resuelven todas juntas
+        poller = zmq.Poller()
+        poller.register(self.socket_frontend, zmq.POLLIN)
+
+        while True:
+            try:
+                pendientes = []
+                limite = None
+                while len(pendientes) < self.max_lote:
+                    if limite is not None:
+                        restante = limite - time.time()
+                        if restante <= 0 or not poller.poll(restante * 1000):
+                            break
+                    partes = self.socket_frontend.recv_multipart()
+                    llegada = time.time()
+                    if self.captura is not None:
+                        self.captura.escribir(CANAL_USUARIOS, partes[-1:], llegada)
+                    # Cada solicitud se valida al llegar: una mal formada recibe
+                    # su error y no afecta al resto de la ventana
+                    mensaje = {}
+                    try:
+                        datos = json.loads(partes[-1])
+                        if not isinstance(datos, dict):
+                            raise ValueError("La solicitud debe ser un objeto JSON")
+                        mensaje = datos
+                        rechazo = self.admitir(mensaje, llegada)
+                        if rechazo is not None:
+                            if not rechazo.get('vencida'):
+                                self.responder_por_router(partes, rechazo)
+                            continue  # Con el ROUTER no hace falta contestar a quien ya no espera
+                        if mensaje.get('tipo') == 'solicitud_lote':
+                            # Ya viene agrupada: se resuelve al llegar, sin esperar la ventana
+                            respuesta = self.responder_solicitud(mensaje, self.limite_de(mensaje, llegada))
+                            if not respuesta.get('vencida'):
+                                respuesta['id_solicitud'] = mensaje.get('id_solicitud')
+                                self.responder_por_router(partes, respuesta)
+                            continue
+                        pos_usuario, id_usuario = validar_solicitud(mensaje)
+                    except Exception as e:
+                        self.responder_error(partes, mensaje, e)
+                        continue
+                    pendientes.append((partes, llegada, mensaje, pos_usuario, id_usuario))
+                    if limite is None:
+                        limite = llegada + self.ventana_lote
+
+                solicitudes = []
+                for _, llegada, mensaje, pos_usuario, id_usuario in pendientes:
+                    solicitudes.append((pos_usuario, id_usuario))
+                    if 'tiempo_solicitud' in mensaje:
+                        self.h_recepcion.registrar(max(0.0, llegada - mensaje['tiempo_solicitud']))
+
+                activo = self.esperar_rol_activo()
+                if activo:
+                    # La espera de la réplica puede haber agotado el presupuesto
+                    # de algunas: no se les reserva taxi ni se les contesta
+                    ahora = time.time()
+                    vigentes = [pendiente for pendiente in pendientes
+                                if self.limite_de(pendiente[2], pendiente[1]) >= ahora]
+                    if len(vigentes) < len(pendientes):
+                        self.metricas.contar_por('solicitudes', 'vencidas', len(pendientes) - len(vigentes))
+                        pendientes = vigentes
+                        solicitudes = [(pos_usuario, id_usuario) for _, _, _, pos_usuario, id_usuario in pendientes]
+                    log.debug('lote', "Resolviendo lote de %d solicitudes", len(solicitudes))
+                    asignaciones = self.asignar_lote(solicitudes)
                 else:
-                    print(f"Servidor: No hay taxis disponibles para Usuario {id_usuario}")
-                    respuesta = {'exito': False, 'tiempo_respuesta': tiempo_respuesta}
+                    asignaciones = [None] * len(solicitudes)
+
+                for (partes, llegada, mensaje, _, id_usuario), asignacion in zip(pendientes, asignaciones):
+                    try:
+                        if activo:
+                            respuesta = self.notificar_asignacion(asignacion, id_usuario, time.time() - llegada)
+                        else:
+                            respuesta = {'exito': False, 'en_espera': True,
+                                         'tiempo_respuesta': time.time() - llegada}
+                        if mensaje.get('id_solicitud') is not None:
+                            respuesta['id_solicitud'] = mensaje['id_solicitud']
+                        envio = time.perf_counter()
+                        self.responder_por_router(partes, respuesta)
+                        self.h_respuesta.registrar(time.perf_counter() - envio)
+                        self.h_solicitud.registrar(time.time() - llegada)
+                    except Exception as e:
+                        self.responder_error(partes, mensaje, e)
 
-                print(f"Servidor: Enviando asignación para Usuario {id_usuario}")
-                self.socket_rep.send_json(respuesta)
+            except Exception as e:
+                self.metricas.contar_por('solicitudes', 'error')
+                log.error('lote', "Error procesando lote de solicitudes: %s", e)
+
+    def aplicar_mensaje(self, mensaje):
+        # Debe llamarse con self.lock adquirido
+        self.metricas.contar_por('mensajes', mensaje.get('tipo'))
+        if mensaje.get('tipo') == 'registro':
+            taxi_id = mensaje['id']
+            if taxi_id in self.taxis:
+                # Registro repetido (p. ej. la instantánea del broker al suscribirse
+                # otro servidor): no se pisa el estado; el taxi publica su posición
+                # justo después de registrarse, y esa actualización es la que manda
+                return
+            pos = tuple(mensaje['posicion'])
+            self.taxis.registrar(taxi_id, pos, mensaje.get('velocidad', 0))
+            self.actualizar_disponibilidad(taxi_id, self.taxis.info(taxi_id), self.reloj())
+            self.persistir('registro', taxi_id)
+            log.info('registro', "Registrado nuevo Taxi %d en posición %s (%d taxis registrados)",
+                     taxi_id, pos, len(self.taxis), taxi_id=taxi_id)
+
+        elif mensaje.get('tipo') == 'servicio_asignado':
+            self.replicar_asignacion(mensaje)
+
+        elif mensaje.get('tipo') == 'actualizacion':
+            taxi_id = mensaje['id']
+            if taxi_id not in self.taxis and self.particion is not None:
+                # Taxi que llega desde otra región: se da de alta con el estado que publica.
+                # Su última asignación la conoce solo el shard de origen: si ya hizo
+                # algún servicio se cuenta desde ahora, para no saltarse la espera
+                ultima_asignacion = self.reloj() if mensaje.get('servicios', 0) > 0 else 0.0
+                self.taxis.registrar(taxi_id, tuple(mensaje['posicion']), ultima_asignacion=ultima_asignacion)
+            if taxi_id in self.taxis:
+                instante = mensaje.get('timestamp') or None
+                if instante is not None and instante < self.taxis.ultima_actualizacion_de(taxi_id):
+                    # Llegó desordenada: ya se aplicó una posición más reciente del taxi
+                    self.contadores['obsoletas'] += 1
+                    return
+                ocupado = mensaje.get('ocupado', False)
+                servicios = mensaje.get('servicios', 0)
+                # 'confirmada': una actualización fusionada del mismo lote ya confirmaba la asignación
+                if ((ocupado or mensaje.get('confirmada')) and
+                        self.asignaciones_pendientes.pop(taxi_id, None) is not None):
+                    log.debug('confirmacion', "Taxi %d confirmó la asignación", taxi_id)
+                elif taxi_id in self.asignaciones_pendientes:
+                    # El taxi aún no ha visto la asignación: se mantiene reservado
+                    ocupado = True
+                    servicios = max(servicios, self.taxis.info(taxi_id)['servicios'])
+                self.taxis.actualizar(taxi_id, pos=tuple(mensaje['posicion']), ocupado=ocupado,
+                                      servicios=servicios, instante=instante)
+                self.actualizar_disponibilidad(taxi_id, self.taxis.info(taxi_id), self.reloj())
+                self.persistir('actualizacion', taxi_id)
+                self.contadores['aplicadas'] += 1
+            else:
+                log.warning('taxi_desconocido', "Recibida actualización de taxi no registrado %d", taxi_id)
+
+    def fusionar_actualizaciones(self, mensajes):
+        # Deja solo la actualización más reciente (por timestamp) de cada taxi
+        # en la posición de la última recibida; el resto de mensajes conserva su orden
+        resultado = []
+        posiciones = {}  # {id_taxi: índice en resultado de su actualización}
+        for mensaje in mensajes:
+            if mensaje.get('tipo') != 'actualizacion':
+                resultado.append(mensaje)
+                continue
+            self.contadores['recibidas'] += 1
+            indice = posiciones.get(mensaje.get('id'))
+            if indice is not None:
+                anterior = resultado[indice]
+                self.contadores['fusionadas'] += 1
+                if mensaje.get('timestamp', 0.0) < anterior.get('timestamp', 0.0):
+                    # Llegó desordenada dentro del lote: se queda la que ya había
+                    if mensaje.get('ocupado'):
+                        anterior['confirmada'] = True
+                    continue
+                if anterior.get('ocupado') or anterior.get('confirmada'):
+                    mensaje['confirmada'] = True
+                resultado[indice] = None
+            posiciones[mensaje.get('id')] = len(resultado)
+            resultado.append(mensaje)
+        return [mensaje for mensaje in resultado if mensaje is not None]
+
+    def contar_error_actualizacion(self, formato, *args):
+        self.contadores['errores'] += 1
+        self.metricas.contar_por('mensajes', 'error')
+        log.error('actualizacion', formato, *args)
+
+    def decodificar_actualizaciones(self, datos):
+        # Mensajes contenidos en una trama del broker, deshaciendo los lotes de
+        # la flota. Una trama que no se puede decodificar se descarta sola,
+        # sin perder lo demás que se haya recibido con ella
+        try:
+            mensajes = protocolo.desagrupar(protocolo.decodificar(datos))
+        except Exception as e:
+            self.contar_error_actualizacion("Trama de actualizaciones descartada: %s", e)
+            return []
+        validos = [mensaje for mensaje in mensajes if isinstance(mensaje, dict)]
+        if len(validos) < len(mensajes):
+            self.contar_error_actualizacion("%d mensajes de un lote no son objetos", len(mensajes) - len(validos))
+        return validos
 
+    def aplicar_actualizaciones(self, mensajes):
+        # Con el lock tomado; un mensaje que falla no impide aplicar el resto
+        for mensaje in mensajes:
+            try:
+                self.aplicar_mensaje(mensaje)
             except Exception as e:
-                print(f"Error procesando solicitud: {e}")
+                self.contar_error_actualizacion("Error aplicando mensaje del Taxi %s: %s", mensaje.get('id'), e)
+
+    def recibir_pendientes(self):
+        # Saca de la cola sin bloquear todo lo que ya haya llegado (hasta
+        # MAX_ACTUALIZACIONES_LOTE mensajes)
+        mensajes = self.decodificar_actualizaciones(self.socket_sub.recv_multipart()[-1])
+        while len(mensajes) < MAX_ACTUALIZACIONES_LOTE:
+            try:
+                partes = self.socket_sub.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                self.ultima_cola_vacia = time.time()
+                break
+            mensajes.extend(self.decodificar_actualizaciones(partes[-1]))
+        return mensajes
+
+    def mostrar_estadisticas_actualizaciones(self):
+        c = self.contadores
+        if c['recibidas']:
+            log.info('estadisticas', "%d actualizaciones recibidas en %d lotes, %d aplicadas, %d fusionadas "
+                     "(%.1f%%), %d obsoletas descartadas, %d errores", c['recibidas'], c['lotes'], c['aplicadas'],
+                     c['fusionadas'], 100 * c['fusionadas'] / c['recibidas'], c['obsoletas'], c['errores'], **c)
+        with self.lock:
+            estados = self.disponibilidad.resumen()
+        if estados:
+            log.info('disponibilidad', "Disponibilidad de la flota: %s",
+                     ', '.join(f'{estado} {total}' for estado, total in sorted(estados.items())), **estados)
+
     def procesar_actualizaciones_taxis(self):
+        ultimo_resumen = time.time()
         while True:
             try:
-                mensaje = self.socket_sub.recv_json()
-                #print(f"Servidor: Mensaje recibido: {mensaje}")  # Debug
+                if time.time() - ultimo_resumen >= INTERVALO_ESTADISTICAS:
+                    ultimo_resumen = time.time()
+                    self.mostrar_estadisticas_actualizaciones()
+                if not self.socket_sub.poll(INTERVALO_LATIDO * 1000 / 5):
+                    self.ultima_cola_vacia = time.time()
+                    if self.consultas is not None and self.consultas.toca_copiar():
+                        # Sin actualizaciones no hay lote: las asignaciones también cambian la flota
+                        with self.lock:
+                            self.consultas.copiar()
+                    continue
+                mensajes = self.fusionar_actualizaciones(self.recibir_pendientes())
+                self.h_lote_actualizaciones.registrar(len(mensajes))
 
+                # Todo lo acumulado se aplica con una sola adquisición del lock
+                inicio = time.perf_counter()
                 with self.lock:
-                    if mensaje.get('tipo') == 'registro':
-                        taxi_id = mensaje['id']
-                        self.taxis[taxi_id] = {
-                            'pos': tuple(mensaje['posicion']),
-                            'ocupado': False,
-                            'servicios': 0,
-                            'velocidad': mensaje.get('velocidad', 0)
-                        }
-                        print(f"\nServidor: REGISTRADO nuevo Taxi {taxi_id} en posición {mensaje['posicion']}")
-                        # Imprimir taxis registrados para debug
-                        print(f"Servidor: Taxis registrados actualmente: {list(self.taxis.keys())}")
-
-                    elif mensaje.get('tipo') == 'actualizacion':
-                        taxi_id = mensaje['id']
-                        if taxi_id in self.taxis:
-                            self.taxis[taxi_id].update({
-                                'pos': tuple(mensaje['posicion']),
-                                'ocupado': mensaje.get('ocupado', False),
-                                'servicios': mensaje.get('servicios', 0)
-                            })
-                            print(f"Servidor: Actualizada posición del Taxi {taxi_id} a {mensaje['posicion']}")
-                        else:
-                            print(f"Servidor: Recibida actualización de taxi no registrado {taxi_id}")
+                    adquirido = time.perf_counter()
+                    self.contadores['lotes'] += 1
+                    self.aplicar_actualizaciones(mensajes)
+                    # Las esperas vencidas se aplican aquí para que a las
+                    # solicitudes les quede el menor trabajo posible
+                    self.disponibilidad.vencer(self.reloj())
+                    if self.consultas is not None and self.consultas.toca_copiar():
+                        # Con el lock ya tomado: las consultas no lo piden nunca
+                        self.consultas.copiar()
+                self.h_espera_lock_actualizaciones.registrar(adquirido - inicio)
+                self.h_aplicar_lote.registrar(time.perf_counter() - adquirido)
 
             except Exception as e:
-                print(f"Error procesando mensaje en servidor: {e}")
+                self.metricas.contar_por('mensajes', 'error')
+                log.error('actualizacion', "Error procesando mensaje en servidor: %s", e)
 
-    def iniciar(self):
-        thread_usuarios = threading.Thread(target=self.procesar_solicitudes_usuarios)
-        thread_taxis = threading.Thread(target=self.procesar_actualizaciones_taxis)
+    def enrutar_solicitudes(self):
+        # Como zmq.proxy(frontend, backend, captura), pero cada solicitud sale
+        # hacia los trabajadores con su instante de llegada delante. Se mueven
+        # de una vez todas las que esperan (hasta MAX_ENRUTADOS) con un mismo
+        # instante, tomado antes de leerlas. Con las colas de los trabajadores
+        # llenas no se lee más del ROUTER, pero se siguen devolviendo respuestas
+        frontend, backend, captura = self.socket_frontend, self.socket_backend, self.socket_captura
+        poller = zmq.Poller()
+        retenida = None   # Solicitud leída que los trabajadores aún no admiten
+        try:
+            while True:
+                poller.register(frontend, 0 if retenida else zmq.POLLIN)
+                poller.register(backend, zmq.POLLIN | (zmq.POLLOUT if retenida else 0))
+                eventos = dict(poller.poll())
+                if eventos.get(backend, 0) & zmq.POLLIN:
+                    for _ in range(MAX_ENRUTADOS):
+                        try:
+                            partes = backend.recv_multipart(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        if captura is not None:
+                            captura.send_multipart(partes)
+                        frontend.send_multipart(partes)
+                if retenida is not None:
+                    try:
+                        backend.send_multipart(retenida, zmq.NOBLOCK)
+                        retenida = None
+                    except zmq.Again:
+                        continue
+                if frontend in eventos:
+                    llegada = LLEGADA.pack(time.time())
+                    for _ in range(MAX_ENRUTADOS):
+                        try:
+                            partes = frontend.recv_multipart(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        if captura is not None:
+                            captura.send_multipart(partes)
+                        try:
+                            backend.send_multipart(partes[:-1] + [llegada, partes[-1]], zmq.NOBLOCK)
+                        except zmq.Again:
+                            retenida = partes[:-1] + [llegada, partes[-1]]
+                            break
+        except zmq.ContextTerminated:
+            # Nadie más usa estos sockets: se cierran para que termine el contexto
+            for socket in (frontend, backend, captura):
+                if socket is not None:
+                    socket.close()
 
-        thread_usuarios.daemon = True
-        thread_taxis.daemon = True
+    def iniciar(self):
+        hilos = [
+            threading.Thread(target=self.procesar_actualizaciones_taxis),
+            threading.Thread(target=self.reenviar_asignaciones_pendientes),
+            threading.Thread(target=self.publicar_latidos)
+        ]
+        if self.replica:
+            hilos.append(threading.Thread(target=self.vigilar_primario))
+        if self.almacen is not None:
+            hilos.append(threading.Thread(target=self.guardar_instantaneas))
+        if self.modo == 'lotes':
+            hilos.append(threading.Thread(target=self.procesar_lotes))
+        else:
+            hilos.append(threading.Thread(target=self.enrutar_solicitudes))
+            hilos += [threading.Thread(target=self.procesar_solicitudes_usuarios)
+                      for _ in range(self.num_trabajadores)]
 
-        thread_usuarios.start()
-        thread_taxis.start()
+        for hilo in hilos:
+            hilo.daemon = True
+            hilo.start()
+        if self.socket_captura is not None:
+            self.captura.escuchar(self.context, CAPTURA_URL, CANAL_USUARIOS)
+        if self.captura is not None:
+            log.info('inicio', "Capturando solicitudes y respuestas en %s", self.captura.ruta)
+        if self.puerto_metricas is not None:
+            ServidorMetricas(self.metricas, self.puerto_metricas).start()
+            log.info('inicio', "Métricas en el puerto %d", self.puerto_metricas)
+        if self.puerto_consultas is not None:
+            self.consultas = ServidorConsultas(self, self.puerto_consultas, self.intervalo_consultas)
+            self.consultas.iniciar()
 
-        print("Servidor central iniciado...")
+        if self.replica:
+            log.info('inicio', "Réplica del servidor central en espera en el puerto %d", USUARIO_REPLICA_PORT)
+        if self.particion is not None:
+            log.info('inicio', "Shard de la región %d %s en el puerto %d", self.region,
+                     self.particion.limites(self.region), SHARD_BASE_PORT + self.region)
+        if self.modo == 'lotes':
+            log.info('inicio', "Servidor central iniciado en modo lotes (ventana %.0f ms, máximo %d solicitudes)...",
+                     self.ventana_lote * 1000, self.max_lote)
+        else:
+            log.info('inicio', "Servidor central iniciado con %d trabajadores...", self.num_trabajadores)
+        if self.taxis.compartida:
+            log.info('inicio', "Tabla de la flota en memoria compartida: %s", self.taxis.nombre)
         try:
             while True:
                 time.sleep(1)
         except KeyboardInterrupt:
-            print("Cerrando servidor central...")
+            log.info('fin', "Cerrando servidor central...")
+            if self.almacen is not None:
+                with self.lock:
+                    self.almacen.guardar_instantanea(self.taxis.copia())
+                self.almacen.cerrar()
+            if self.captura is not None:
+                self.captura.cerrar()
+            self.taxis.cerrar()
 
 
 def main():
-    servidor = ServidorCentral(100, 100)  # Ejemplo con ciudad 100x100
+    parser = argparse.ArgumentParser(description="Servidor central de asignación de taxis")
+    parser.add_argument('--trabajadores', type=int, default=4,
+                        help="Hilos que atienden solicitudes de usuarios en paralelo")
+    parser.add_argument('--modo', choices=['individual', 'lotes'], default='individual',
+                        help="Asignar cada solicitud por separado o resolver lotes de solicitudes")
+    parser.add_argument('--ventana-lote', type=float, default=50,
+                        help="Milisegundos que se acumulan solicitudes en modo lotes")
+    parser.add_argument('--max-lote', type=int, default=64,
+                        help="Máximo de solicitudes por lote")
+    parser.add_argument('--estado', default=None,
+                        help="Archivo SQLite donde persistir el estado de la flota")
+    parser.add_argument('--replica', action='store_true',
+                        help="Arrancar como réplica en espera que sustituye al primario si cae")
+    parser.add_argument('--region', type=int, default=None,
+                        help="Atender solo esta región de la partición REGIONES_CIUDAD (modo shard)")
+    parser.add_argument('--memoria-compartida', type=int, default=None, metavar='CAPACIDAD',
+                        help="Guardar la tabla de la flota (hasta CAPACIDAD taxis) en memoria compartida")
+    parser.add_argument('--ttl-taxis', type=float, default=None, metavar='SEGUNDOS',
+                        help="Dejar de asignar taxis que llevan este tiempo sin publicar "
+                             "(los taxis con velocidad 0 no publican mientras están parados)")
+    parser.add_argument('--max-espera-cola', type=float, default=MAX_ESPERA_COLA,
+                        help="Segundos de espera en cola a partir de los cuales las solicitudes se "
+                             "rechazan con 'sobrecargado' (0: sin límite)")
+    parser.add_argument('--captura', default=None, metavar='ARCHIVO',
+                        help="Guardar cada solicitud de usuario y su respuesta para repetidor.py; ver captura.py")
+    parser.add_argument('--metricas', action='store_true',
+                        help="Atender consultas de métricas y perfiles en METRICAS_BASE_PORT + 1 "
+                             "(+2 la réplica, +10 + región un shard); ver metricas.py")
+    parser.add_argument('--consultas', action='store_true',
+                        help="Atender consultas de solo lectura de la flota en CONSULTAS_BASE_PORT + 1 "
+                             "(+2 la réplica, +10 + región un shard); ver consultas.py")
+    parser.add_argument('--intervalo-consultas', type=float, default=INTERVALO_CONSULTAS, metavar='SEGUNDOS',
+                        help="Segundos entre las instantáneas de la flota que usan las consultas")
+    args = parser.parse_args()
+
+    N, M = 100, 100  # Ejemplo con ciudad 100x100
+    particion = None
+    if args.region is not None:
+        particion = particiones.desde_entorno(N, M)
+        if particion is None or not 0 <= args.region < len(particion):
+            print("--region requiere REGIONES_CIUDAD (por ejemplo 2x2) y una región existente")
+            return
+        if args.modo == 'lotes' or args.replica:
+            print("Un shard solo admite el modo individual y no tiene réplica")
+            return
+
+    puerto_metricas = None
+    if args.metricas:
+        if args.region is not None:
+            puerto_metricas = METRICAS_BASE_PORT + 10 + args.region
+        else:
+            puerto_metricas = METRICAS_BASE_PORT + (2 if args.replica else 1)
+    puerto_consultas = None
+    if args.consultas:
+        if args.region is not None:
+            puerto_consultas = CONSULTAS_BASE_PORT + 10 + args.region
+        else:
+            puerto_consultas = CONSULTAS_BASE_PORT + (2 if args.replica else 1)
+
+    servidor = ServidorCentral(N, M, num_trabajadores=args.trabajadores,
+                               modo=args.modo, ventana_lote=args.ventana_lote / 1000,
+                               max_lote=args.max_lote, ruta_estado=args.estado,
+                               replica=args.replica, memoria_compartida=args.memoria_compartida,
+                               particion=particion, region=args.region, ttl_taxis=args.ttl_taxis,
+                               puerto_metricas=puerto_metricas, captura=args.captura,
+                               max_espera_cola=args.max_espera_cola, puerto_consultas=puerto_consultas,
+                               intervalo_consultas=args.intervalo_consultas)
     servidor.iniciar()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
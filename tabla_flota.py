@@ -0,0 +1,229 @@
+# tabla_flota.py
+# Tabla compacta con el estado de la flota del servidor central.
+#
+# Cada campo es una columna contigua de NumPy (35 bytes por taxi en total,
+# frente a varios cientos de un dict por taxi) y un índice {id: fila} da la
+# fila de cada taxi. Las columnas se recorren con operaciones vectorizadas,
+# por ejemplo para buscar el taxi elegible más cercano sin un bucle de Python.
+#
+# Todas las columnas comparten un único buffer. Con compartida=True ese
+# buffer es un segmento de memoria compartida: otros procesos lo abren con
+# TablaFlota.adjuntar(nombre) y leen la tabla sin copiarla. El segmento
+# empieza con el número de filas en uso, que solo se incrementa después de
+# escribir la fila nueva.
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# De mayor a menor tamaño para que cada columna quede alineada en el buffer
+COLUMNAS = [
+    ('id', np.dtype('<i8')),
+    ('ultima_asignacion', np.dtype('<f8')),
+    ('ultima_actualizacion', np.dtype('<f8')),  # timestamp de la última actualización aplicada
+    ('x', np.dtype('<i4')),
+    ('y', np.dtype('<i4')),
+    ('ocupado', np.dtype('?')),
+    ('servicios', np.dtype('u1')),
+    ('velocidad', np.dtype('u1')),
+]
+BYTES_POR_TAXI = sum(tipo.itemsize for _, tipo in COLUMNAS)
+CABECERA = np.dtype('<i8')  # Filas en uso
+DISTANCIA_INFINITA = np.iinfo(np.int64).max
+
+
+def _tamano(capacidad):
+    return CABECERA.itemsize + capacidad * BYTES_POR_TAXI
+
+
+def _capacidad(tamano):
+    return (tamano - CABECERA.itemsize) // BYTES_POR_TAXI
+
+
+class TablaFlota:
+    def __init__(self, capacidad=1024, compartida=False, nombre=None):
+        self.compartida = compartida
+        self.memoria = None
+        self.filas = {}  # {id_taxi: fila}
+        self._reservar(capacidad, nombre)
+
+    def _reservar(self, capacidad, nombre=None):
+        if self.compartida:
+            self.memoria = shared_memory.SharedMemory(name=nombre, create=True, size=_tamano(capacidad))
+            buffer = self.memoria.buf
+        else:
+            buffer = bytearray(_tamano(capacidad))
+        self._ver_columnas(buffer, capacidad)
+        self.cabecera[0] = 0
+        self.id[:] = -1
+
+    def _ver_columnas(self, buffer, capacidad):
+        self.buffer = buffer
+        self.capacidad = capacidad
+        self.cabecera = np.ndarray(1, dtype=CABECERA, buffer=buffer)
+        desplazamiento = CABECERA.itemsize
+        for nombre, tipo in COLUMNAS:
+            setattr(self, nombre, np.ndarray(capacidad, dtype=tipo, buffer=buffer, offset=desplazamiento))
+            desplazamiento += capacidad * tipo.itemsize
+
+    @classmethod
+    def adjuntar(cls, nombre):
+        # Vista de solo lectura de una tabla creada en otro proceso
+        tabla = cls.__new__(cls)
+        tabla.compartida = True
+        # Un proceso independiente arranca su propio rastreador de recursos,
+        # que borraría el segmento al salir aunque no sea su dueño. Los hijos
+        # de multiprocessing comparten el del padre y no deben tocarlo
+        rastreador_propio = resource_tracker._resource_tracker._fd is None
+        tabla.memoria = shared_memory.SharedMemory(name=nombre)
+        if rastreador_propio:
+            resource_tracker.unregister(tabla.memoria._name, 'shared_memory')
+        tabla._ver_columnas(tabla.memoria.buf, _capacidad(tabla.memoria.size))
+        for columna, _ in COLUMNAS:
+            getattr(tabla, columna).flags.writeable = False
+        tabla.filas = None
+        return tabla
+
+    def copia(self):
+        # Copia de solo lectura hecha con una sola copia del buffer. actualizar()
+        # escribe cada columna por separado (x e y incluidas), así que para que
+        # cada fila sea coherente hay que copiar con el lock del servidor
+        datos = bytes(self.buffer)
+        tabla = TablaFlota.__new__(TablaFlota)
+        tabla.compartida = False
+        tabla.memoria = None
+        tabla.filas = None
+        tabla._ver_columnas(datos, _capacidad(len(datos)))
+        return tabla
+
+    @property
+    def nombre(self):
+        return self.memoria.name if self.memoria is not None else None
+
+    def cerrar(self):
+        # En el proceso dueño además se borra el segmento compartido
+        if self.memoria is not None:
+            del self.cabecera
+            del self.buffer
+            for columna, _ in COLUMNAS:
+                delattr(self, columna)
+            self.memoria.close()
+            if self.filas is not None:
+                self.memoria.unlink()
+            self.memoria = None
+
+    def __len__(self):
+        return int(self.cabecera[0])
+
+    def __contains__(self, id_taxi):
+        return id_taxi in self.filas
+
+    def columna(self, nombre):
+        # Vista (sin copia) de la columna restringida a las filas en uso
+        return getattr(self, nombre)[:len(self)]
+
+    def _fila_nueva(self):
+        n = len(self)
+        if n == self.capacidad:
+            if self.compartida:
+                # Los lectores ya tienen abierto el segmento: no se puede reubicar
+                raise ValueError(f"Tabla de flota llena ({n} taxis); aumente la capacidad")
+            anteriores = {columna: getattr(self, columna)[:n].copy() for columna, _ in COLUMNAS}
+            self._reservar(max(2 * n, 1))
+            for columna, valores in anteriores.items():
+                getattr(self, columna)[:n] = valores
+            self.cabecera[0] = n
+        return n
+
+    def registrar(self, id_taxi, pos, velocidad=0, ocupado=False, servicios=0, ultima_asignacion=0.0):
+        fila = self.filas.get(id_taxi)
+        nueva = fila is None
+        if nueva:
+            fila = self._fila_nueva()
+        self.id[fila] = id_taxi
+        self.x[fila], self.y[fila] = pos
+        self.ocupado[fila] = ocupado
+        self.servicios[fila] = servicios
+        self.velocidad[fila] = velocidad
+        self.ultima_asignacion[fila] = ultima_asignacion
+        self.ultima_actualizacion[fila] = 0.0
+        if nueva:
+            self.filas[id_taxi] = fila
+            self.cabecera[0] = fila + 1
+
+    def cargar(self, taxis):
+        # Carga en bloque un {id: info} como el que devuelve AlmacenEstado.cargar()
+        for id_taxi, info in taxis.items():
+            self.registrar(id_taxi, info['pos'], info.get('velocidad', 0), info['ocupado'],
+                           info['servicios'], info.get('ultima_asignacion', 0.0))
+
+    def actualizar(self, id_taxi, pos=None, ocupado=None, servicios=None, instante=None):
+        fila = self.filas[id_taxi]
+        if instante is not None:
+            self.ultima_actualizacion[fila] = instante
+        if pos is not None:
+            self.x[fila], self.y[fila] = pos
+        if ocupado is not None:
+            self.ocupado[fila] = ocupado
+        if servicios is not None:
+            self.servicios[fila] = servicios
+
+    def reservar(self, id_taxi, instante):
+        # Marca el taxi como ocupado por una nueva asignación y devuelve sus servicios
+        fila = self.filas[id_taxi]
+        self.ocupado[fila] = True
+        self.servicios[fila] += 1
+        self.ultima_asignacion[fila] = instante
+        return int(self.servicios[fila])
+
+    def anular_reserva(self, id_taxi, instante_anterior):
+        # Deshace reservar() para una asignación que no llegó a publicarse
+        fila = self.filas[id_taxi]
+        self.ocupado[fila] = False
+        self.servicios[fila] -= 1
+        self.ultima_asignacion[fila] = instante_anterior
+
+    def info(self, id_taxi):
+        fila = self.filas[id_taxi]
+        return {'pos': (int(self.x[fila]), int(self.y[fila])), 'ocupado': bool(self.ocupado[fila]),
+                'servicios': int(self.servicios[fila]),
+                'ultima_asignacion': float(self.ultima_asignacion[fila]),
+                'velocidad': int(self.velocidad[fila])}
+
+    def posicion(self, id_taxi):
+        fila = self.filas[id_taxi]
+        return int(self.x[fila]), int(self.y[fila])
+
+    def ultima_asignacion_de(self, id_taxi):
+        return float(self.ultima_asignacion[self.filas[id_taxi]])
+
+    def ultima_actualizacion_de(self, id_taxi):
+        return float(self.ultima_actualizacion[self.filas[id_taxi]])
+
+    def items(self):
+        # (id, info) de cada taxi, con el mismo formato de dict que info()
+        columnas = [self.columna(nombre).tolist() for nombre in
+                    ('id', 'x', 'y', 'ocupado', 'servicios', 'ultima_asignacion', 'velocidad')]
+        for id_taxi, x, y, ocupado, servicios, ultima_asignacion, velocidad in zip(*columnas):
+            yield id_taxi, {'pos': (x, y), 'ocupado': ocupado, 'servicios': servicios,
+                            'ultima_asignacion': ultima_asignacion, 'velocidad': velocidad}
+
+    def elegibles(self, tiempo_actual=None, espera=0.0):
+        # Máscara de los taxis que pueden recibir un servicio; con
+        # tiempo_actual se excluyen los asignados hace menos de `espera` segundos
+        mascara = ~self.columna('ocupado') & (self.columna('servicios') < 3)
+        if tiempo_actual is not None:
+            mascara &= (tiempo_actual - self.columna('ultima_asignacion')) > espera
+        return mascara
+
+    def mas_cercano(self, pos, tiempo_actual=None, espera=0.0):
+        # Recorrido vectorizado de toda la tabla: (id_taxi, distancia) del
+        # taxi elegible más cercano en distancia Manhattan, en empate el id menor
+        distancias = (np.abs(self.columna('x') - np.int64(pos[0])) +
+                      np.abs(self.columna('y') - np.int64(pos[1])))
+        distancias[~self.elegibles(tiempo_actual, espera)] = DISTANCIA_INFINITA
+        if not len(distancias):
+            return None, None
+        minima = distancias.min()
+        if minima == DISTANCIA_INFINITA:
+            return None, None
+        return int(self.columna('id')[distancias == minima].min()), int(minima)
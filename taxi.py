@@ -1,9 +1,16 @@
 # taxi.py
+import argparse
+import os
 import zmq
 import time
-import sys
 import random
 
+import enrutamiento
+import particion
+import protocolo
+from bitacora import Bitacora
+from metricas import Metricas, ServidorMetricas
+
 # Direcciones IP de los componentes
 BROKER_IP = "127.0.0.1"       # IP del broker
 SERVIDOR_IP = "127.0.0.1"    # IP del servidor central
@@ -14,6 +21,11 @@ USUARIO_IP = "127.0.0.1"     # IP base para usuarios
 BROKER_FRONTEND_PORT = 5559       # Para publicadores (taxis y servidor)
 BROKER_BACKEND_PORT = 5560        # Para suscriptores (taxis y servidor)
 USUARIO_SERVER_PORT = 5555        # Para comunicación usuario-servidor
+USUARIO_REPLICA_PORT = 5556       # Para comunicación usuario-réplica del servidor
+SHARD_BASE_PORT = 5600            # Para comunicación frente-shards (5600 + región)
+METRICAS_BASE_PORT = 5700         # Para consultar métricas (5700 broker, 5701 servidor, 5702 réplica, 5710 + región shards)
+BROKER_FORWARDERS_BASE_PORT = 5800 # Reenviadores del broker en modo clúster (5800 + 2i, 5801 + 2i); ver enrutamiento.py
+CONSULTAS_BASE_PORT = 5900         # Para consultas de la flota (5901 servidor, 5902 réplica, 5910 + región shards); ver consultas.py
 
 # Configuraciones completas
 BROKER_FRONTEND_URL = f"tcp://*:{BROKER_FRONTEND_PORT}"
@@ -21,10 +33,31 @@ BROKER_BACKEND_URL = f"tcp://*:{BROKER_BACKEND_PORT}"
 BROKER_FRONTEND_CONNECT = f"tcp://{BROKER_IP}:{BROKER_FRONTEND_PORT}"
 BROKER_BACKEND_CONNECT = f"tcp://{BROKER_IP}:{BROKER_BACKEND_PORT}"
 USUARIO_SERVER_URL = f"tcp://{SERVIDOR_IP}:{USUARIO_SERVER_PORT}"
+USUARIO_REPLICA_URL = f"tcp://{SERVIDOR_IP}:{USUARIO_REPLICA_PORT}"
+
+# Tiempos de la simulación; ESCALA_TIEMPO > 1 los acorta para pruebas de carga
+ESCALA_TIEMPO = float(os.environ.get('ESCALA_TIEMPO', '1'))
+DURACION_SERVICIO = 30 / ESCALA_TIEMPO       # Segundos que dura un servicio
+INTERVALO_MOVIMIENTO = 30 / ESCALA_TIEMPO    # Segundos (30 minutos simulados) entre movimientos
+
+LIMITE_COLA_MENSAJES = 10000   # SNDHWM/RCVHWM de los sockets con el broker
 
 class Taxi:
-    def __init__(self, id_taxi, N, M, pos_inicial, velocidad):
+    def __init__(self, id_taxi, N, M, pos_inicial, velocidad, puerto_metricas=None, semilla=None):
         self.id = id_taxi
+        # Con semilla los movimientos del taxi se repiten de una ejecución a otra
+        self.rng = random.Random(None if semilla is None else f"{semilla}.{id_taxi}")
+        self.log = Bitacora('Taxi', f"Taxi {id_taxi}")
+        self.metricas = Metricas(f"Taxi {id_taxi}")
+        self.h_publicacion = self.metricas.histograma('publicacion')
+        # Desde que llega una asignación hasta que sale la confirmación
+        self.h_confirmacion = self.metricas.histograma('confirmacion')
+        # Retraso con que se atiende un fin de servicio o un movimiento respecto a lo programado
+        self.h_retraso_evento = self.metricas.histograma('retraso_evento')
+        self.metricas.indicador('servicios', lambda: self.servicios)
+        self.metricas.indicador('ocupado', lambda: self.ocupado)
+        if puerto_metricas is not None:
+            ServidorMetricas(self.metricas, puerto_metricas).start()
         self.N = N
         self.M = M
         self.posicion = pos_inicial
@@ -33,19 +66,30 @@ class Taxi:
         self.servicios = 0
         self.ocupado = False
         self.ultima_actualizacion = time.time()
+        self.asignaciones_atendidas = set()  # El servidor reenvía cada asignación hasta que se confirma
+        self.fin_servicio = None
+        self.particion = particion.desde_entorno(N, M)  # None si la ciudad no está dividida en regiones
+        self.region_publicada = None
 
         self.context = zmq.Context()
+        # Con el broker en modo clúster todo lo del taxi pasa por un solo reenviador
+        tabla = enrutamiento.desde_entorno(BROKER_IP, BROKER_FRONTEND_PORT, BROKER_BACKEND_PORT,
+                                           BROKER_FORWARDERS_BASE_PORT)
+        forwarder = tabla.forwarder_de(self.id)
 
         # Socket para publicar posiciones al broker
         self.socket_pub = self.context.socket(zmq.PUB)
-        self.socket_pub.connect(BROKER_FRONTEND_CONNECT) # 5559
+        self.socket_pub.setsockopt(zmq.SNDHWM, LIMITE_COLA_MENSAJES)
+        self.socket_pub.connect(tabla.frontend(forwarder)) # 5559
 
         time.sleep(1)
 
         # Socket para recibir asignaciones a través del broker
         self.socket_sub = self.context.socket(zmq.SUB)
-        self.socket_sub.connect(BROKER_BACKEND_CONNECT) # 5560
-        self.socket_sub.setsockopt_string(zmq.SUBSCRIBE, "")
+        self.socket_sub.setsockopt(zmq.RCVHWM, LIMITE_COLA_MENSAJES)
+        self.socket_sub.connect(tabla.backend(forwarder)) # 5560
+        # Solo interesan las asignaciones dirigidas a este taxi
+        self.socket_sub.setsockopt(zmq.SUBSCRIBE, protocolo.topico_asignacion(self.id))
 
         time.sleep(1)
 
@@ -56,8 +100,23 @@ class Taxi:
             'posicion': self.posicion,
             'velocidad': self.velocidad
         }
-        self.socket_pub.send_json(mensaje_registro)
-        print(f"Taxi {self.id}: Registrado en el sistema en posición {self.posicion}")
+        self.enviar(mensaje_registro)
+        self.log.info('registro', "Registrado en el sistema en posición %s", self.posicion)
+
+    def enviar(self, mensaje):
+        inicio = time.perf_counter()
+        self.metricas.contar_por('publicaciones', mensaje['tipo'])
+        if self.particion is None:
+            self.socket_pub.send_multipart(protocolo.empaquetar(mensaje))
+        else:
+            # Con la ciudad dividida, el mensaje va al tópico de la región del taxi;
+            # al cambiar de región se avisa también a la anterior para que lo suelte
+            region = self.particion.region_de(self.posicion)
+            if self.region_publicada is not None and self.region_publicada != region:
+                self.socket_pub.send_multipart(protocolo.empaquetar(mensaje, region=self.region_publicada))
+            self.socket_pub.send_multipart(protocolo.empaquetar(mensaje, region=region))
+            self.region_publicada = region
+        self.h_publicacion.registrar(time.perf_counter() - inicio)
 
     def publicar_posicion(self):
         tiempo_actual = time.time()
@@ -69,8 +128,9 @@ class Taxi:
             'servicios': self.servicios,
             'timestamp': tiempo_actual
         }
-        self.socket_pub.send_json(mensaje)
-        print(f"Taxi {self.id}: Nueva posición {self.posicion} | Ocupado: {self.ocupado} | Servicios: {self.servicios}")
+        self.enviar(mensaje)
+        self.log.info('posicion', "Nueva posición %s | Ocupado: %s | Servicios: %d", self.posicion,
+                      self.ocupado, self.servicios, taxi_id=self.id)
 
     def mover(self):
         if self.ocupado or self.velocidad == 0:
@@ -82,14 +142,14 @@ class Taxi:
         celdas = int(distancia)  # cada celda es 1km
 
         # Decidir dirección aleatoria (vertical u horizontal)
-        if random.choice([True, False]):  # Movimiento horizontal
-            dx = random.choice([-1, 1]) * celdas
+        if self.rng.choice([True, False]):  # Movimiento horizontal
+            dx = self.rng.choice([-1, 1]) * celdas
             nueva_x = max(0, min(self.N, self.posicion[0] + dx))
             if nueva_x != self.posicion[0]:  # Solo actualizar si realmente se movió
                 self.posicion = (nueva_x, self.posicion[1])
                 return True
         else:  # Movimiento vertical
-            dy = random.choice([-1, 1]) * celdas
+            dy = self.rng.choice([-1, 1]) * celdas
             nueva_y = max(0, min(self.M, self.posicion[1] + dy))
             if nueva_y != self.posicion[1]:  # Solo actualizar si realmente se movió
                 self.posicion = (self.posicion[0], nueva_y)
@@ -98,57 +158,98 @@ class Taxi:
         return False
 
     def procesar_asignaciones(self):
-        try:
-            mensaje = self.socket_sub.recv_json(flags=zmq.NOBLOCK)
-            if (mensaje.get('tipo') == 'servicio_asignado' and
-                    mensaje.get('taxi_id') == self.id):
-
-                print(f"\nTaxi {self.id}: Recibida asignación de servicio")
-                print(f"Taxi {self.id}: Usuario {mensaje['id_usuario']} en posición {mensaje['pos_usuario']}")
-                print(f"Taxi {self.id}: Mi posición actual {self.posicion}")
-
-                self.ocupado = True
-                self.servicios += 1
-
-                # Notificar que estamos ocupados
-                self.publicar_posicion()
-
-                print(f"Taxi {self.id}: Iniciando servicio #{self.servicios}")
-                time.sleep(30)  # Duración del servicio
-
-                # Volver a posición inicial
-                self.posicion = self.pos_inicial
-                self.ocupado = False
-                print(f"Taxi {self.id}: Servicio completado, volviendo a posición inicial {self.pos_inicial}")
+        # Atiende todas las asignaciones que ya están en cola sin bloquear
+        while True:
+            try:
+                mensaje = protocolo.decodificar(self.socket_sub.recv_multipart(flags=zmq.NOBLOCK)[-1])
+            except zmq.Again:
+                return
+            except Exception as e:
+                self.metricas.contar_por('asignaciones', 'error')
+                self.log.error('asignacion', "Error procesando asignación: %s", e)
+                continue
+            llegada = time.perf_counter()
+
+            if (mensaje.get('tipo') != 'servicio_asignado' or
+                    mensaje.get('taxi_id') != self.id):
+                continue
+
+            if mensaje.get('id_asignacion') in self.asignaciones_atendidas:
+                # Reenvío de una asignación ya atendida: solo se vuelve a confirmar
+                self.metricas.contar_por('asignaciones', 'repetida')
                 self.publicar_posicion()
+                continue
+
+            if self.ocupado or self.servicios >= 3:
+                self.metricas.contar_por('asignaciones', 'ignorada')
+                self.log.info('asignacion_ignorada', "Asignación para Usuario %s ignorada, taxi no disponible",
+                              mensaje['id_usuario'])
+                continue
+            self.asignaciones_atendidas.add(mensaje.get('id_asignacion'))
+
+            self.log.info('asignacion', "Recibida asignación de servicio: Usuario %s en posición %s, "
+                          "mi posición actual %s", mensaje['id_usuario'], mensaje['pos_usuario'], self.posicion,
+                          taxi_id=self.id, id_usuario=mensaje['id_usuario'])
+
+            self.ocupado = True
+            self.servicios += 1
+            self.fin_servicio = time.time() + DURACION_SERVICIO
+
+            # Notificar que estamos ocupados; sirve de confirmación para el servidor
+            self.publicar_posicion()
+            self.h_confirmacion.registrar(time.perf_counter() - llegada)
+            self.metricas.contar_por('asignaciones', 'aceptada')
+            self.log.debug('servicio', "Iniciando servicio #%d", self.servicios)
+
+    def finalizar_servicio(self):
+        # Volver a posición inicial
+        self.posicion = self.pos_inicial
+        self.ocupado = False
+        self.fin_servicio = None
+        self.log.info('servicio', "Servicio completado, volviendo a posición inicial %s", self.pos_inicial)
+        self.publicar_posicion()
 
-                if self.servicios >= 3:
-                    print(f"Taxi {self.id}: Completados todos los servicios del día")
-                    return False
-
-        except zmq.Again:
-            pass
-        except Exception as e:
-            print(f"Error procesando asignación en Taxi {self.id}: {e}")
-
-        return True
+        if self.servicios >= 3:
+            self.log.info('fin', "Completados todos los servicios del día")
 
     def iniciar(self):
-        print(f"Taxi {self.id} iniciado en posición {self.posicion}")
+        self.log.info('inicio', "Iniciado en posición %s", self.posicion)
         self.publicar_posicion()
 
-        while self.servicios < 3:
-            try:
-                if not self.procesar_asignaciones():
-                    break
+        poller = zmq.Poller()
+        poller.register(self.socket_sub, zmq.POLLIN)
+        proximo_movimiento = time.time() + INTERVALO_MOVIMIENTO
 
-                if not self.ocupado and self.velocidad > 0:
-                    time.sleep(30)  # Esperar 30 segundos (30 minutos simulados)
+        while self.servicios < 3 or self.ocupado:
+            try:
+                # Se espera a la próxima asignación, pero nunca más allá del
+                # siguiente evento programado (fin de servicio o movimiento)
+                if self.ocupado:
+                    plazo = self.fin_servicio
+                elif self.velocidad > 0:
+                    plazo = proximo_movimiento
+                else:
+                    plazo = None
+                espera = None if plazo is None else max(0, (plazo - time.time()) * 1000)
+
+                if poller.poll(espera):
+                    self.procesar_asignaciones()
+
+                tiempo_actual = time.time()
+                if self.ocupado and tiempo_actual >= self.fin_servicio:
+                    self.h_retraso_evento.registrar(tiempo_actual - self.fin_servicio)
+                    self.finalizar_servicio()
+                    proximo_movimiento = tiempo_actual + INTERVALO_MOVIMIENTO
+                elif not self.ocupado and self.velocidad > 0 and tiempo_actual >= proximo_movimiento:
+                    # Cada 30 segundos (30 minutos simulados)
+                    self.h_retraso_evento.registrar(tiempo_actual - proximo_movimiento)
                     self.mover()
                     self.publicar_posicion()
+                    proximo_movimiento = tiempo_actual + INTERVALO_MOVIMIENTO
 
             except Exception as e:
-                print(f"Error en taxi {self.id}: {e}")
+                self.metricas.contar('errores')
+                self.log.error('ciclo', "Error en el ciclo del taxi: %s", e)
 
         self.socket_pub.close()
         self.socket_sub.close()
@@ -156,16 +257,28 @@ class Taxi:
 
 
 def main():
-    if len(sys.argv) != 6:
-        print("Uso: python taxi.py <id> <N> <M> <x,y> <velocidad>")
+    parser = argparse.ArgumentParser(description="Taxi que publica su posición y atiende asignaciones")
+    parser.add_argument('id', type=int)
+    parser.add_argument('N', type=int)
+    parser.add_argument('M', type=int)
+    parser.add_argument('posicion', help="Posición inicial x,y")
+    parser.add_argument('velocidad', type=int)
+    parser.add_argument('--metricas', action='store_true',
+                        help="Atender consultas de métricas en METRICAS_BASE_PORT + 100 + id; ver metricas.py")
+    parser.add_argument('--semilla', type=int, default=None,
+                        help="Semilla de los movimientos, para repetir una ejecución")
+    args = parser.parse_args()
+
+    id_taxi = args.id
+    N = args.N
+    M = args.M
+    x, y = map(int, args.posicion.split(','))
+    velocidad = args.velocidad
+
+    if id_taxi < 0:
+        print("Id de taxi no válido")
         return
 
-    id_taxi = int(sys.argv[1])
-    N = int(sys.argv[2])
-    M = int(sys.argv[3])
-    x, y = map(int, sys.argv[4].split(','))
-    velocidad = int(sys.argv[5])
-
     if not (0 <= x <= N and 0 <= y <= M):
         print("Posición inicial fuera de la cuadrícula")
         return
@@ -174,7 +287,8 @@ def main():
         print("Velocidad no válida")
         return
 
-    taxi = Taxi(id_taxi, N, M, (x, y), velocidad)
+    puerto_metricas = METRICAS_BASE_PORT + 100 + id_taxi if args.metricas else None
+    taxi = Taxi(id_taxi, N, M, (x, y), velocidad, puerto_metricas, args.semilla)
     taxi.iniciar()
 
 
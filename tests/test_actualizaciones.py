@@ -0,0 +1,59 @@
+# Un mensaje de taxi mal formado se descarta solo: el resto del lote drenado
+# se sigue aplicando
+import json
+import time
+
+import zmq
+
+import protocolo
+from servidor_central import ServidorCentral
+
+URL = "inproc://actualizaciones_pruebas"
+
+
+def registro(id_taxi, pos):
+    return protocolo.codificar({'tipo': 'registro', 'id': id_taxi, 'posicion': pos}, 'binario')
+
+
+def servidor_sin_red():
+    return ServidorCentral(10, 10, red=False, publicador=lambda mensajes: None)
+
+
+def test_trama_mal_formada_no_pierde_las_demas():
+    servidor = servidor_sin_red()
+    # PULL en lugar del SUB del broker: recibir_pendientes solo lee de él
+    servidor.socket_sub = servidor.context.socket(zmq.PULL)
+    servidor.socket_sub.bind(URL)
+    emisor = servidor.context.socket(zmq.PUSH)
+    emisor.connect(URL)
+    try:
+        lote_json = {'tipo': 'lote', 'mensajes': [7, {'tipo': 'registro', 'id': 3, 'posicion': [3, 3]}]}
+        for datos in (registro(1, (1, 1)), b'\x07\x01basura', b'', json.dumps(lote_json).encode('utf-8'),
+                      b'{malo', registro(2, (2, 2))):
+            emisor.send_multipart([protocolo.TOPICO_REGISTRO, datos])
+        time.sleep(0.1)
+
+        mensajes = servidor.recibir_pendientes()
+        assert [mensaje['id'] for mensaje in mensajes] == [1, 3, 2]
+        assert servidor.contadores['errores'] == 4
+    finally:
+        emisor.close()
+        servidor.socket_sub.close()
+        servidor.context.term()
+
+
+def test_mensaje_que_falla_no_impide_aplicar_el_resto():
+    servidor = servidor_sin_red()
+    try:
+        mensajes = servidor.fusionar_actualizaciones([
+            {'tipo': 'registro', 'id': 1, 'posicion': (1, 1)},
+            {'tipo': 'registro', 'id': 5},
+            {'tipo': 'actualizacion', 'posicion': (4, 4), 'timestamp': 1.0},
+            {'tipo': 'registro', 'id': 2, 'posicion': (2, 2)},
+        ])
+        with servidor.lock:
+            servidor.aplicar_actualizaciones(mensajes)
+        assert 1 in servidor.taxis and 2 in servidor.taxis and 5 not in servidor.taxis
+        assert servidor.contadores['errores'] == 2
+    finally:
+        servidor.context.term()
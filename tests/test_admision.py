@@ -0,0 +1,115 @@
+# Control de admisión: la espera en cola se cuenta desde que la solicitud
+# llega al ROUTER del servidor, no desde que un trabajador la lee
+import json
+import threading
+import time
+
+import zmq
+
+import servidor_central
+from servidor_central import ServidorCentral
+
+FRONTEND_URL = "inproc://frontend_pruebas"
+
+
+def servidor_con_taxi(max_espera_cola):
+    servidor = ServidorCentral(10, 10, max_espera_cola=max_espera_cola, red=False,
+                               publicador=lambda mensajes: None)
+    with servidor.lock:
+        servidor.aplicar_mensaje({'tipo': 'registro', 'id': 4, 'posicion': (2, 2), 'timestamp': time.time()})
+    return servidor
+
+
+def solicitud(id_solicitud, presupuesto=5.0):
+    return json.dumps({'tipo': 'solicitud', 'id_usuario': id_solicitud, 'posicion': [1, 1],
+                       'id_solicitud': id_solicitud, 'presupuesto': presupuesto}).encode('utf-8')
+
+
+def arrancar(servidor):
+    # ROUTER y DEALER como en conectar(), pero en inproc y sin captura
+    servidor.socket_frontend = servidor.context.socket(zmq.ROUTER)
+    servidor.socket_frontend.bind(FRONTEND_URL)
+    servidor.socket_backend = servidor.context.socket(zmq.DEALER)
+    servidor.socket_backend.bind(servidor_central.TRABAJADORES_URL)
+    for objetivo in (servidor.enrutar_solicitudes, servidor.procesar_solicitudes_usuarios):
+        threading.Thread(target=objetivo, daemon=True).start()
+    cliente = servidor.context.socket(zmq.DEALER)
+    cliente.setsockopt(zmq.LINGER, 0)
+    cliente.connect(FRONTEND_URL)
+    return cliente
+
+
+def cerrar(servidor, cliente):
+    # El enrutador y el trabajador cierran sus sockets al terminar el contexto
+    cliente.close()
+    servidor.context.term()
+
+
+def recibir(cliente):
+    assert cliente.poll(2000), "Sin respuesta"
+    return json.loads(cliente.recv_multipart()[-1])
+
+
+def test_admitir_segun_la_llegada():
+    servidor = servidor_con_taxi(0.1)
+    try:
+        ahora = time.time()
+        assert servidor.admitir({'presupuesto': 1.0}, ahora) is None
+        assert servidor.admitir({'presupuesto': 1.0}, ahora - 0.5)['sobrecargado']
+        assert servidor.admitir({'presupuesto': 0.2}, ahora - 0.5)['vencida']
+        assert servidor.admitir({'presupuesto': 0}, ahora)['vencida']
+        assert servidor.limite_de({'presupuesto': 2.0}, ahora) == ahora + 2.0
+        assert servidor.limite_de({}, ahora) == ahora + servidor_central.TIMEOUT_SOLICITUD
+    finally:
+        servidor.context.destroy(linger=0)
+
+
+def test_control_de_admision_activo_por_defecto():
+    assert servidor_central.MAX_ESPERA_COLA > 0
+    servidor = ServidorCentral(10, 10, red=False, publicador=lambda mensajes: None)
+    try:
+        assert servidor.max_espera_cola == servidor_central.MAX_ESPERA_COLA
+    finally:
+        servidor.context.destroy(linger=0)
+
+
+def test_enrutador_atiende_solicitudes():
+    servidor = servidor_con_taxi(0.1)
+    cliente = arrancar(servidor)
+    try:
+        cliente.send_multipart([b'', solicitud(1)])
+        respuesta = recibir(cliente)
+        assert respuesta['exito'] and respuesta['taxi_id'] == 4 and respuesta['id_solicitud'] == 1
+    finally:
+        cerrar(servidor, cliente)
+
+
+def test_espera_en_cola_se_rechaza_con_sobrecargado():
+    servidor = servidor_con_taxi(0.1)
+    cliente = arrancar(servidor)
+    try:
+        # El único trabajador queda bloqueado en la primera mientras la segunda espera en cola
+        with servidor.lock:
+            cliente.send_multipart([b'', solicitud(1)])
+            cliente.send_multipart([b'', solicitud(2)])
+            time.sleep(0.3)
+        respuestas = {r['id_solicitud']: r for r in (recibir(cliente), recibir(cliente))}
+        assert respuestas[1]['exito']
+        assert respuestas[2]['sobrecargado'] and respuestas[2]['reintentar_en'] > 0
+    finally:
+        cerrar(servidor, cliente)
+
+
+def test_presupuesto_agotado_en_cola_se_descarta():
+    servidor = servidor_con_taxi(0)
+    cliente = arrancar(servidor)
+    try:
+        with servidor.lock:
+            cliente.send_multipart([b'', solicitud(1)])
+            cliente.send_multipart([b'', solicitud(2, presupuesto=0.1)])
+            time.sleep(0.3)
+        respuestas = {r['id_solicitud']: r for r in (recibir(cliente), recibir(cliente))}
+        assert respuestas[1]['exito']
+        assert respuestas[2]['vencida'] and not respuestas[2]['exito']
+    finally:
+        cerrar(servidor, cliente)
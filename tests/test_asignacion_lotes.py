@@ -0,0 +1,81 @@
+# La asignación por lotes frente a la búsqueda exhaustiva en casos pequeños
+import itertools
+import random
+
+import pytest
+
+from asignacion_lotes import asignar_codicioso, asignar_lote, resolver_asignacion
+
+
+def distancia(a, b):
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def optimo_exhaustivo(pos_usuarios, candidatos):
+    # Menor distancia total probando todas las asignaciones posibles
+    asignados = min(len(pos_usuarios), len(candidatos))
+    mejor = None
+    for usuarios in itertools.combinations(range(len(pos_usuarios)), asignados):
+        for taxis in itertools.permutations(range(len(candidatos)), asignados):
+            total = sum(distancia(pos_usuarios[u], candidatos[t][1]) for u, t in zip(usuarios, taxis))
+            if mejor is None or total < mejor:
+                mejor = total
+    return mejor
+
+
+def total_de(pos_usuarios, candidatos, asignados):
+    posiciones = dict(candidatos)
+    return sum(distancia(pos, posiciones[id_taxi]) for pos, id_taxi in zip(pos_usuarios, asignados)
+               if id_taxi is not None)
+
+
+@pytest.mark.parametrize('semilla', range(40))
+def test_asignar_lote_es_optimo(semilla):
+    generador = random.Random(semilla)
+    usuarios = generador.randint(1, 5)
+    taxis = generador.randint(1, 6)
+    pos_usuarios = [(generador.randint(0, 20), generador.randint(0, 20)) for _ in range(usuarios)]
+    candidatos = sorted((id_taxi, (generador.randint(0, 20), generador.randint(0, 20)))
+                        for id_taxi in generador.sample(range(100), taxis))
+
+    asignados = asignar_lote(pos_usuarios, candidatos)
+
+    assert len(asignados) == usuarios
+    elegidos = [id_taxi for id_taxi in asignados if id_taxi is not None]
+    assert len(elegidos) == min(usuarios, taxis)
+    assert len(set(elegidos)) == len(elegidos)
+    assert total_de(pos_usuarios, candidatos, asignados) == optimo_exhaustivo(pos_usuarios, candidatos)
+
+
+def test_mejor_que_codicioso():
+    # El primer usuario se lleva el taxi que el segundo necesitaba
+    pos_usuarios = [(5, 0), (0, 0)]
+    candidatos = [(1, (1, 0)), (2, (10, 0))]
+    assert asignar_codicioso(pos_usuarios, candidatos) == [1, 2]
+    assert asignar_lote(pos_usuarios, candidatos) == [2, 1]
+
+
+def test_empate_prefiere_ids_menores():
+    # Todas las soluciones suman lo mismo: se eligen los ids menores
+    pos_usuarios = [(0, 0)]
+    candidatos = [(4, (0, 3)), (8, (3, 0)), (2, (-3, 0))]
+    assert asignar_lote(pos_usuarios, candidatos) == [2]
+
+
+def test_casos_vacios():
+    assert asignar_lote([], [(1, (0, 0))]) == []
+    assert asignar_lote([(0, 0), (1, 1)], []) == [None, None]
+    filas, columnas = resolver_asignacion([])
+    assert len(filas) == len(columnas) == 0
+
+
+def test_resolver_asignacion_rectangular():
+    costos = [[4, 1, 3], [2, 0, 5], [3, 2, 2], [9, 9, 9]]
+    filas, columnas = resolver_asignacion(costos)
+    assert len(filas) == 3
+    assert sorted(columnas.tolist()) == [0, 1, 2]
+    total = sum(costos[f][c] for f, c in zip(filas.tolist(), columnas.tolist()))
+    mejor = min(sum(costos[f][c] for f, c in zip(seleccion, permutacion))
+                for seleccion in itertools.combinations(range(4), 3)
+                for permutacion in itertools.permutations(range(3)))
+    assert total == mejor
@@ -0,0 +1,48 @@
+# Instantáneas de la flota para las consultas y su orden de resultados
+import threading
+import time
+
+from consultas import InstantaneaFlota, ServidorConsultas
+from disponibilidad import LIBRE
+from servidor_central import ServidorCentral
+from tabla_flota import TablaFlota
+
+
+def instantanea_de(taxis):
+    tabla = TablaFlota()
+    for id_taxi, pos in taxis.items():
+        tabla.registrar(id_taxi, pos)
+    return InstantaneaFlota(tabla, {id_taxi: LIBRE for id_taxi in taxis}, {}, time.time(), 0)
+
+
+def test_cercanos_desempata_por_menor_id():
+    # Todos a distancia 2 de (5, 5) salvo el 8, más lejos
+    instantanea = instantanea_de({9: (7, 5), 5: (5, 7), 2: (3, 5), 7: (5, 3), 8: (9, 9)})
+    assert [taxi['id'] for taxi in instantanea.cercanos((5, 5), 1)] == [2]
+    assert [taxi['id'] for taxi in instantanea.cercanos((5, 5), 3)] == [2, 5, 7]
+    assert [taxi['id'] for taxi in instantanea.cercanos((5, 5), 10)] == [2, 5, 7, 9, 8]
+    total, taxis = instantanea.rango((5, 5), 2, limite=2)
+    assert total == 4 and [taxi['id'] for taxi in taxis] == [2, 5]
+
+
+def test_instantanea_se_construye_sin_el_lock():
+    servidor = ServidorCentral(10, 10, red=False, publicador=lambda mensajes: None)
+    try:
+        consultas = ServidorConsultas(servidor, None, intervalo=60)
+        with servidor.lock:
+            for id_taxi, pos in ((3, (1, 1)), (1, (4, 4))):
+                servidor.aplicar_mensaje({'tipo': 'registro', 'id': id_taxi, 'posicion': pos,
+                                          'timestamp': time.time()})
+            assert consultas.toca_copiar()
+            consultas.copiar()
+            assert not consultas.toca_copiar()
+            # Con el lock aún tomado, la instantánea se publica igualmente
+            hilo = threading.Thread(target=consultas.publicar)
+            hilo.start()
+            hilo.join(2)
+            assert not hilo.is_alive()
+        respuesta = consultas.responder({'orden': 'cercanos', 'posicion': [0, 0], 'k': 5})
+        assert [taxi['id'] for taxi in respuesta['taxis']] == [3, 1]
+        assert consultas.responder({'orden': 'resumen'})['taxis'] == 2
+    finally:
+        servidor.context.term()
@@ -0,0 +1,112 @@
+# Resolución de solicitudes en el frente de shards contra shards reales en
+# memoria (ServidorCentral sin red), comparada con la flota completa
+import random
+import time
+
+import pytest
+
+from disponibilidad import EN_ESPERA, LIBRE
+from frente_shards import resolver_lote, resolver_solicitud
+from particion import Particion
+from servidor_central import ServidorCentral
+
+N = M = 60
+
+
+def crear_shards(particion, taxis):
+    # taxis: {id: (x, y)}; cada taxi se registra solo en el shard de su región
+    shards = [ServidorCentral(N, M, particion=particion, region=region, red=False, publicador=lambda mensajes: None)
+              for region in range(len(particion))]
+    for id_taxi, pos in taxis.items():
+        shard = shards[particion.region_de(pos)]
+        with shard.lock:
+            shard.aplicar_mensaje({'tipo': 'registro', 'id': id_taxi, 'posicion': pos, 'timestamp': time.time()})
+    return shards
+
+
+def cercano_lineal(taxis, pos):
+    return min(((abs(x - pos[0]) + abs(y - pos[1]), id_taxi) for id_taxi, (x, y) in taxis.items()), default=None)
+
+
+@pytest.mark.parametrize('semilla', range(4))
+def test_asigna_el_mas_cercano_de_toda_la_ciudad(semilla):
+    generador = random.Random(semilla)
+    particion = Particion(N, M, 2, 3)
+    taxis = {id_taxi: (generador.randint(0, N), generador.randint(0, M)) for id_taxi in range(40)}
+    shards = crear_shards(particion, taxis)
+    consultar = lambda region, solicitud: shards[region].responder_solicitud(solicitud)
+
+    for id_usuario in range(40):
+        pos = (generador.randint(0, N), generador.randint(0, M))
+        distancia, esperado = cercano_lineal(taxis, pos)
+        respuesta = resolver_solicitud(particion, pos, id_usuario, consultar)
+        assert respuesta['exito']
+        assert respuesta['taxi_id'] == esperado
+        del taxis[esperado]
+    assert resolver_solicitud(particion, (0, 0), 99, consultar) == {'exito': False}
+
+
+def test_shard_caido_se_salta():
+    particion = Particion(N, M, 1, 2)
+    taxis = {1: (5, 5), 2: (40, 5)}
+    shards = crear_shards(particion, taxis)
+    caidos = {0}
+    consultar = lambda region, solicitud: None if region in caidos else shards[region].responder_solicitud(solicitud)
+
+    # La región del usuario no responde: se asigna el taxi de la vecina
+    respuesta = resolver_solicitud(particion, (4, 4), 7, consultar)
+    assert respuesta['exito'] and respuesta['taxi_id'] == 2
+
+    caidos.add(1)
+    assert resolver_solicitud(particion, (4, 4), 8, consultar) == {'exito': False}
+
+
+def test_candidato_perdido_se_busca_otro():
+    particion = Particion(N, M, 1, 2)
+    # El usuario está en la región 1, pero el taxi más cercano está en la 0
+    taxis = {1: (29, 0), 2: (45, 0), 3: (10, 0)}
+    shards = crear_shards(particion, taxis)
+    confirmaciones = []
+
+    def consultar(region, solicitud):
+        if 'taxi_id' in solicitud and not confirmaciones:
+            # Otro usuario se lleva el candidato justo antes de confirmarlo
+            confirmaciones.append(solicitud['taxi_id'])
+            shards[region].responder_solicitud({'tipo': 'solicitud', 'id_usuario': 'otro', 'posicion': (29, 0)})
+        return shards[region].responder_solicitud(solicitud)
+
+    respuesta = resolver_solicitud(particion, (32, 0), 7, consultar)
+    assert confirmaciones == [1]
+    assert respuesta['exito'] and respuesta['taxi_id'] == 2
+
+
+def test_max_regiones():
+    particion = Particion(N, M, 1, 4)
+    shards = crear_shards(particion, {1: (59, 0)})
+    consultar = lambda region, solicitud: shards[region].responder_solicitud(solicitud)
+    assert resolver_solicitud(particion, (0, 0), 7, consultar, max_regiones=2) == {'exito': False}
+    assert resolver_solicitud(particion, (0, 0), 7, consultar)['taxi_id'] == 1
+
+
+def test_resolver_lote_en_orden():
+    particion = Particion(N, M, 2, 2)
+    shards = crear_shards(particion, {1: (0, 0), 2: (59, 59)})
+    consultar = lambda region, solicitud: shards[region].responder_solicitud(solicitud)
+    respuesta = resolver_lote(particion, [['a', [1, 1]], ['b', [2, 2]], ['c', [3, 3]]], consultar)
+    assert [resultado.get('taxi_id') for resultado in respuesta['resultados']] == [1, 2, None]
+    assert [resultado['id_usuario'] for resultado in respuesta['resultados']] == ['a', 'b', 'c']
+    assert respuesta['exito']
+
+
+def test_taxi_de_otra_region_respeta_la_espera():
+    # Un taxi que ya hizo servicios y entra en la región de otro shard no
+    # debe quedar libre al momento: su última asignación se cuenta desde ahora
+    particion = Particion(N, M, 1, 2)
+    shard = crear_shards(particion, {})[1]
+    with shard.lock:
+        shard.aplicar_mensaje({'tipo': 'actualizacion', 'id': 5, 'posicion': (40, 0), 'ocupado': False,
+                               'servicios': 1, 'timestamp': time.time()})
+        shard.aplicar_mensaje({'tipo': 'actualizacion', 'id': 6, 'posicion': (41, 0), 'ocupado': False,
+                               'servicios': 0, 'timestamp': time.time()})
+    assert shard.disponibilidad.estados[5] == EN_ESPERA
+    assert shard.disponibilidad.estados[6] == LIBRE
@@ -0,0 +1,111 @@
+# Comparación del índice espacial con un recorrido lineal de toda la flota
+import random
+
+import pytest
+
+from indice_espacial import IndiceEspacial
+
+
+def cercano_lineal(taxis, pos, filtro=None):
+    # (id, distancia) del elegible más cercano; en empate el id menor
+    candidatos = [(abs(x - pos[0]) + abs(y - pos[1]), id_taxi) for id_taxi, (x, y, elegible) in taxis.items()
+                  if elegible and (filtro is None or filtro(id_taxi))]
+    if not candidatos:
+        return None, None
+    distancia, id_taxi = min(candidatos)
+    return id_taxi, distancia
+
+
+def flota_aleatoria(generador, N, M, cantidad):
+    indice = IndiceEspacial(N, M)
+    taxis = {}
+    for id_taxi in generador.sample(range(cantidad * 3), cantidad):
+        taxis[id_taxi] = (generador.randint(0, N), generador.randint(0, M), generador.random() < 0.7)
+        indice.actualizar(id_taxi, taxis[id_taxi][:2], taxis[id_taxi][2])
+    return indice, taxis
+
+
+@pytest.mark.parametrize('semilla', range(5))
+def test_mas_cercano_igual_que_recorrido_lineal(semilla):
+    generador = random.Random(semilla)
+    N, M = 100, 60
+    indice, taxis = flota_aleatoria(generador, N, M, 300)
+    for _ in range(200):
+        pos = (generador.randint(0, N), generador.randint(0, M))
+        assert indice.mas_cercano(pos) == cercano_lineal(taxis, pos)
+
+
+def test_mas_cercano_tras_movimientos_y_bajas():
+    generador = random.Random(7)
+    N = M = 50
+    indice, taxis = flota_aleatoria(generador, N, M, 200)
+    for _ in range(500):
+        id_taxi = generador.choice(list(taxis))
+        if generador.random() < 0.1:
+            indice.eliminar(id_taxi)
+            del taxis[id_taxi]
+            continue
+        taxis[id_taxi] = (generador.randint(0, N), generador.randint(0, M), generador.random() < 0.5)
+        indice.actualizar(id_taxi, taxis[id_taxi][:2], taxis[id_taxi][2])
+        pos = (generador.randint(0, N), generador.randint(0, M))
+        assert indice.mas_cercano(pos) == cercano_lineal(taxis, pos)
+
+
+def test_empate_gana_el_id_menor():
+    indice = IndiceEspacial(100, 100, tamano_celda=4)
+    # Cuatro taxis a distancia 6 del usuario, en celdas distintas, insertados en desorden
+    for id_taxi, pos in ((9, (56, 50)), (3, (44, 50)), (7, (50, 56)), (5, (50, 44))):
+        indice.actualizar(id_taxi, pos, True)
+    assert indice.mas_cercano((50, 50)) == (3, 6)
+    indice.marcar_elegible(3, False)
+    assert indice.mas_cercano((50, 50)) == (5, 6)
+
+
+def test_filtro():
+    generador = random.Random(11)
+    indice, taxis = flota_aleatoria(generador, 80, 80, 150)
+    filtro = lambda id_taxi: id_taxi % 3 != 0
+    for _ in range(100):
+        pos = (generador.randint(0, 80), generador.randint(0, 80))
+        assert indice.mas_cercano(pos, filtro) == cercano_lineal(taxis, pos, filtro)
+
+
+def test_sin_elegibles():
+    indice = IndiceEspacial(10, 10)
+    assert indice.mas_cercano((5, 5)) == (None, None)
+    indice.actualizar(1, (2, 2), False)
+    assert indice.mas_cercano((5, 5)) == (None, None)
+    assert indice.k_mas_cercanos((5, 5), 3) == []
+
+
+@pytest.mark.parametrize('k', [1, 3, 10, 500])
+def test_k_mas_cercanos_igual_que_recorrido_lineal(k):
+    generador = random.Random(k)
+    indice, taxis = flota_aleatoria(generador, 60, 60, 250)
+    for _ in range(50):
+        pos = (generador.randint(0, 60), generador.randint(0, 60))
+        esperado = sorted((abs(x - pos[0]) + abs(y - pos[1]), id_taxi)
+                          for id_taxi, (x, y, elegible) in taxis.items() if elegible)[:k]
+        assert indice.k_mas_cercanos(pos, k) == esperado
+
+
+@pytest.mark.parametrize('semilla', range(3))
+def test_posiciones_con_decimales(semilla):
+    generador = random.Random(semilla)
+    N, M = 100, 60
+    indice, taxis = flota_aleatoria(generador, N, M, 150)
+    for _ in range(200):
+        pos = (generador.uniform(0, N), generador.uniform(0, M))
+        assert indice.mas_cercano(pos) == cercano_lineal(taxis, pos)
+        esperados = sorted((abs(x - pos[0]) + abs(y - pos[1]), id_taxi)
+                           for id_taxi, (x, y, elegible) in taxis.items() if elegible)[:5]
+        assert indice.k_mas_cercanos(pos, 5) == esperados
+
+
+def test_empate_con_decimales_junto_al_borde_de_la_celda():
+    indice = IndiceEspacial(100, 100, tamano_celda=4)
+    # Usuario en 3.5: el taxi 9 (celda propia) y el 2 (celda vecina) quedan a 0.5
+    indice.actualizar(9, (3, 0), True)
+    indice.actualizar(2, (4, 0), True)
+    assert indice.mas_cercano((3.5, 0)) == (2, 0.5)
+    assert indice.k_mas_cercanos((3.5, 0), 1) == [(0.5, 2)]
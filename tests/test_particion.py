@@ -0,0 +1,76 @@
+# Reparto de la ciudad en regiones: cada punto pertenece a una sola región
+import numpy as np
+import pytest
+
+import protocolo
+from particion import Particion, desde_entorno
+
+
+@pytest.mark.parametrize('N, M, filas, columnas', [(100, 100, 2, 2), (10, 7, 3, 4), (9, 9, 1, 4), (5, 20, 4, 1)])
+def test_cada_punto_en_una_region_y_dentro_de_sus_limites(N, M, filas, columnas):
+    particion = Particion(N, M, filas, columnas)
+    for x in range(N + 1):
+        for y in range(M + 1):
+            region = particion.region_de((x, y))
+            assert 0 <= region < len(particion)
+            x0, x1, y0, y1 = particion.limites(region)
+            assert x0 <= x <= x1 and y0 <= y <= y1
+            contienen = [r for r in range(len(particion))
+                         if particion.limites(r)[0] <= x <= particion.limites(r)[1]
+                         and particion.limites(r)[2] <= y <= particion.limites(r)[3]]
+            assert contienen == [region]
+
+
+def test_bordes_2x2():
+    particion = Particion(100, 100, 2, 2)
+    # 101 coordenadas por eje: la primera mitad llega hasta 50
+    assert particion.region_de((0, 0)) == 0
+    assert particion.region_de((50, 50)) == 0
+    assert particion.region_de((51, 50)) == 1
+    assert particion.region_de((50, 51)) == 2
+    assert particion.region_de((100, 100)) == 3
+    assert particion.limites(0) == (0, 50, 0, 50)
+    assert particion.limites(3) == (51, 100, 51, 100)
+
+
+def test_fuera_de_la_ciudad_va_a_la_ultima_fila_y_columna():
+    particion = Particion(10, 10, 2, 2)
+    assert particion.region_de((50, 3)) == 1
+    assert particion.region_de((3, 50)) == 2
+
+
+def test_region_de_con_arrays_igual_que_escalar():
+    particion = Particion(30, 20, 3, 4)
+    x = np.arange(0, 31).repeat(21)
+    y = np.tile(np.arange(0, 21), 31)
+    regiones = particion.region_de((x, y))
+    assert regiones.tolist() == [particion.region_de((int(a), int(b))) for a, b in zip(x, y)]
+
+
+def test_distancia_minima_y_orden_por_cercania():
+    particion = Particion(100, 100, 2, 2)
+    assert particion.distancia_minima((10, 10), 0) == 0
+    assert particion.distancia_minima((10, 10), 1) == 41
+    assert particion.distancia_minima((10, 10), 3) == 82
+    assert particion.regiones_por_cercania((10, 10)) == [(0, 0), (41, 1), (41, 2), (82, 3)]
+    # En la frontera las dos regiones vecinas están a 0 y 1
+    assert particion.regiones_por_cercania((50, 0))[:2] == [(0, 0), (1, 1)]
+
+
+def test_desde_texto():
+    particion = Particion.desde_texto(100, 50, '2X3')
+    assert (particion.filas, particion.columnas, len(particion)) == (2, 3, 6)
+    for texto in ('0x2', '2x0', 'abc', '2'):
+        with pytest.raises(ValueError):
+            Particion.desde_texto(100, 100, texto)
+
+
+def test_desde_entorno(monkeypatch):
+    monkeypatch.delenv('REGIONES_CIUDAD', raising=False)
+    assert desde_entorno(100, 100) is None
+    monkeypatch.setenv('REGIONES_CIUDAD', '1x4')
+    assert len(desde_entorno(100, 100)) == 4
+
+
+def test_topicos():
+    assert Particion(10, 10, 2, 2).topicos(3) == [protocolo.TOPICO_REGISTRO + b'3.', protocolo.TOPICO_POSICION + b'3.']
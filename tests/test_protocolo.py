@@ -0,0 +1,120 @@
+# Codificación y decodificación de los mensajes del broker
+import json
+
+import pytest
+
+import protocolo
+
+REGISTRO = {'tipo': 'registro', 'id': 12, 'posicion': (3, 4), 'velocidad': 2}
+ACTUALIZACION = {'tipo': 'actualizacion', 'id': 70000, 'posicion': (99, 0), 'ocupado': True, 'servicios': 2,
+                 'timestamp': 1700000000.25}
+ASIGNACION = {'tipo': 'servicio_asignado', 'taxi_id': 5, 'pos_usuario': (10, 20), 'id_usuario': 4000000000,
+              'id_asignacion': 2**40 + 1}
+
+
+@pytest.mark.parametrize('mensaje', [REGISTRO, ACTUALIZACION, ASIGNACION])
+def test_ida_y_vuelta_binaria(mensaje):
+    datos = protocolo.codificar(mensaje, 'binario')
+    assert datos[0] == protocolo.VERSION and datos[1] == protocolo.TIPOS[mensaje['tipo']]
+    assert protocolo.decodificar(datos) == mensaje
+    assert protocolo.tipo_de(datos) == mensaje['tipo']
+
+
+@pytest.mark.parametrize('mensaje', [REGISTRO, ACTUALIZACION, ASIGNACION])
+def test_ida_y_vuelta_json(mensaje):
+    datos = protocolo.codificar(mensaje, 'json')
+    assert datos.startswith(b'{')
+    decodificado = protocolo.decodificar(datos)
+    assert decodificado == json.loads(json.dumps(mensaje))
+    assert protocolo.tipo_de(datos) == mensaje['tipo']
+
+
+@pytest.mark.parametrize('id_usuario', ['ana', -1, 2**32, True, 1.5])
+def test_asignacion_que_no_cabe_viaja_como_json(id_usuario):
+    mensaje = dict(ASIGNACION, id_usuario=id_usuario)
+    assert not protocolo.asignacion_binaria(mensaje)
+    topico, datos = protocolo.empaquetar(mensaje, 'binario')
+    assert topico == b'assign.5.'
+    assert datos.startswith(b'{')
+    decodificado = protocolo.decodificar(datos)
+    assert decodificado['id_usuario'] == id_usuario
+    assert tuple(decodificado['pos_usuario']) == (10, 20)
+
+
+def test_asignacion_con_posicion_decimal_viaja_como_json():
+    mensaje = dict(ASIGNACION, pos_usuario=(1.5, 2))
+    assert protocolo.codificar(mensaje, 'binario').startswith(b'{')
+
+
+@pytest.mark.parametrize('mensaje', [dict(ASIGNACION, taxi_id=-1), dict(ASIGNACION, id_asignacion=-1),
+                                     dict(REGISTRO, id=-1), dict(REGISTRO, id=2**32), dict(REGISTRO, id='t1'),
+                                     dict(REGISTRO, velocidad=256), dict(REGISTRO, posicion=(1.5, 2)),
+                                     dict(ACTUALIZACION, id=-3), dict(ACTUALIZACION, servicios=300)])
+def test_mensaje_que_no_cabe_en_su_registro_viaja_como_json(mensaje):
+    datos = protocolo.codificar(mensaje, 'binario')
+    assert datos.startswith(b'{')
+    assert protocolo.decodificar(datos) == json.loads(json.dumps(mensaje))
+    assert protocolo.tipo_de(datos) == mensaje['tipo']
+    lote = protocolo.codificar({'tipo': 'lote', 'mensajes': [REGISTRO, mensaje]}, 'binario')
+    assert protocolo.desagrupar(protocolo.decodificar(lote))[0] == REGISTRO
+
+
+def test_limites_del_registro_de_asignacion():
+    for id_usuario in (0, 2**32 - 1):
+        datos = protocolo.codificar(dict(ASIGNACION, id_usuario=id_usuario), 'binario')
+        assert datos[0] == protocolo.VERSION
+        assert protocolo.decodificar(datos)['id_usuario'] == id_usuario
+
+
+def test_lote_mezcla_binario_y_json():
+    mensajes = [REGISTRO, dict(ASIGNACION, id_usuario='ana'), ACTUALIZACION]
+    datos = protocolo.codificar({'tipo': 'lote', 'mensajes': mensajes}, 'binario')
+    assert protocolo.tipo_de(datos) == 'lote'
+    lote = protocolo.decodificar(datos)
+    assert lote['tipo'] == 'lote'
+    decodificados = protocolo.desagrupar(lote)
+    assert decodificados[0] == REGISTRO and decodificados[2] == ACTUALIZACION
+    assert decodificados[1]['id_usuario'] == 'ana'
+
+    partes = protocolo.separar_codificados(datos)
+    assert [protocolo.decodificar(parte) for parte in partes] == decodificados
+    assert protocolo.agrupar_codificados(partes) == datos
+
+
+def test_lote_vacio_y_mensaje_suelto():
+    datos = protocolo.agrupar_codificados([])
+    assert protocolo.decodificar(datos) == {'tipo': 'lote', 'mensajes': []}
+    assert protocolo.desagrupar(REGISTRO) == [REGISTRO]
+    suelto = protocolo.codificar(REGISTRO, 'binario')
+    assert protocolo.separar_codificados(suelto) == [suelto]
+
+
+def test_lote_demasiado_grande():
+    with pytest.raises(ValueError):
+        protocolo.agrupar_codificados([b'x'] * (protocolo.MAX_MENSAJES_LOTE + 1))
+
+
+def test_topicos():
+    assert protocolo.empaquetar(REGISTRO, 'binario')[0] == protocolo.TOPICO_REGISTRO
+    assert protocolo.empaquetar(ACTUALIZACION, 'binario', region=3)[0] == b'pos.3.'
+    assert protocolo.empaquetar({'tipo': 'lote', 'mensajes': [ACTUALIZACION]}, 'binario')[0] == b'pos.'
+    latido = {'tipo': 'latido', 'replica': False, 'instante': 1.0}
+    topico, datos = protocolo.empaquetar(latido, 'binario')
+    assert topico == protocolo.TOPICO_LATIDO
+    assert protocolo.decodificar(datos) == latido
+
+
+@pytest.mark.parametrize('formato', ['binario', 'json'])
+def test_taxi_de(formato):
+    assert protocolo.taxi_de(protocolo.codificar(REGISTRO, formato)) == ('registro', 12)
+    assert protocolo.taxi_de(protocolo.codificar(ACTUALIZACION, formato)) == ('actualizacion', 70000)
+    assert protocolo.taxi_de(protocolo.codificar(ASIGNACION, formato)) is None
+
+
+def test_datos_no_validos():
+    with pytest.raises(ValueError):
+        protocolo.decodificar(b'')
+    with pytest.raises(ValueError):
+        protocolo.decodificar(bytes([protocolo.VERSION + 1, protocolo.REGISTRO]))
+    with pytest.raises(ValueError):
+        protocolo.decodificar(bytes([protocolo.VERSION, 99]))
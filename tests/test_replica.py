@@ -0,0 +1,65 @@
+# Réplica en espera: sigue las decisiones del primario y no asigna mientras
+# el primario emite latidos
+import threading
+import time
+
+import pytest
+
+import servidor_central
+from servidor_central import ServidorCentral
+
+
+@pytest.fixture
+def replica():
+    replica = ServidorCentral(10, 10, replica=True, red=False, publicador=lambda mensajes: None)
+    with replica.lock:
+        replica.aplicar_mensaje({'tipo': 'registro', 'id': 4, 'posicion': (2, 2), 'timestamp': time.time()})
+    yield replica
+    replica.context.term()
+
+
+def asignacion(id_asignacion, taxi_id=4):
+    return {'tipo': 'servicio_asignado', 'taxi_id': taxi_id, 'pos_usuario': (1, 1), 'id_usuario': 7,
+            'id_asignacion': id_asignacion}
+
+
+def test_replica_aplica_cada_asignacion_del_primario_una_vez(replica):
+    with replica.lock:
+        replica.aplicar_mensaje(asignacion(100))
+        replica.aplicar_mensaje(asignacion(100))  # Reenvío del primario
+        replica.aplicar_mensaje(asignacion(101, taxi_id=99))  # Taxi que la réplica no conoce
+    info = replica.taxis.info(4)
+    assert info['ocupado'] and info['servicios'] == 1
+    assert replica.indice.mas_cercano((2, 2)) == (None, None)
+
+
+def test_replica_con_primario_vivo_no_asigna(replica):
+    replica.ultimo_latido = time.time()
+    inicio = time.time()
+    respuesta = replica.responder_solicitud({'tipo': 'solicitud', 'id_usuario': 7, 'posicion': [1, 1]})
+    assert respuesta['en_espera'] and not respuesta['exito']
+    assert time.time() - inicio < servidor_central.TIEMPO_FALLO_PRIMARIO
+    assert not replica.taxis.info(4)['ocupado']
+
+
+def test_replica_retiene_la_solicitud_hasta_pasar_a_activa(replica, monkeypatch):
+    monkeypatch.setattr(servidor_central, 'TIEMPO_FALLO_PRIMARIO', 0.2)
+    replica.ultimo_latido = time.time() - 1  # Primario sin latidos
+
+    def activar():
+        time.sleep(0.1)
+        replica.activo = True
+
+    hilo = threading.Thread(target=activar)
+    hilo.start()
+    respuesta = replica.responder_solicitud({'tipo': 'solicitud', 'id_usuario': 7, 'posicion': [1, 1]})
+    hilo.join()
+    assert respuesta['exito'] and respuesta['taxi_id'] == 4
+
+
+def test_replica_sin_confirmar_el_fallo_devuelve_la_solicitud(replica, monkeypatch):
+    monkeypatch.setattr(servidor_central, 'TIEMPO_FALLO_PRIMARIO', 0.1)
+    replica.ultimo_latido = time.time() - 1
+    inicio = time.time()
+    assert replica.esperar_rol_activo() is False
+    assert 0.15 <= time.time() - inicio < 1
@@ -0,0 +1,48 @@
+# El servidor central sin sockets (red=False): asignación de solicitudes
+import time
+
+import pytest
+
+from servidor_central import ServidorCentral
+
+
+@pytest.fixture
+def servidor():
+    publicados = []
+    servidor = ServidorCentral(10, 10, red=False, publicador=publicados.extend)
+    servidor.publicados = publicados
+    yield servidor
+    servidor.context.term()
+
+
+def registrar(servidor, *taxis):
+    with servidor.lock:
+        for id_taxi, pos in taxis:
+            servidor.aplicar_mensaje({'tipo': 'registro', 'id': id_taxi, 'posicion': pos,
+                                      'timestamp': time.time()})
+
+
+def test_solicitud_con_posicion_con_decimales(servidor):
+    registrar(servidor, (4, (2, 2)), (1, (8, 8)))
+    respuesta = servidor.responder_solicitud({'tipo': 'solicitud', 'id_usuario': 7, 'posicion': [3.5, 3]})
+    assert respuesta['exito'] and respuesta['taxi_id'] == 4
+    assert servidor.publicados[-1]['pos_usuario'] == (3.5, 3)
+
+
+def test_asignar_lote_minimiza_la_distancia_total(servidor):
+    # Uno tras otro, el usuario en (5, 0) se llevaría el taxi 1 y el de (0, 0)
+    # tendría que esperar al 2, a 9; juntos se reparten a 4 y 4
+    registrar(servidor, (1, (4, 0)), (2, (9, 0)))
+    asignaciones = servidor.asignar_lote([((5, 0), 10), ((0, 0), 11)])
+    assert [asignacion[0] for asignacion in asignaciones] == [2, 1]
+    assert all(servidor.taxis.info(id_taxi)['ocupado'] for id_taxi in (1, 2))
+    assert set(servidor.asignaciones_pendientes) == {1, 2}
+
+
+def test_asignar_lote_con_menos_taxis_que_usuarios(servidor):
+    registrar(servidor, (3, (2, 2)))
+    asignaciones = servidor.asignar_lote([((9, 9), 10), ((2, 3), 11), ((0, 0), 12)])
+    assert asignaciones[0] is None and asignaciones[2] is None
+    assert asignaciones[1][0] == 3 and asignaciones[1][3]['id_usuario'] == 11
+    # El taxi ya reservado no entra en el siguiente lote
+    assert servidor.asignar_lote([((2, 2), 13)]) == [None]
@@ -0,0 +1,62 @@
+# Los hilos trabajadores responden a cualquier solicitud y siguen vivos
+import json
+import threading
+import time
+
+import zmq
+
+import frente_shards
+import servidor_central
+from frente_shards import FrenteShards
+from particion import Particion
+from servidor_central import ServidorCentral
+
+CUERPOS_MALOS = [b'[1, 2]', b'7', b'"texto"', b'null', b'{malo', b'{"tipo": "solicitud"}']
+
+
+def enviar(socket, cuerpo):
+    socket.send_multipart([b'', cuerpo])
+    assert socket.poll(2000), f"Sin respuesta a {cuerpo!r}"
+    return json.loads(socket.recv_multipart()[-1])
+
+
+def probar_trabajador(context, url, objetivo):
+    # DEALER en el lugar del ROUTER: el trabajador es el único REP conectado
+    socket = context.socket(zmq.DEALER)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.bind(url)
+    hilo = threading.Thread(target=objetivo, daemon=True)
+    hilo.start()
+    try:
+        for cuerpo in CUERPOS_MALOS:
+            respuesta = enviar(socket, cuerpo)
+            assert respuesta['exito'] is False and 'error' in respuesta
+            assert hilo.is_alive()
+        return enviar(socket, b'{"tipo": "solicitud", "id_usuario": 1, "posicion": [1, 1], "id_solicitud": 9}')
+    finally:
+        socket.close()
+
+
+def test_trabajador_del_servidor_sobrevive_a_cuerpos_no_validos():
+    servidor = ServidorCentral(10, 10, red=False, publicador=lambda mensajes: None)
+    with servidor.lock:
+        servidor.aplicar_mensaje({'tipo': 'registro', 'id': 4, 'posicion': (2, 2), 'timestamp': time.time()})
+    try:
+        respuesta = probar_trabajador(servidor.context, servidor_central.TRABAJADORES_URL,
+                                      servidor.procesar_solicitudes_usuarios)
+    finally:
+        servidor.context.term()  # El trabajador cierra su socket al terminar el contexto
+    assert respuesta['exito'] and respuesta['taxi_id'] == 4 and respuesta['id_solicitud'] == 9
+
+
+def test_trabajador_del_frente_sobrevive_a_cuerpos_no_validos():
+    frente = FrenteShards.__new__(FrenteShards)
+    frente.particion = Particion(10, 10, 1, 1)
+    frente.max_regiones = None
+    frente.context = zmq.Context()
+    frente.consultar = lambda sockets, region, solicitud: {'exito': False}
+    try:
+        respuesta = probar_trabajador(frente.context, frente_shards.TRABAJADORES_URL, frente.procesar_solicitudes)
+        assert respuesta['exito'] is False and respuesta['id_solicitud'] == 9
+    finally:
+        frente.context.term()
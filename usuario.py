@@ -1,8 +1,17 @@
 # usuario.py
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
 import zmq
+import zmq.asyncio
 import threading
 import time
-import sys
+
+from bitacora import Bitacora
+from metricas import Histograma
 
 # Direcciones IP de los componentes
 BROKER_IP = "127.0.0.1"       # IP del broker
@@ -14,6 +23,11 @@ USUARIO_IP = "127.0.0.1"     # IP base para usuarios
 BROKER_FRONTEND_PORT = 5559       # Para publicadores (taxis y servidor)
 BROKER_BACKEND_PORT = 5560        # Para suscriptores (taxis y servidor)
 USUARIO_SERVER_PORT = 5555        # Para comunicación usuario-servidor
+USUARIO_REPLICA_PORT = 5556       # Para comunicación usuario-réplica del servidor
+SHARD_BASE_PORT = 5600            # Para comunicación frente-shards (5600 + región)
+METRICAS_BASE_PORT = 5700         # Para consultar métricas (5700 broker, 5701 servidor, 5702 réplica, 5710 + región shards)
+BROKER_FORWARDERS_BASE_PORT = 5800 # Reenviadores del broker en modo clúster (5800 + 2i, 5801 + 2i); ver enrutamiento.py
+CONSULTAS_BASE_PORT = 5900         # Para consultas de la flota (5901 servidor, 5902 réplica, 5910 + región shards); ver consultas.py
 
 # Configuraciones completas
 BROKER_FRONTEND_URL = f"tcp://*:{BROKER_FRONTEND_PORT}"
@@ -21,98 +35,397 @@ BROKER_BACKEND_URL = f"tcp://*:{BROKER_BACKEND_PORT}"
 BROKER_FRONTEND_CONNECT = f"tcp://{BROKER_IP}:{BROKER_FRONTEND_PORT}"
 BROKER_BACKEND_CONNECT = f"tcp://{BROKER_IP}:{BROKER_BACKEND_PORT}"
 USUARIO_SERVER_URL = f"tcp://{SERVIDOR_IP}:{USUARIO_SERVER_PORT}"
+USUARIO_REPLICA_URL = f"tcp://{SERVIDOR_IP}:{USUARIO_REPLICA_PORT}"
+
+# Tiempos de la simulación; ESCALA_TIEMPO > 1 los acorta para pruebas de carga
+ESCALA_TIEMPO = float(os.environ.get('ESCALA_TIEMPO', '1'))
+DURACION_SERVICIO = 30 / ESCALA_TIEMPO   # Segundos que dura un servicio
+INTERVALO_USUARIOS = 5 / ESCALA_TIEMPO   # Segundos entre las solicitudes de usuarios consecutivos
+
+# Tolerancia a fallos del servidor (patrón "lazy pirate"): si un servidor no
+# responde a tiempo se descarta el socket REQ y se reintenta en el siguiente
+SERVIDORES_URL = [USUARIO_SERVER_URL, USUARIO_REPLICA_URL]  # Primario y réplica, en orden de preferencia
+TIMEOUT_SOLICITUD = 5.0   # Segundos totales para conseguir respuesta
+TIMEOUT_INTENTO = 1.0     # Segundos de espera en cada servidor antes de pasar al siguiente
+
+# Cada intento lleva su 'presupuesto', los segundos que se esperará su
+# respuesta, que el servidor cuenta con su propio reloj desde que le llega.
+# Si el servidor responde 'sobrecargado' con 'reintentar_en' se reintenta en
+# el mismo servidor tras esa espera
+LIMITE_COLA_MENSAJES = 10000   # SNDHWM/RCVHWM de los sockets hacia el servidor
+
+# Modo asíncrono: usuarios con una solicitud en curso o esperando a hacerla;
+# los siguientes no se leen del archivo hasta que alguno termina
+MAX_USUARIOS_ACTIVOS = 10000
+
+def esperar_sobrecarga(respuesta):
+    # La espera pedida por el servidor, con dispersión para que los usuarios
+    # rechazados a la vez no vuelvan todos a la vez
+    return respuesta.get('reintentar_en', 0.1) * random.uniform(0.5, 1.5)
+
 
 class Usuario(threading.Thread):
     def __init__(self, id_usuario, pos_inicial, tiempo_espera, N, M):
         super().__init__()
         self.id = id_usuario
+        self.log = Bitacora('Usuario', f"Usuario {id_usuario}")
         self.posicion = pos_inicial
         self.tiempo_espera = tiempo_espera
         self.N = N
         self.M = M
+        self.ultima_respuesta = None
 
         self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REQ)
-        self.socket.connect(USUARIO_SERVER_URL) # 5555
+        self.servidor_actual = 0
+        self.socket = self.conectar()
+
+    def conectar(self):
+        socket = self.context.socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)  # No retener solicitudes sin respuesta al cerrar
+        socket.setsockopt(zmq.SNDHWM, LIMITE_COLA_MENSAJES)
+        socket.connect(SERVIDORES_URL[self.servidor_actual]) # 5555 / 5556
+        return socket
+
+    def cambiar_servidor(self):
+        # Un REQ que no recibió respuesta ya no puede volver a enviar: se recrea
+        self.socket.close()
+        self.servidor_actual = (self.servidor_actual + 1) % len(SERVIDORES_URL)
+        self.socket = self.conectar()
 
     def solicitar_taxi(self):
         try:
-            print(f"\nUsuario {self.id}: Iniciando solicitud de taxi desde posición {self.posicion}")
+            self.log.debug('solicitud', "Iniciando solicitud de taxi desde posición %s", self.posicion)
             tiempo_inicio = time.time()
+            limite = tiempo_inicio + TIMEOUT_SOLICITUD
 
-            self.socket.send_json({
+            solicitud = {
                 'tipo': 'solicitud',
                 'id_usuario': self.id,
                 'posicion': self.posicion,
                 'tiempo_solicitud': tiempo_inicio
-            })
+            }
 
-            poller = zmq.Poller()
-            poller.register(self.socket, zmq.POLLIN)
+            while time.time() < limite:
+                espera = min(TIMEOUT_INTENTO, limite - time.time())
+                solicitud['presupuesto'] = espera
+                self.socket.send_json(solicitud)
+
+                if not self.socket.poll(espera * 1000):
+                    self.log.warning('reintento', "Sin respuesta de %s, reintentando en otro servidor",
+                                     SERVIDORES_URL[self.servidor_actual])
+                    self.cambiar_servidor()
+                    continue
 
-            if poller.poll(5000):  # Timeout de 5 segundos
                 respuesta = self.socket.recv_json()
+                if respuesta.get('en_espera'):
+                    # Respondió la réplica mientras el primario sigue activo
+                    self.cambiar_servidor()
+                    continue
+                if respuesta.get('sobrecargado') or respuesta.get('vencida'):
+                    self.ultima_respuesta = respuesta
+                    self.log.debug('sobrecarga', "Servidor sobrecargado, reintentando")
+                    time.sleep(max(0.0, min(esperar_sobrecarga(respuesta), limite - time.time())))
+                    continue
+
+                self.ultima_respuesta = respuesta
                 tiempo_respuesta = respuesta.get('tiempo_respuesta', time.time() - tiempo_inicio)
 
                 if respuesta['exito']:
-                    print(f"Usuario {self.id}: Taxi {respuesta['taxi_id']} asignado desde "
-                          f"posición {respuesta['pos_taxi']}")
-                    print(f"Usuario {self.id}: Tiempo de respuesta del servidor: {tiempo_respuesta:.3f} segundos")
+                    self.log.info('asignacion', "Taxi %d asignado desde posición %s (respuesta en %.3f segundos)",
+                                  respuesta['taxi_id'], respuesta['pos_taxi'], tiempo_respuesta,
+                                  id_usuario=self.id, taxi_id=respuesta['taxi_id'],
+                                  tiempo_respuesta=tiempo_respuesta)
                     return True
                 else:
-                    print(f"Usuario {self.id}: No hay taxis disponibles")
-                    print(f"Usuario {self.id}: Tiempo de respuesta del servidor: {tiempo_respuesta:.3f} segundos")
-            else:
-                print(f"Usuario {self.id}: Timeout en la solicitud después de 5 segundos")
+                    self.log.info('sin_taxi', "No hay taxis disponibles (respuesta en %.3f segundos)",
+                                  tiempo_respuesta, id_usuario=self.id, tiempo_respuesta=tiempo_respuesta)
+                    return False
 
+            if self.ultima_respuesta is not None and self.ultima_respuesta.get('sobrecargado'):
+                self.log.warning('rechazada', "Servidor sobrecargado durante %.0f segundos", TIMEOUT_SOLICITUD)
+            else:
+                self.log.warning('timeout', "Timeout en la solicitud después de %.0f segundos", TIMEOUT_SOLICITUD)
             return False
 
         except Exception as e:
-            print(f"Error en solicitud de usuario {self.id}: {e}")
+            self.log.error('solicitud', "Error en la solicitud: %s", e)
             return False
 
     def run(self):
-        print(f"Usuario {self.id}: Iniciado en posición {self.posicion}")
-        print(f"Usuario {self.id}: Esperando {self.tiempo_espera} segundos antes de solicitar taxi")
+        self.log.info('inicio', "Iniciado en posición %s; esperando %s segundos antes de solicitar taxi",
+                      self.posicion, self.tiempo_espera)
 
         time.sleep(self.tiempo_espera)
 
         if self.solicitar_taxi():
-            print(f"Usuario {self.id}: Iniciando servicio de 30 segundos")
-            time.sleep(30)  # Simular duración del servicio
-            print(f"Usuario {self.id}: Servicio completado")
+            self.log.debug('servicio', "Iniciando servicio de %g segundos", DURACION_SERVICIO)
+            time.sleep(DURACION_SERVICIO)  # Simular duración del servicio
+            self.log.info('servicio', "Servicio completado")
         else:
-            print(f"Usuario {self.id}: No se pudo obtener servicio, buscando otra alternativa")
+            self.log.info('sin_servicio', "No se pudo obtener servicio, buscando otra alternativa")
 
         self.socket.close()
-        print(f"Usuario {self.id}: Sesión terminada")
+        self.log.debug('fin', "Sesión terminada")
 
 
-def crear_usuarios(num_usuarios, N, M, archivo_posiciones):
-    usuarios = []
-    with open(archivo_posiciones, 'r') as f:
-        for i, linea in enumerate(f):
-            if i >= num_usuarios:
+class ClienteAsincrono:
+    # Muchos usuarios lógicos en un solo proceso y un solo hilo: comparten el
+    # contexto y un DEALER por servidor, y cada solicitud lleva un
+    # id_solicitud que el servidor devuelve en la respuesta para casarlas.
+    # Los reintentos siguen el mismo esquema que Usuario: TIMEOUT_INTENTO en
+    # cada servidor y TIMEOUT_SOLICITUD en total
+    def __init__(self):
+        self.log = Bitacora('Usuario', "Cliente asíncrono")
+        self.context = zmq.asyncio.Context()
+        self.sockets = []
+        for url in SERVIDORES_URL:
+            socket = self.context.socket(zmq.DEALER)
+            socket.setsockopt(zmq.LINGER, 0)
+            # Sin servidor conectado el envío espera (y vence el intento) en
+            # lugar de encolar solicitudes que llegarían tarde
+            socket.setsockopt(zmq.IMMEDIATE, 1)
+            socket.setsockopt(zmq.SNDHWM, LIMITE_COLA_MENSAJES)
+            socket.setsockopt(zmq.RCVHWM, LIMITE_COLA_MENSAJES)
+            socket.connect(url)  # 5555 / 5556
+            self.sockets.append(socket)
+        self.servidor_actual = 0
+        self.ids = itertools.count()
+        self.pendientes = {}  # {id_solicitud: futuro de la respuesta}
+        self.latencias = Histograma()
+        self.resultados = {'asignadas': 0, 'sin_taxi': 0, 'rechazadas': 0, 'timeout': 0, 'error': 0}
+
+    async def recibir(self, socket):
+        while True:
+            partes = await socket.recv_multipart()
+            try:
+                respuesta = json.loads(partes[-1])
+            except ValueError:
+                continue
+            if respuesta.get('vencida'):
+                continue  # Solo se vence un intento que el usuario ya abandonó
+            futuro = self.pendientes.get(respuesta.get('id_solicitud'))
+            if futuro is not None and not futuro.done():
+                futuro.set_result(respuesta)
+            # Si no, es la respuesta tardía de un intento ya abandonado
+
+    def cambiar_servidor(self, desde):
+        # Todos los usuarios comparten servidor: solo el primero que detecta el fallo cambia
+        if self.servidor_actual == desde:
+            self.servidor_actual = (desde + 1) % len(SERVIDORES_URL)
+            self.log.warning('reintento', "Sin respuesta de %s, pasando a %s", SERVIDORES_URL[desde],
+                             SERVIDORES_URL[self.servidor_actual])
+
+    async def intento(self, servidor, datos, futuro):
+        # El delimitador vacío hace que el REP del servidor vea un sobre normal
+        await self.sockets[servidor].send_multipart([b'', datos])
+        return await futuro
+
+    async def solicitar(self, cuerpo):
+        # Envía `cuerpo` con un id_solicitud nuevo; None si no hay respuesta a
+        # tiempo, o la última respuesta 'sobrecargado' si el servidor no dejó de estarlo
+        tiempo_inicio = time.time()
+        limite = tiempo_inicio + TIMEOUT_SOLICITUD
+        id_solicitud = next(self.ids)
+        solicitud = dict(cuerpo, tiempo_solicitud=tiempo_inicio, id_solicitud=id_solicitud)
+        bucle = asyncio.get_running_loop()
+        rechazo = None
+
+        try:
+            while time.time() < limite:
+                servidor = self.servidor_actual
+                futuro = bucle.create_future()
+                self.pendientes[id_solicitud] = futuro
+                espera = min(TIMEOUT_INTENTO, limite - time.time())
+                solicitud['presupuesto'] = espera
+                datos = json.dumps(solicitud).encode('utf-8')
+                try:
+                    respuesta = await asyncio.wait_for(self.intento(servidor, datos, futuro), espera)
+                except asyncio.TimeoutError:
+                    self.cambiar_servidor(servidor)
+                    continue
+                if respuesta.get('en_espera'):
+                    # Respondió la réplica mientras el primario sigue activo
+                    self.cambiar_servidor(servidor)
+                    continue
+                if respuesta.get('sobrecargado'):
+                    rechazo = respuesta
+                    await asyncio.sleep(max(0.0, min(esperar_sobrecarga(respuesta), limite - time.time())))
+                    continue
+                return respuesta
+            return rechazo
+        finally:
+            self.pendientes.pop(id_solicitud, None)
+
+    async def solicitar_taxi(self, id_usuario, posicion):
+        return await self.solicitar({'tipo': 'solicitud', 'id_usuario': id_usuario, 'posicion': posicion})
+
+    async def solicitar_lote(self, usuarios):
+        # usuarios: lista de (id_usuario, posicion) que se piden en un solo
+        # mensaje; la respuesta trae en 'resultados' el de cada uno, en orden
+        return await self.solicitar({'tipo': 'solicitud_lote',
+                                     'solicitudes': [[id_usuario, posicion] for id_usuario, posicion in usuarios]})
+
+    async def usuario(self, id_usuario, posicion):
+        inicio = time.perf_counter()
+        try:
+            respuesta = await self.solicitar_taxi(id_usuario, posicion)
+        except Exception as e:
+            self.resultados['error'] += 1
+            self.log.error('solicitud', "Error en la solicitud del Usuario %s: %s", id_usuario, e)
+            return
+        self.contar_respuesta(id_usuario, respuesta, time.perf_counter() - inicio)
+
+    async def grupo(self, usuarios):
+        # Varios usuarios en una sola solicitud_lote (una central de reservas, un quiosco)
+        inicio = time.perf_counter()
+        try:
+            respuesta = await self.solicitar_lote(usuarios)
+        except Exception as e:
+            self.resultados['error'] += len(usuarios)
+            self.log.error('solicitud', "Error en la solicitud de un lote de %d usuarios: %s", len(usuarios), e)
+            return
+        latencia = time.perf_counter() - inicio
+        if respuesta is None or 'resultados' not in respuesta:
+            for id_usuario, _ in usuarios:
+                self.contar_respuesta(id_usuario, respuesta, latencia)
+            return
+        for (id_usuario, _), resultado in zip(usuarios, respuesta['resultados']):
+            self.contar_respuesta(id_usuario, resultado, latencia)
+
+    def contar_respuesta(self, id_usuario, respuesta, latencia):
+        if respuesta is None:
+            self.resultados['timeout'] += 1
+            self.log.warning('timeout', "Timeout en la solicitud del Usuario %s después de %.0f segundos",
+                             id_usuario, TIMEOUT_SOLICITUD)
+            return
+        if respuesta.get('sobrecargado'):
+            self.resultados['rechazadas'] += 1
+            self.log.warning('rechazada', "Usuario %s: servidor sobrecargado durante %.0f segundos",
+                             id_usuario, TIMEOUT_SOLICITUD)
+            return
+        self.latencias.registrar(latencia)
+        if respuesta.get('exito'):
+            self.resultados['asignadas'] += 1
+            self.log.info('asignacion', "Usuario %s: Taxi %d asignado desde posición %s", id_usuario,
+                          respuesta['taxi_id'], respuesta['pos_taxi'], id_usuario=id_usuario,
+                          taxi_id=respuesta['taxi_id'])
+            # El servicio no ocupa nada en el cliente: no hace falta esperar a que termine
+        elif 'error' in respuesta:
+            self.resultados['error'] += 1
+        else:
+            self.resultados['sin_taxi'] += 1
+            self.log.info('sin_taxi', "Usuario %s: no hay taxis disponibles", id_usuario, id_usuario=id_usuario)
+
+    async def ejecutar(self, posiciones, num_usuarios, intervalo, max_activos=MAX_USUARIOS_ACTIVOS, tamano_lote=1):
+        # posiciones: iterable (perezoso) de (x, y); el usuario i solicita a
+        # los (i + 1) * intervalo segundos del inicio, como en crear_usuarios.
+        # Con tamano_lote > 1 cada tamano_lote usuarios consecutivos van en una
+        # sola solicitud_lote, que sale cuando llega el último de ellos
+        tamano_lote = max(1, min(tamano_lote, max_activos))  # Un lote nunca espera por sí mismo
+        receptores = [asyncio.create_task(self.recibir(socket)) for socket in self.sockets]
+        activos = asyncio.Semaphore(max_activos)
+        tareas = set()
+        inicio = time.time()
+
+        async def lanzar(usuarios, momento):
+            try:
+                await asyncio.sleep(momento - time.time())
+                if len(usuarios) == 1:
+                    await self.usuario(*usuarios[0])
+                else:
+                    await self.grupo(usuarios)
+            finally:
+                for _ in usuarios:
+                    activos.release()
+
+        usuarios = enumerate(itertools.islice(posiciones, num_usuarios))
+        while True:
+            lote = list(itertools.islice(usuarios, tamano_lote))
+            if not lote:
                 break
-            x, y = map(int, linea.strip().split())
-            tiempo_espera = (i + 1) * 5  # Tiempo diferente para cada usuario
-            usuario = Usuario(i, (x, y), tiempo_espera, N, M)
-            usuarios.append(usuario)
+            for _ in lote:
+                await activos.acquire()
+            tarea = asyncio.create_task(lanzar(lote, inicio + (lote[-1][0] + 1) * intervalo))
+            tareas.add(tarea)
+            tarea.add_done_callback(tareas.discard)
+        if tareas:
+            await asyncio.wait(set(tareas))
+
+        for receptor in receptores:
+            receptor.cancel()
+        for socket in self.sockets:
+            socket.close()
+        self.context.term()
+        return time.time() - inicio
+
+    def mostrar_resumen(self, duracion):
+        r = self.resultados
+        total = sum(r.values())
+        resumen = self.latencias.resumen()
+        print(f"{total} solicitudes en {duracion:.1f} s ({total / max(duracion, 1e-9):.0f}/s): "
+              f"{r['asignadas']} asignadas, {r['sin_taxi']} sin taxi, {r['rechazadas']} rechazadas por sobrecarga, "
+              f"{r['timeout']} sin respuesta, "
+              f"{r['error']} con error")
+        print(f"Latencia de extremo a extremo: media {resumen['media']:.2f} ms, p50 {resumen['p50']:.2f} ms, "
+              f"p90 {resumen['p90']:.2f} ms, p99 {resumen['p99']:.2f} ms, p99.9 {resumen['p99.9']:.2f} ms, "
+              f"máximo {resumen['max']:.2f} ms")
+
+
+def leer_posiciones(archivo_posiciones):
+    # Una posición "x y" por línea, leída solo cuando hace falta
+    with open(archivo_posiciones, 'r') as f:
+        for linea in f:
+            if linea.strip():
+                x, y = map(int, linea.split())
+                yield x, y
+
+
+def posiciones_aleatorias(N, M, semilla=None):
+    generador = random.Random(semilla)
+    while True:
+        yield generador.randint(0, N), generador.randint(0, M)
+
+
+def crear_usuarios(num_usuarios, N, M, posiciones, intervalo=INTERVALO_USUARIOS):
+    usuarios = []
+    for i, posicion in enumerate(itertools.islice(posiciones, num_usuarios)):
+        tiempo_espera = (i + 1) * intervalo  # Tiempo diferente para cada usuario
+        usuarios.append(Usuario(i, posicion, tiempo_espera, N, M))
 
     return usuarios
 
 
 def main():
-    if len(sys.argv) != 5:
-        print("Uso: python usuario.py <num_usuarios> <N> <M> <archivo_posiciones>")
-        return
+    parser = argparse.ArgumentParser(description="Usuarios que solicitan taxis al servidor central")
+    parser.add_argument('num_usuarios', type=int)
+    parser.add_argument('N', type=int)
+    parser.add_argument('M', type=int)
+    parser.add_argument('archivo_posiciones',
+                        help="Archivo con una posición 'x y' por línea, o 'aleatorio' para generarlas")
+    parser.add_argument('--asincrono', action='store_true',
+                        help="Simular todos los usuarios en un hilo con asyncio y un DEALER compartido")
+    parser.add_argument('--intervalo', type=float, default=INTERVALO_USUARIOS,
+                        help="Segundos entre las solicitudes de usuarios consecutivos")
+    parser.add_argument('--max-activos', type=int, default=MAX_USUARIOS_ACTIVOS,
+                        help="Máximo de usuarios a la vez en memoria (modo asíncrono)")
+    parser.add_argument('--lote', type=int, default=1,
+                        help="Usuarios consecutivos que se piden en una sola solicitud_lote (modo asíncrono)")
+    parser.add_argument('--semilla', type=int, default=None, help="Semilla de las posiciones aleatorias")
+    args = parser.parse_args()
+
+    if args.archivo_posiciones == 'aleatorio':
+        posiciones = posiciones_aleatorias(args.N, args.M, args.semilla)
+    else:
+        posiciones = leer_posiciones(args.archivo_posiciones)
 
-    num_usuarios = int(sys.argv[1])
-    N = int(sys.argv[2])
-    M = int(sys.argv[3])
-    archivo_posiciones = sys.argv[4]
+    if args.asincrono:
+        cliente = ClienteAsincrono()
+        duracion = asyncio.run(cliente.ejecutar(posiciones, args.num_usuarios, args.intervalo,
+                                                   args.max_activos, args.lote))
+        cliente.mostrar_resumen(duracion)
+        return
 
-    usuarios = crear_usuarios(num_usuarios, N, M, archivo_posiciones)
+    usuarios = crear_usuarios(args.num_usuarios, args.N, args.M, posiciones, args.intervalo)
 
     for usuario in usuarios:
         usuario.start()